@@ -1,8 +1,13 @@
 import os
 import sys
+import json
+import logging
 
 from dotenv import load_dotenv
 
+# 使用模块日志记录器，导入配置时不触发根日志记录器的默认配置
+logger = logging.getLogger(__name__)
+
 
 def resource_path(relative_path):
     """获取资源文件路径，兼容PyInstaller打包环境"""
@@ -15,14 +20,31 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def json_dict_env(name):
+    """读取JSON对象格式的环境变量，为空、格式错误或不是对象时返回空字典，不影响其他配置的加载"""
+    value = os.getenv(name, '').strip()
+    if not value:
+        return {}
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError as e:
+        logger.error(f"环境变量 {name} 不是有效的JSON，已忽略: {e}")
+        return {}
+    if not isinstance(parsed, dict):
+        logger.error(f"环境变量 {name} 应为JSON对象，实际为 {type(parsed).__name__}，已忽略")
+        return {}
+    return parsed
+
+
 # 加载.env文件
 # 先尝试从可执行文件同目录加载.env文件，如果不存在则使用默认路径
 if getattr(sys, 'frozen', False):
     # 打包后的环境
-    env_path = os.path.join(os.path.dirname(sys.executable), '.env')
+    base_dir = os.path.dirname(sys.executable)
 else:
     # 开发环境
-    env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env')
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+env_path = os.path.join(base_dir, '.env')
 
 # 如果指定路径的.env文件不存在，则尝试当前目录
 if not os.path.exists(env_path):
@@ -46,6 +68,54 @@ class FEISHUConfig:
     FEISHU_APP_ID = os.getenv('FEISHU_APP_ID', 'cli_a9bb9e88bf385bc6')
     FEISHU_APP_SECRET = os.getenv('FEISHU_APP_SECRET', 'yNh8KAzF0HN8X6LASixdugaChfQbPj8n')
     FEISHU_DOMAIN = os.getenv('FEISHU_DOMAIN', 'https://open.feishu.cn')
+    # 是否将 tenant_access_token 持久化到本地缓存目录，重启后在有效期内继续使用
+    FEISHU_TOKEN_PERSIST = os.getenv('FEISHU_TOKEN_PERSIST', 'true').lower() in ('1', 'true', 'yes')
+    # 在线率数据写入的电子表格token和工作表ID
+    FEISHU_SPREADSHEET_TOKEN = os.getenv('FEISHU_SPREADSHEET_TOKEN', 'LkgdwebJHi5yOUkgOPAc2fnonFb')
+    FEISHU_SHEET_ID = os.getenv('FEISHU_SHEET_ID', '9a4941')
+    # 表格写入模式：append 每次追加新行；sync 按（门店, 小时）增量更新已有行，只写入变化的单元格
+    FEISHU_SHEET_MODE = os.getenv('FEISHU_SHEET_MODE', 'append').lower()
+    # 客户端限流（每个应用每秒最多请求数）和请求读取超时（秒）
+    FEISHU_RATE_LIMIT = float(os.getenv('FEISHU_RATE_LIMIT', '20'))
+    FEISHU_REQUEST_TIMEOUT = float(os.getenv('FEISHU_REQUEST_TIMEOUT', '15'))
+
+
+class DBZConfig:
+    """大巴掌平台配置类"""
+    # 调试抓包：开启后将每个门店的原始响应写入压缩的旁路文件，默认关闭以避免在内存和磁盘中保留原始数据
+    DEBUG_CAPTURE = os.getenv('DBZ_DEBUG_CAPTURE', 'false').lower() in ('1', 'true', 'yes')
+    DEBUG_CAPTURE_DIR = os.getenv('DBZ_DEBUG_CAPTURE_DIR', os.path.join(base_dir, 'debug_capture'))
+
+
+class AutomationConfig:
+    """安卓自动化配置类"""
+    # 图片模板截取时设备屏幕的宽度（竖屏短边像素），其他分辨率的设备按比例缩放模板
+    TEMPLATE_BASE_WIDTH = int(os.getenv('TEMPLATE_BASE_WIDTH', 1080))
+    # 粗匹配时屏幕和模板的缩小比例，0或1表示不做粗匹配
+    TEMPLATE_COARSE_FACTOR = float(os.getenv('TEMPLATE_COARSE_FACTOR', '0.5'))
+    # 参与采集的设备序列号，逗号分隔；为空时自动发现adb中所有在线的设备，emulator-5558 在线时排在最前
+    DEVICE_SERIALS = [serial.strip() for serial in os.getenv('DEVICE_SERIALS', '').split(',') if serial.strip()]
+    # 代理监听的起始端口，第N台设备使用 起始端口+N-1，抓到的cookie按端口归属到设备
+    PROXY_BASE_PORT = int(os.getenv('PROXY_BASE_PORT', 8081))
+    # 代理监听的端口数量，即最多同时执行品牌流程的设备数
+    PROXY_PORT_COUNT = max(int(os.getenv('PROXY_PORT_COUNT', 1)), 1)
+    # 是否自动将设备的代理指向其专属端口（adb reverse + 设备全局代理 127.0.0.1:端口）
+    DEVICE_PROXY_AUTO_SETUP = os.getenv('DEVICE_PROXY_AUTO_SETUP', 'false').lower() in ('1', 'true', 'yes')
+    # 打开品牌小程序的方式，按顺序尝试：deep_link 小程序链接、recent 微信下拉的最近使用小程序、search 搜索（总是最后兜底）
+    # 上次成功的方式会被优先尝试
+    MINI_PROGRAM_LAUNCH_MODES = [mode.strip() for mode in
+                                 os.getenv('MINI_PROGRAM_LAUNCH_MODES', 'deep_link,recent,search').split(',')
+                                 if mode.strip()]
+    # 各品牌小程序的链接（小程序后台生成的 URL Scheme），JSON格式，键为流程类名，
+    # 如 {"JiMuProcess": "weixin://dl/business/?t=xxxx"}；未配置的品牌跳过 deep_link 方式
+    MINI_PROGRAM_DEEP_LINKS = json_dict_env('MINI_PROGRAM_DEEP_LINKS')
+
+
+class CacheConfig:
+    """本地缓存配置类"""
+    CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(base_dir, 'cache'))
+    # 门店列表/门店信息等元数据的缓存有效期（秒），门店名单一般一周才变一次
+    METADATA_CACHE_TTL = int(os.getenv('METADATA_CACHE_TTL', 24 * 3600))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+import time
+import queue
+import shlex
+import threading
+import subprocess
+import itertools
+from typing import List, Optional, Sequence, Union
+
+from core.automation.flow_recorder import count_rpc
+
+# 命令结束标记，后面跟命令的退出码
+END_MARKER = "__ADB_SHELL_END__"
+
+
+class AdbShell:
+    """
+    设备的长连接 adb shell 通道
+    启动一个常驻的 adb shell 进程，命令通过 stdin 依次写入，以结束标记分隔各条命令的输出和退出码，
+    避免每条命令都启动一个 adb 进程；通道断开（如adb服务重启）后下次执行命令时自动重建
+    """
+
+    def __init__(self, serial: Optional[str] = None):
+        """
+        Args:
+            serial: 设备序列号，None表示默认设备
+        """
+        self.serial = serial
+        self._process = None
+        self._lines = None
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self.stats = {"spawns": 0, "commands": 0, "timeouts": 0}
+
+    @property
+    def alive(self) -> bool:
+        """通道进程是否在运行"""
+        return self._process is not None and self._process.poll() is None
+
+    def _adb_command(self) -> List[str]:
+        return ["adb", "-s", self.serial, "shell"] if self.serial else ["adb", "shell"]
+
+    def _start(self):
+        """启动 adb shell 进程和读取输出的线程"""
+        self.stats["spawns"] += 1
+        self._process = subprocess.Popen(
+            self._adb_command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding="utf-8", errors="replace", bufsize=1
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_output, args=(self._process, self._lines), daemon=True).start()
+        # 设备端的错误输出合并到标准输出，与命令输出一起返回
+        self._write("exec 2>&1\n")
+
+    @staticmethod
+    def _read_output(process, lines: queue.Queue):
+        """逐行读取通道输出，进程结束时放入None"""
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def _write(self, data: str):
+        self._process.stdin.write(data)
+        self._process.stdin.flush()
+
+    def run(self, command: Union[str, Sequence[str]], timeout: float = 10) -> subprocess.CompletedProcess:
+        """
+        在设备上执行命令
+
+        Args:
+            command: 命令字符串（按设备shell语法解释），或参数列表（逐个转义后拼接）
+            timeout: 等待命令结束的超时时间（秒），超时后关闭通道，下次执行时重建
+
+        Returns:
+            subprocess.CompletedProcess: returncode 为命令退出码，stdout 为合并后的输出，stderr 为空
+
+        Raises:
+            TimeoutError: 命令超时
+            RuntimeError: 通道在命令结束前断开
+        """
+        if not isinstance(command, str):
+            command = " ".join(shlex.quote(str(arg)) for arg in command)
+
+        with self._lock:
+            if not self.alive:
+                self._start()
+            marker = f"{END_MARKER}{next(self._counter)}"
+            self.stats["commands"] += 1
+            count_rpc("adb_shell")
+            # 命令的标准输入重定向到 /dev/null，避免读取后续写入通道的命令；
+            # 结束标记前补一个换行，保证输出末尾没有换行时标记仍独占一行
+            self._write(f"{{ {command}\n}} </dev/null\nprintf '\\n{marker} %s\\n' \"$?\"\n")
+
+            output = []
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    self.stats["timeouts"] += 1
+                    self._close()
+                    raise TimeoutError(f"adb shell 命令超时: {command}")
+                if line is None:
+                    self._close()
+                    raise RuntimeError(f"adb shell 通道已断开: {''.join(output).strip()}")
+                if line.startswith(marker + " "):
+                    returncode = int(line[len(marker):].strip() or -1)
+                    break
+                output.append(line)
+
+        stdout = "".join(output)
+        if stdout.endswith("\n"):
+            stdout = stdout[:-1]
+        return subprocess.CompletedProcess(command, returncode, stdout, "")
+
+    def _close(self):
+        """结束通道进程"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.stdin.write("exit\n")
+                process.stdin.flush()
+                process.wait(timeout=1)
+        except Exception:
+            pass
+        if process.poll() is None:
+            process.kill()
+
+    def close(self):
+        """关闭通道"""
+        with self._lock:
+            self._close()
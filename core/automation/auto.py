@@ -1,17 +1,27 @@
-import uiautomator2 as u2
 from typing import Optional, List, Dict, Any
 import time
+import contextlib
 import subprocess
-import os
 import cv2
 import numpy as np
 
+from core.automation.device_session import get_device_session_manager
+from core.automation.flow_recorder import count_retry, flow_step, trace_step
+from core.automation.hierarchy import HierarchySnapshot, SELECTOR_TYPES
+from core.automation.image_matcher import get_template_matcher
+from core.automation.waits import wait_until
+
 
 class AndroidAutomation:
     """
     使用uiautomator2操作安卓设备的自动化类
     """
 
+    # 截图的有效期（秒），有效期内的多次图片查找复用同一帧
+    FRAME_MAX_AGE = 0.5
+    # 界面层级快照的有效期（秒），有效期内的多次元素查找在本地求值
+    SNAPSHOT_MAX_AGE = 0.5
+
     def __init__(self, device_id: Optional[str] = 'emulator-5558'):
         """
         初始化安卓自动化类
@@ -21,7 +31,18 @@ class AndroidAutomation:
         """
         self.device_id = device_id
         self.d = None
-        self.adb_kill_start_shell()
+        # 同一设备的连接由会话管理器在所有流程间共享，不再每次都重启adb服务
+        self.session_manager = get_device_session_manager()
+        self.session = None
+        # 设备的长连接adb shell通道，原始shell命令都通过它执行
+        self.shell = self.session_manager.get_shell(device_id)
+        self.matcher = get_template_matcher()
+        # 最近一次截图（BGR和灰度）及截图时间
+        self._frame = None
+        self._frame_gray = None
+        self._frame_time = 0.0
+        # 最近一次界面层级快照
+        self._snapshot = None
         self.connect()
 
     def _check_and_install_atx(self):
@@ -32,10 +53,7 @@ class AndroidAutomation:
             print("正在检查ATX应用是否已安装...")
 
             # 检查ATX应用是否已安装
-            result = subprocess.run(
-                ["adb", "shell", "pm", "list", "packages", "com.github.uiautomator"],
-                capture_output=True, text=True
-            )
+            result = self.shell.run(["pm", "list", "packages", "com.github.uiautomator"])
 
             if "com.github.uiautomator" not in result.stdout:
                 print("ATX应用未安装，正在自动安装...")
@@ -51,8 +69,6 @@ class AndroidAutomation:
                     print("ATX应用安装完成")
                 else:
                     print(f"ATX应用安装可能失败: {result.stderr}")
-                    # 尝试不带设备ID的初始化
-                    subprocess.run(["python", "-m", "uiautomator2", "init"], capture_output=True)
             else:
                 print("ATX应用已安装")
 
@@ -83,10 +99,7 @@ class AndroidAutomation:
                 self.d.service("com.github.uiautomator").start()
             else:
                 # 对于较新版本，可能需要使用其他方式启动服务
-                subprocess.run([
-                    "adb", "shell", "am", "start", "-n",
-                    "com.github.uiautomator/.MainActivity"
-                ], capture_output=True)
+                self.shell.run(["am", "start", "-n", "com.github.uiautomator/.MainActivity"])
 
             time.sleep(2)  # 等待服务启动
             print("ATX服务已启动")
@@ -95,10 +108,7 @@ class AndroidAutomation:
             print(f"启动ATX服务时出错: {e}")
             # 尝试通过ADB启动服务
             try:
-                subprocess.run([
-                    "adb", "shell", "am", "start", "-n",
-                    "com.github.uiautomator/.MainActivity"
-                ], capture_output=True)
+                self.shell.run(["am", "start", "-n", "com.github.uiautomator/.MainActivity"])
                 time.sleep(3)
                 print("通过ADB启动ATX应用")
             except Exception as e2:
@@ -109,20 +119,18 @@ class AndroidAutomation:
         连接到安卓设备
         """
         try:
-            if self.device_id:
-                # 连接到指定设备（通过设备ID或IP地址）
-                self.d = u2.connect(self.device_id)
-            else:
-                # 连接到默认设备
-                self.d = u2.connect()
-
-            if not self.d:
-                raise Exception("无法连接到安卓设备")
-
-            print(f"已连接到设备: {self.d.info['productName']} (序列号: {self.d.serial})")
-
-            # 检查并安装ATX应用
-            self._check_and_install_atx()
+            # 从会话管理器获取连接（已有健康的连接时直接复用）
+            self.session = self.session_manager.get_session(self.device_id)
+            self.d = self.session.device
+
+            with self.session.lock:
+                if not self.session.initialized:
+                    print(f"已连接到设备: {self.d.info['productName']} (序列号: {self.d.serial})")
+                    # 首次连接时检查并安装ATX应用
+                    self._check_and_install_atx()
+                    self.session.initialized = True
+                else:
+                    print(f"复用设备连接: {self.device_id or self.d.serial}")
 
         except Exception as e:
             print(f"连接到安卓设备时出错: {e}")
@@ -154,15 +162,21 @@ class AndroidAutomation:
                         "status": status.strip()
                     }
 
-                    # 尝试获取设备详细信息
+                    # 通过设备的adb shell通道读取属性，不需要建立 uiautomator2 连接
                     try:
-                        d = u2.connect(device_id)
+                        if device_info["status"] != "device":
+                            raise Exception(f"设备状态为 {device_info['status']}")
+                        result = self.session_manager.get_shell(device_id).run(
+                            "getprop ro.product.name; getprop ro.product.brand", timeout=5
+                        )
+                        if result.returncode != 0:
+                            raise Exception(result.stdout.strip())
+                        product_name, brand = (result.stdout.splitlines() + ["", ""])[:2]
                         device_info.update({
-                            "model": d.info.get('productName', 'Unknown'),
-                            "brand": d.info.get('brand', 'Unknown'),
-                            "serial": d.serial
+                            "model": product_name.strip() or 'Unknown',
+                            "brand": brand.strip() or 'Unknown',
+                            "serial": device_id
                         })
-                        d.app_list()  # 测试连接
                     except:
                         device_info.update({
                             "model": "Unknown",
@@ -178,6 +192,7 @@ class AndroidAutomation:
             print(f"搜索安卓设备时出错: {e}")
             return []
 
+    @flow_step(selector_args=("package_name",))
     def open_app(self, package_name: str):
         """
         打开指定的应用
@@ -203,9 +218,10 @@ class AndroidAutomation:
                     print(f"在设备上未找到应用: {package_name}")
                 return False
 
-            # 尝试启动应用
+            # 尝试启动应用，等待应用切到前台（最多10秒）
             self.d.app_start(package_name)
-            time.sleep(3)  # 等待应用启动，增加等待时间
+            self.invalidate_screen_cache()
+            self.wait_until(lambda: self.d.app_current().get('packageName') == package_name, timeout=10)
 
             # 检查应用是否成功启动
             current_app = self.d.app_current()
@@ -229,6 +245,7 @@ class AndroidAutomation:
                 pass  # 如果无法获取应用列表，则忽略此步骤
             raise
 
+    @flow_step(selector_args=("package_name",))
     def kill_app(self, package_name: str):
         """
         杀死指定的应用
@@ -246,13 +263,14 @@ class AndroidAutomation:
             current_app = self.d.app_current()
             if current_app.get('packageName') == package_name:
                 self.d.app_stop(package_name)
-                time.sleep(1)  # 等待应用停止
+                self.invalidate_screen_cache()
+                # 等待应用退出前台
+                self.wait_until(lambda: self.d.app_current().get('packageName') != package_name, timeout=3)
                 print(f"成功停止应用: {package_name}")
                 return True
             else:
                 # 即使应用不是前台应用，也尝试停止它
                 self.d.app_stop(package_name)
-                time.sleep(1)
                 print(f"已发送停止应用命令: {package_name}")
                 return True
 
@@ -260,6 +278,7 @@ class AndroidAutomation:
             print(f"杀死应用时出错: {e}")
             raise
 
+    @flow_step(selector_args=("package_name",))
     def force_kill_app(self, package_name: str) -> bool:
         """
         强制杀死指定的应用（使用ADB命令强制停止）
@@ -277,24 +296,50 @@ class AndroidAutomation:
             print(f"正在强制杀死应用: {package_name}")
 
             # 使用ADB命令强制停止应用
-            if self.device_id:
-                cmd = ["adb", "-s", self.device_id, "shell", "am", "force-stop", package_name]
-            else:
-                cmd = ["adb", "shell", "am", "force-stop", package_name]
-
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self.shell.run(["am", "force-stop", package_name])
+            self.invalidate_screen_cache()
 
             if result.returncode == 0:
                 print(f"成功强制停止应用: {package_name}")
                 return True
             else:
-                print(f"强制停止应用失败: {result.stderr}")
+                print(f"强制停止应用失败: {result.stdout.strip()}")
                 return False
 
         except Exception as e:
             print(f"强制杀死应用时出错: {e}")
             return False
 
+    @flow_step(selector_args=("url",))
+    def open_url(self, url: str) -> bool:
+        """
+        通过系统的 VIEW 意图打开链接（如微信小程序的 weixin:// 链接）
+
+        Args:
+            url: 要打开的链接
+
+        Returns:
+            bool: 是否成功发出打开请求
+        """
+        try:
+            if not self.d:
+                raise Exception("设备未连接")
+
+            print(f"正在打开链接: {url}")
+            result = self.shell.run(["am", "start", "-a", "android.intent.action.VIEW", "-d", url])
+            self.invalidate_screen_cache()
+
+            # am start 找不到处理该链接的应用时退出码仍为0，只在输出中报错
+            if result.returncode == 0 and "Error" not in result.stdout:
+                return True
+            else:
+                print(f"打开链接失败: {result.stdout.strip()}")
+                return False
+
+        except Exception as e:
+            print(f"打开链接时出错: {e}")
+            return False
+
     def is_app_installed(self, package_name: str) -> bool:
         """
         检查应用是否已安装
@@ -334,6 +379,7 @@ class AndroidAutomation:
             print(f"检查应用运行状态时出错: {e}")
             return False
 
+    @flow_step(selector_args=("app_name",))
     def open_app_by_name(self, app_name: str) -> bool:
         """
         根据应用名称打开应用
@@ -358,6 +404,7 @@ class AndroidAutomation:
             print(f"根据应用名称打开应用时出错: {e}")
             return False
 
+    @flow_step(selector_args=("by", "selector"))
     def click_element(self, selector: str, by: str = "text", timeout: int = 10):
         """
         点击指定元素
@@ -373,34 +420,25 @@ class AndroidAutomation:
 
             print(f"点击元素: {selector} (通过{by}定位)")
 
-            # 根据选择器类型定位元素
-            if by == "text":
-                element = self.d(text=selector)
-            elif by == "resourceId":
-                element = self.d(resourceId=selector)
-            elif by == "className":
-                element = self.d(className=selector)
-            elif by == "description":
-                element = self.d(description=selector)
-            elif by == "xpath":
-                element = self.d.xpath(selector)
-            elif by == "textContains":
-                element = self.d(textContains=selector)
-            elif by == "textStartsWith":
-                element = self.d(textStartsWith=selector)
-            elif by == "resourceIdMatches":
-                element = self.d(resourceIdMatches=selector)
-            elif by == "image":
+            if by == "image":
                 # 使用图片进行匹配和点击
                 return self.click_by_image(selector)
-            else:
-                raise ValueError(f"不支持的选择器类型: {by}")
-            element.click()
-            time.sleep(0.5)
+
+            # 在界面层级快照中定位元素，元素出现即按其区域中心点击，最多等待timeout秒
+            node = self.find_node(selector, by, timeout=timeout)
+            if node is None:
+                raise Exception(f"未找到元素: {selector} (超时 {timeout} 秒)")
+            center = HierarchySnapshot.center(node)
+            if center is None:
+                raise Exception(f"元素没有有效的屏幕区域: {selector}")
+            self.d.click(*center)
+            # 点击后的界面变化由调用方用 wait_until 等待
+            self.invalidate_screen_cache()
         except Exception as e:
             print(f"点击元素时出错: {e}")
             raise
 
+    @flow_step(selector_args=("attributes",))
     def click_element_by_attributes(self, attributes: Dict[str, Any], timeout: int = 10):
         """
         根据多个属性定位并点击元素
@@ -420,6 +458,7 @@ class AndroidAutomation:
 
             if element.exists(timeout=timeout):
                 element.click()
+                self.invalidate_screen_cache()
                 print(f"成功点击元素: {attributes}")
             else:
                 print(f"未找到元素: {attributes} (超时 {timeout} 秒)")
@@ -445,30 +484,12 @@ class AndroidAutomation:
 
             print(f"检查元素是否存在: {selector} (通过{by}定位)")
 
-            # 根据选择器类型定位元素
-            if by == "text":
-                element = self.d(text=selector)
-            elif by == "resourceId":
-                element = self.d(resourceId=selector)
-            elif by == "className":
-                element = self.d(className=selector)
-            elif by == "description":
-                element = self.d(description=selector)
-            elif by == "xpath":
-                element = self.d.xpath(selector)
-            elif by == "textContains":
-                element = self.d(textContains=selector)
-            elif by == "textStartsWith":
-                element = self.d(textStartsWith=selector)
-            elif by == "resourceIdMatches":
-                element = self.d(resourceIdMatches=selector)
-            elif by == "image":
+            if by == "image":
                 # 使用图片进行匹配
                 return self.find_image(selector, threshold=0.8) != []
-            else:
-                raise ValueError(f"不支持的选择器类型: {by}")
 
-            exists = element.exists
+            # 在界面层级快照中本地求值，同一步骤内的多次检查只dump一次
+            exists = self.find_node(selector, by) is not None
             print(f"元素 '{selector}' 存在状态: {exists}")
             return exists
 
@@ -476,6 +497,7 @@ class AndroidAutomation:
             print(f"判断元素存在时出错: {e}")
             return False
 
+    @flow_step(selector_args=("text",))
     def adb_input_text(self, text: str) -> bool:
         """
         使用ADB在当前焦点输入文本
@@ -486,26 +508,25 @@ class AndroidAutomation:
         Returns:
             bool: 是否输入成功
         """
-        time.sleep(0.5)
+        # 等待输入框获得焦点（最多1秒）
+        if self.d:
+            self.wait_until(lambda: self.d(focused=True).exists, timeout=1)
         try:
-            if not self.device_id:
-                cmd = ["adb", "shell", "input", "text", text]
-            else:
-                cmd = ["adb", "-s", self.device_id, "shell", "input", "text", text]
-
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self.shell.run(["input", "text", text])
+            self.invalidate_screen_cache()
 
             if result.returncode == 0:
                 print(f"使用ADB成功输入文本: {text}")
                 return True
             else:
-                print(f"使用ADB输入文本失败: {result.stderr}")
+                print(f"使用ADB输入文本失败: {result.stdout.strip()}")
                 return False
 
         except Exception as e:
             print(f"使用ADB输入文本时出错: {e}")
             return False
 
+    @flow_step(selector_args=("text",))
     def adb_send_keys(self, text: str) -> bool:
         """
         使用ADB发送按键，处理特殊字符
@@ -520,18 +541,14 @@ class AndroidAutomation:
             # 将空格转换为 %s，将其他特殊字符转义
             escaped_text = text.replace(' ', '%s')
 
-            if not self.device_id:
-                cmd = ["adb", "shell", "input", "text", escaped_text]
-            else:
-                cmd = ["adb", "-s", self.device_id, "shell", "input", "text", escaped_text]
-
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self.shell.run(["input", "text", escaped_text])
+            self.invalidate_screen_cache()
 
             if result.returncode == 0:
                 print(f"使用ADB成功发送按键: {text}")
                 return True
             else:
-                print(f"使用ADB发送按键失败: {result.stderr}")
+                print(f"使用ADB发送按键失败: {result.stdout.strip()}")
                 return False
 
         except Exception as e:
@@ -584,6 +601,7 @@ class AndroidAutomation:
             print(f"执行adb命令序列时出错: {e}")
             return False
 
+    @flow_step(selector_args=("x", "y"))
     def click_coordinates(self, x: int, y: int):
         """
         点击指定坐标
@@ -598,11 +616,13 @@ class AndroidAutomation:
 
             print(f"点击坐标: ({x}, {y})")
             self.d.click(x, y)
+            self.invalidate_screen_cache()
 
         except Exception as e:
             print(f"点击坐标时出错: {e}")
             raise
 
+    @flow_step(selector_args=("by", "selector"))
     def input_text(self, selector: str, text: str, by: str = "text"):
         """
         在指定元素中输入文本
@@ -636,6 +656,7 @@ class AndroidAutomation:
                 try:
                     # 尝试使用uiautomator2的set_text方法
                     element.set_text(text)
+                    self.invalidate_screen_cache()
                     print(f"成功在元素 {selector} 中输入文本")
                 except Exception as input_error:
                     # 检查是否是输入法相关的错误
@@ -660,6 +681,7 @@ class AndroidAutomation:
             print(f"输入文本时出错: {e}")
             raise
 
+    @flow_step()
     def swipe(self, start_x: int, start_y: int, end_x: int, end_y: int, duration: float = 0.5):
         """
         滑动屏幕
@@ -677,6 +699,7 @@ class AndroidAutomation:
 
             print(f"滑动: 从({start_x}, {start_y}) 到 ({end_x}, {end_y})")
             self.d.swipe(start_x, start_y, end_x, end_y, duration)
+            self.invalidate_screen_cache()
 
         except Exception as e:
             print(f"滑动屏幕时出错: {e}")
@@ -714,13 +737,213 @@ class AndroidAutomation:
             print(f"获取当前应用信息时出错: {e}")
             return {}
 
-    def click_by_image(self, template_path: str, threshold: float = 0.8) -> bool:
+    def hierarchy_signature(self) -> Optional[int]:
+        """
+        当前界面层级的签名，用于判断界面是否发生变化
+
+        Returns:
+            int: 界面层级的哈希值，获取失败返回None
+        """
+        try:
+            return hash(self.d.dump_hierarchy(compressed=True))
+        except Exception as e:
+            print(f"获取界面层级时出错: {e}")
+            return None
+
+    def _refresh_snapshot_if_changed(self, last_signature: list) -> bool:
+        """
+        dump一次界面层级并与上次的签名比较，变化时用这次的dump更新快照，条件中的 snapshot() 直接复用，不再重复dump
+
+        Args:
+            last_signature: 只有一个元素的列表，保存上次的签名，本次的签名写回其中
+
+        Returns:
+            bool: 界面层级是否变化（获取失败时视为变化）
+        """
+        try:
+            xml = self.d.dump_hierarchy()
+            signature = hash(xml)
+        except Exception as e:
+            print(f"获取界面层级时出错: {e}")
+            xml = signature = None
+        changed = signature is None or signature != last_signature[0]
+        last_signature[0] = signature
+        if changed:
+            self.invalidate_screen_cache()
+            if xml is not None:
+                try:
+                    self._snapshot = HierarchySnapshot(xml)
+                except Exception as e:
+                    print(f"解析界面层级时出错: {e}")
+        return changed
+
+    def wait_until(self, condition, timeout: float = 10, interval: float = 0.1, max_interval: float = 1.0,
+                   only_on_change: bool = False, description: Optional[str] = None) -> bool:
+        """
+        等待条件满足（自适应轮询，开始时快速检查，之后逐渐拉长间隔）
+
+        Args:
+            condition: 条件函数，如 lambda: self.element_exists('会员中心')
+            timeout: 超时时间（秒）
+            interval: 首次轮询间隔（秒）
+            max_interval: 最大轮询间隔（秒）
+            only_on_change: 首次检查后只在界面层级变化时重新检查，适合耗时的条件（如图片匹配、多个元素的组合判断）
+            description: 等待内容的描述，传入时打印等待结果
+
+        Returns:
+            bool: 超时前条件是否满足
+        """
+        last_signature = [None]
+        if only_on_change:
+            self._refresh_snapshot_if_changed(last_signature)
+        on_poll = (lambda: self._refresh_snapshot_if_changed(last_signature)) if only_on_change else None
+
+        start = time.monotonic()
+        # 带描述的等待记录为流程步骤
+        with trace_step("wait_until", description) if description else contextlib.nullcontext() as record:
+            result = wait_until(condition, timeout=timeout, interval=interval, max_interval=max_interval,
+                                on_poll=on_poll)
+            if record is not None and not result:
+                record["ok"] = False
+        if description:
+            if result:
+                print(f"{description}: 已满足，用时 {time.monotonic() - start:.1f}s")
+            else:
+                print(f"{description}: 等待超时（{timeout}s）")
+        return result
+
+    def click_until(self, click_action, condition, timeout: float = 15, settle_timeout: float = 3,
+                    description: Optional[str] = None) -> bool:
+        """
+        重复点击直到条件满足，替代“固定等待 + 点击”的重试循环
+        条件已满足时不点击；每次点击后最多等待 settle_timeout 秒，条件满足立即返回
+
+        Args:
+            click_action: 点击操作
+            condition: 目标条件（如下一个页面的元素出现、当前按钮消失）
+            timeout: 总超时时间（秒）
+            settle_timeout: 每次点击后等待条件满足的时间（秒）
+            description: 操作描述，用于打印日志
+
+        Returns:
+            bool: 超时前条件是否满足
+        """
+        description = description or "点击后等待"
+        with trace_step("click_until", description) as record:
+            deadline = time.monotonic() + timeout
+            if self.wait_until(condition, timeout=0):
+                return True
+            attempt = 0
+            while time.monotonic() < deadline:
+                attempt += 1
+                if attempt > 1:
+                    count_retry()
+                try:
+                    click_action()
+                except Exception as e:
+                    print(f"{description}: 第{attempt}次点击失败: {e}")
+                remaining = deadline - time.monotonic()
+                if self.wait_until(condition, timeout=max(min(settle_timeout, remaining), 0)):
+                    print(f"{description}: 第{attempt}次点击后条件满足")
+                    return True
+            print(f"{description}: {timeout}s 内条件未满足")
+            if record is not None:
+                record["ok"] = False
+            return False
+
+    def capture_screen(self, max_age: Optional[float] = None, gray: bool = False) -> Optional[np.ndarray]:
+        """
+        获取当前屏幕画面（内存中的numpy数组，不落盘）
+        距上次截图不超过 max_age 秒且期间没有点击、输入等操作时复用上一帧
+
+        Args:
+            max_age: 可复用的截图有效期（秒），默认为 FRAME_MAX_AGE，传0强制重新截图
+            gray: 是否返回灰度图
+
+        Returns:
+            np.ndarray: BGR或灰度图，截图失败返回None
+        """
+        if not self.d:
+            raise Exception("设备未连接")
+
+        max_age = self.FRAME_MAX_AGE if max_age is None else max_age
+        if self._frame is None or time.monotonic() - self._frame_time > max_age:
+            frame = self.d.screenshot(format='opencv')
+            if frame is None:
+                return None
+            self._frame = frame
+            self._frame_gray = None
+            self._frame_time = time.monotonic()
+
+        if not gray:
+            return self._frame
+        if self._frame_gray is None:
+            self._frame_gray = cv2.cvtColor(self._frame, cv2.COLOR_BGR2GRAY)
+        return self._frame_gray
+
+    def snapshot(self, max_age: Optional[float] = None) -> HierarchySnapshot:
+        """
+        获取界面层级快照：dump一次界面层级，之后的元素查找在本地求值
+        距上次dump不超过 max_age 秒且期间没有点击、输入等操作时复用上一个快照
+
+        Args:
+            max_age: 可复用的快照有效期（秒），默认为 SNAPSHOT_MAX_AGE，传0强制重新dump
+
+        Returns:
+            HierarchySnapshot: 界面层级快照
+        """
+        if not self.d:
+            raise Exception("设备未连接")
+
+        max_age = self.SNAPSHOT_MAX_AGE if max_age is None else max_age
+        if self._snapshot is None or self._snapshot.age > max_age:
+            self._snapshot = HierarchySnapshot(self.d.dump_hierarchy())
+        return self._snapshot
+
+    def find_node(self, selector: str, by: str = "text", timeout: float = 0):
+        """
+        在界面层级快照中查找元素节点，找不到时重新dump并等待，最多 timeout 秒
+
+        Args:
+            selector: 元素选择器值
+            by: 选择器类型，可选值: "text", "resourceId", "className", "description", "xpath", "textContains", "textStartsWith", "resourceIdMatches"
+            timeout: 等待元素出现的超时时间（秒），0表示只查找一次
+
+        Returns:
+            lxml节点，未找到返回None
+        """
+        if by not in SELECTOR_TYPES:
+            raise ValueError(f"不支持的选择器类型: {by}")
+        found = {}
+
+        def locate():
+            node = self.snapshot().find(selector, by)
+            if node is None:
+                # 快照中没有该元素，下次查找时重新dump
+                self._snapshot = None
+                return False
+            found["node"] = node
+            return True
+
+        self.wait_until(locate, timeout=timeout)
+        return found.get("node")
+
+    def invalidate_screen_cache(self):
+        """屏幕可能已变化（点击、输入、滑动等操作后），丢弃缓存的截图和界面层级快照"""
+        self._frame = None
+        self._frame_gray = None
+        self._snapshot = None
+
+    @flow_step(selector_args=("template_path",))
+    def click_by_image(self, template_path: str, threshold: float = 0.8,
+                       roi: Optional[tuple] = None) -> bool:
         """
         根据图片模板在屏幕上查找并点击匹配的元素
 
         Args:
             template_path: 模板图片路径
             threshold: 匹配阈值，范围0-1，值越高要求匹配度越高
+            roi: 相对屏幕的查找区域 (x1, y1, x2, y2)，取值0-1，默认使用模板登记的区域提示
 
         Returns:
             bool: 是否找到并点击成功
@@ -731,67 +954,38 @@ class AndroidAutomation:
 
             print(f"正在根据图片模板查找并点击: {template_path}")
 
-            # 获取当前屏幕截图
-            screen_img = self.d.screenshot()
-
-            # 将截图保存到临时文件以供OpenCV读取
-            temp_screenshot_path = "temp_screenshot.png"
-            self.d.screenshot(temp_screenshot_path)
-
-            # 读取屏幕截图和模板图片
-            screen = cv2.imread(temp_screenshot_path)
-            template = cv2.imread(template_path)
-
-            if screen is None or template is None:
-                print("无法读取屏幕截图或模板图片")
+            screen = self.capture_screen(gray=True)
+            match = self.matcher.match_best(screen, template_path, threshold, roi) if screen is not None else None
+            if match is None:
+                print("无法获取屏幕截图或读取模板图片")
                 return False
 
-            # 执行模板匹配
-            result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-
-            # 获取匹配结果中的最大值和位置
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-
-            if max_val >= threshold:
-                # 计算匹配区域的中心坐标
-                h, w = template.shape[:2]
-                center_x = int(max_loc[0] + w // 2)
-                center_y = int(max_loc[1] + h // 2)
-
+            if match["match_value"] >= threshold:
                 # 点击匹配区域的中心
+                center_x, center_y = match["x"], match["y"]
                 self.d.click(center_x, center_y)
-                print(f"成功匹配并点击图片，相似度: {max_val:.3f}, 坐标: ({center_x}, {center_y})")
-
-                # 删除临时文件
-                if os.path.exists(temp_screenshot_path):
-                    os.remove(temp_screenshot_path)
-
+                self.invalidate_screen_cache()
+                print(f"成功匹配并点击图片，相似度: {match['match_value']:.3f}, 坐标: ({center_x}, {center_y})")
                 return True
             else:
-                print(f"未找到匹配的图片，最高相似度: {max_val:.3f}，阈值: {threshold}")
-
-                # 删除临时文件
-                if os.path.exists(temp_screenshot_path):
-                    os.remove(temp_screenshot_path)
-
+                print(f"未找到匹配的图片，最高相似度: {match['match_value']:.3f}，阈值: {threshold}")
                 return False
 
         except Exception as e:
             print(f"根据图片点击时出错: {e}")
-            # 确保临时文件被清理
-            temp_screenshot_path = "temp_screenshot.png"
-            if os.path.exists(temp_screenshot_path):
-                os.remove(temp_screenshot_path)
             raise
 
-    def find_image(self, template_path: str, threshold: float = 0.8, multiple: bool = False) -> List[Dict[str, Any]]:
+    @flow_step(selector_args=("template_path",))
+    def find_image(self, template_path: str, threshold: float = 0.8, multiple: bool = False,
+                   roi: Optional[tuple] = None) -> List[Dict[str, Any]]:
         """
         根据图片模板在屏幕上查找匹配的元素位置
 
         Args:
             template_path: 模板图片路径
             threshold: 匹配阈值，范围0-1，值越高要求匹配度越高
-            multiple: 是否查找多个匹配项
+            multiple: 是否查找多个匹配项（每个实例只返回一个位置，按匹配度从高到低）
+            roi: 相对屏幕的查找区域 (x1, y1, x2, y2)，取值0-1，默认使用模板登记的区域提示
 
         Returns:
             List[Dict]: 匹配结果列表，每个元素包含坐标和匹配度
@@ -802,61 +996,25 @@ class AndroidAutomation:
 
             print(f"正在根据图片模板查找: {template_path}")
 
-            # 获取当前屏幕截图
-            temp_screenshot_path = "temp_screenshot.png"
-            self.d.screenshot(temp_screenshot_path)
-
-            # 读取屏幕截图和模板图片
-            screen = cv2.imread(temp_screenshot_path)
-            template = cv2.imread(template_path)
-
-            if screen is None or template is None:
-                print("无法读取屏幕截图或模板图片")
+            screen = self.capture_screen(gray=True)
+            if screen is None:
+                print("无法获取屏幕截图")
                 return []
 
-            # 执行模板匹配
-            result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-
-            # 获取匹配结果中满足阈值的位置
-            locations = np.where(result >= threshold)
-
-            matches = []
-            h, w = template.shape[:2]
-
-            if len(locations[0]) > 0:
-                # 将匹配位置转换为坐标
-                for pt in zip(*locations[::-1]):  # locations[::-1] 将y,x转换为x,y
-                    center_x = int(pt[0] + w // 2)
-                    center_y = int(pt[1] + h // 2)
-                    match_val = float(result[pt[1], pt[0]])  # 获取该位置的匹配度
-                    matches.append({
-                        "x": center_x,
-                        "y": center_y,
-                        "match_value": match_val,
-                        "top_left": (int(pt[0]), int(pt[1]))
-                    })
-
-                # 如果不需要多个匹配，只返回最佳匹配
-                if not multiple and matches:
-                    best_match = max(matches, key=lambda x: x["match_value"])
-                    matches = [best_match]
+            if multiple:
+                matches = self.matcher.match_all(screen, template_path, threshold, roi)
+            else:
+                best = self.matcher.match_best(screen, template_path, threshold, roi)
+                matches = [best] if best and best["match_value"] >= threshold else []
 
+            if matches:
                 print(f"找到 {len(matches)} 个匹配项")
             else:
                 print(f"未找到匹配的图片，阈值: {threshold}")
-
-            # 删除临时文件
-            if os.path.exists(temp_screenshot_path):
-                os.remove(temp_screenshot_path)
-
             return matches
 
         except Exception as e:
             print(f"查找图片时出错: {e}")
-            # 确保临时文件被清理
-            temp_screenshot_path = "temp_screenshot.png"
-            if os.path.exists(temp_screenshot_path):
-                os.remove(temp_screenshot_path)
             return []
 
     def screenshot(self, filename: str = None) -> str:
@@ -885,6 +1043,7 @@ class AndroidAutomation:
             print(f"截图时出错: {e}")
             return ""
 
+    @flow_step(selector_args=("key",))
     def press_key(self, key: str):
         """
         按下设备按键
@@ -898,6 +1057,7 @@ class AndroidAutomation:
 
             print(f"按下按键: {key}")
             self.d.press(key)
+            self.invalidate_screen_cache()
 
         except Exception as e:
             print(f"按键操作时出错: {e}")
@@ -921,6 +1081,7 @@ class AndroidAutomation:
             print(f"等待设备空闲时出错: {e}")
             raise
 
+    @flow_step()
     def go_home(self):
         """
         返回桌面
@@ -931,6 +1092,7 @@ class AndroidAutomation:
 
             print("返回桌面")
             self.d.press("home")
+            self.invalidate_screen_cache()
 
         except Exception as e:
             print(f"返回桌面时出错: {e}")
@@ -941,6 +1103,7 @@ class AndroidAutomation:
         关闭连接并清理资源
         """
         # uiautomator2通常不需要显式关闭连接
+        self.matcher.save_stats()
         print("已断开与设备的连接")
         self.d = None
 
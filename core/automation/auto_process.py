@@ -1,24 +1,162 @@
 import time
+from typing import Optional
 
+from config.settings import AutomationConfig
 from core.automation.auto import AndroidAutomation
+from core.automation.flow_recorder import FlowRecorder, flow_step
+from core.automation.launch_cache import get_launch_cache
 
 
 class QingNiaoAutoProcess(object):
     WECHAT_APP_NAME = '微信'
+    WECHAT_PACKAGE = 'com.tencent.mm'
     WECHAT_SEARCH_BTN_XPATH = ('//*[@resource-id="com.tencent.mm:id/jha"]/android.widget.ImageView[1]', 'xpath')
     WECHAT_SEARCH_INPUT_XPATH = ('//*[@resource-id="com.tencent.mm:id/d98"]', 'xpath')
+    # 小程序在搜索结果和最近使用列表中显示的名称、搜索关键词（由各品牌设置）
+    MINI_PROGRAM_NAME = None
+    SEARCH_KEYWORD = None
+    # 每种打开方式等待小程序首页出现的最长时间（秒）
+    LAUNCH_TIMEOUT = 15
+
+    def __init__(self, device_id: Optional[str] = None):
+        """
+        Args:
+            device_id: 执行流程的设备序列号，None表示默认设备
+        """
+        self.automator = AndroidAutomation() if device_id is None else AndroidAutomation(device_id)
+        # 微信是否已重新打开并停在首页，打开最近使用的小程序失败后搜索时不再重启微信
+        self._wechat_ready = False
+
+    def run(self):
+        """
+        执行品牌流程，并记录每个步骤的选择器、设备RPC次数、耗时和重试次数（写入流程跟踪文件）；
+        流程结束时保存模板匹配统计
+        """
+        try:
+            with FlowRecorder(self.__class__.__name__, self.automator.device_id):
+                return self.main_process()
+        finally:
+            self.automator.matcher.save_stats()
 
-    def __init__(self):
-        self.automator = AndroidAutomation()
+    def main_process(self):
+        raise NotImplementedError
+
+    def mini_program_opened(self):
+        """小程序首页是否已出现（由各品牌实现）"""
+        raise NotImplementedError
+
+    def click_search_result(self):
+        self.automator.click_element(self.MINI_PROGRAM_NAME, by='text')
+
+    @flow_step()
+    def launch_mini_program(self):
+        """
+        打开品牌小程序：按 MINI_PROGRAM_LAUNCH_MODES 依次尝试小程序链接、最近使用的小程序，都失败时搜索；
+        上次成功的方式优先尝试
+
+        Returns:
+            bool: 小程序首页是否已出现
+        """
+        flow = self.__class__.__name__
+        device = self.automator.device_id
+        cache = get_launch_cache()
+        launchers = {"deep_link": self.launch_by_deep_link, "recent": self.launch_by_recent,
+                     "search": self.launch_by_search}
+        self._wechat_ready = False
+
+        modes = [mode for mode in AutomationConfig.MINI_PROGRAM_LAUNCH_MODES if mode in launchers]
+        for mode in cache.order_modes(device, flow, modes):
+            start = time.monotonic()
+            try:
+                opened = launchers[mode]()
+            except Exception as e:
+                print(f"{self.MINI_PROGRAM_NAME}: 通过 {mode} 方式打开小程序出错: {e}")
+                opened = False
+            if opened is None:
+                # 该方式不可用（如未配置链接），不记为失败
+                continue
+            cost = time.monotonic() - start
+            cache.record(device, flow, mode, opened, cost)
+            if opened:
+                print(f"{self.MINI_PROGRAM_NAME}: 通过 {mode} 方式打开小程序，用时 {cost:.1f}s")
+                return True
+            print(f"{self.MINI_PROGRAM_NAME}: 通过 {mode} 方式打开小程序失败，用时 {cost:.1f}s")
+        return False
+
+    @flow_step()
+    def launch_by_deep_link(self):
+        """
+        通过小程序链接（MINI_PROGRAM_DEEP_LINKS）直接打开小程序
+
+        Returns:
+            bool: 小程序首页是否已出现，未配置链接时返回None
+        """
+        link = AutomationConfig.MINI_PROGRAM_DEEP_LINKS.get(self.__class__.__name__)
+        if not link:
+            return None
+        # 先结束微信，保证小程序重新加载，代理才能抓到本次的cookie
+        self.automator.force_kill_app(self.WECHAT_PACKAGE)
+        if not self.automator.open_url(link):
+            return False
+        return self.automator.wait_until(self.mini_program_opened, timeout=self.LAUNCH_TIMEOUT,
+                                         description=f"等待{self.MINI_PROGRAM_NAME}小程序打开")
+
+    @flow_step()
+    def launch_by_recent(self):
+        """
+        在微信首页下拉，从最近使用的小程序中点击品牌小程序
+
+        Returns:
+            bool: 小程序首页是否已出现
+        """
+        if not self.open_wechat():
+            return False
+        # 等待聊天列表加载完成（搜索按钮出现），冷启动时微信切到前台后还有启动页
+        if self.automator.find_node(self.WECHAT_SEARCH_BTN_XPATH[0], by=self.WECHAT_SEARCH_BTN_XPATH[1],
+                                    timeout=10) is None:
+            return False
+        # 在聊天列表上下拉显示最近使用的小程序（坐标为相对屏幕的比例）
+        self.automator.swipe(0.5, 0.3, 0.5, 0.85, 0.3)
+        if self.automator.find_node(self.MINI_PROGRAM_NAME, by='text', timeout=3) is None:
+            print(f"最近使用的小程序中没有 {self.MINI_PROGRAM_NAME}")
+            # 收起下拉面板回到聊天列表，搜索时不需要重启微信
+            self.automator.press_key('back')
+            self._wechat_ready = True
+            return False
+        return self.automator.click_until(
+            lambda: self.automator.click_element(self.MINI_PROGRAM_NAME, by='text', timeout=2),
+            self.mini_program_opened, timeout=self.LAUNCH_TIMEOUT,
+            description=f"点击最近使用的{self.MINI_PROGRAM_NAME}")
+
+    @flow_step()
+    def launch_by_search(self):
+        """
+        在微信中搜索并点击品牌小程序
+
+        Returns:
+            bool: 小程序首页是否已出现
+        """
+        if not self._wechat_ready:
+            self.open_wechat()
+        self._wechat_ready = False
+        if not self.search_bar_exists():
+            self.enter_search_page()
+        self.input_search_content(self.SEARCH_KEYWORD)
+        # 点击搜索结果，直到小程序首页出现
+        return self.automator.click_until(self.click_search_result, self.mini_program_opened,
+                                          timeout=self.LAUNCH_TIMEOUT,
+                                          description=f"点击{self.MINI_PROGRAM_NAME}搜索结果")
 
+    @flow_step()
     def open_wechat(self):
         # 搜索设备
         devices = self.automator.search_android_device()
-        self.automator.kill_app('com.tencent.mm')
+        self.automator.kill_app(self.WECHAT_PACKAGE)
         self.automator.open_app_by_name(self.WECHAT_APP_NAME)
-        cur_app = self.automator.get_current_app()
-        print(cur_app)
-        if cur_app == "com.tencent.mm":
+        # 等待微信切到前台，打开后立即返回
+        if self.automator.wait_until(
+                lambda: self.automator.get_current_app().get('packageName') == self.WECHAT_PACKAGE,
+                timeout=10, description="等待微信打开"):
             print("微信已打开")
             return True
         else:
@@ -29,16 +167,19 @@ class QingNiaoAutoProcess(object):
         return self.automator.element_exists(self.WECHAT_SEARCH_INPUT_XPATH[0],
                                              by=self.WECHAT_SEARCH_INPUT_XPATH[1])
 
+    @flow_step()
     def enter_search_page(self):
         self.automator.click_element(self.WECHAT_SEARCH_BTN_XPATH[0],
                                      by=self.WECHAT_SEARCH_BTN_XPATH[1])
 
+    @flow_step(selector_args=("search_content",))
     def input_search_content(self, search_content):
         self.automator.click_element(self.WECHAT_SEARCH_INPUT_XPATH[0],
                                      by=self.WECHAT_SEARCH_INPUT_XPATH[1])
         self.automator.input_text(self.WECHAT_SEARCH_INPUT_XPATH[0],
                                   by=self.WECHAT_SEARCH_INPUT_XPATH[1], text=search_content)
 
+    @flow_step(selector_args=("search_content",))
     def adb_input_search_content(self, search_content):
         self.automator.adb_input_text(search_content)
 
@@ -47,6 +188,11 @@ class JiMuProcess(QingNiaoAutoProcess):
     """
          吉姆电竞
     """
+    MINI_PROGRAM_NAME = '吉姆电竞'
+    SEARCH_KEYWORD = 'jimudianjing'
+
+    def mini_program_opened(self):
+        return self._member_center_btn_exists()
 
     def click_huakaifuggui_text_btn(self):
         self.automator.click_element('//*[@text="花开富贵"]', by='xpath')
@@ -73,34 +219,23 @@ class JiMuProcess(QingNiaoAutoProcess):
         return self.automator.element_exists('会员中心', by='text')
 
     def main_process(self):
-        self.open_wechat()
-        if not self.search_bar_exists():
-            self.enter_search_page()
-            self.input_search_content("jimudianjing")
-
-
-
-        retry_times = 0
-        while not self._member_center_btn_exists():
-            time.sleep(1)
-            self.click_jimu_text_btn()  # 点击吉姆电竞搜索结果
-            retry_times += 1
-            if retry_times > 5:
-                break
-
-        retry_times = 0
-        while self._member_center_btn_exists():
-            time.sleep(1)
-            self.click_member_center_btn()  # 点击会员中心
-            retry_times += 1
-            if retry_times > 5:
-                break
+        # 打开吉姆电竞小程序，直到会员中心出现
+        if not self.launch_mini_program():
+            return
+        # 点击会员中心，直到进入会员中心页面（按钮消失）
+        self.automator.click_until(self.click_member_center_btn, lambda: not self._member_center_btn_exists(),
+                                   description="点击会员中心")
 
 
 class ChaLiXiongProcess(QingNiaoAutoProcess):
     """
         查理熊
     """
+    MINI_PROGRAM_NAME = '查理熊电竞馆'
+    SEARCH_KEYWORD = 'chalixiong'
+
+    def mini_program_opened(self):
+        return self.reserve_btn_exists()
 
     def click_clx_text_btn(self):
         self.automator.click_element('查理熊电竞馆', by='text')
@@ -118,31 +253,16 @@ class ChaLiXiongProcess(QingNiaoAutoProcess):
         return self.automator.element_exists('在线订座', by='text')
 
     def main_process(self):
-        self.open_wechat()
-        if not self.search_bar_exists():
-            self.enter_search_page()  # 搜索
-        self.input_search_content("chalixiong")  # 输入搜索chalixiong
-        retry_times = 0
-        while not self.reserve_btn_exists():
-            time.sleep(2)
-            self.click_clx_text_btn()  # 点击查理熊电竞馆搜索结果
-            retry_times += 1
-            if retry_times > 5:
-                break
-        retry_times = 0
-        while not self.reserve_online_book_btn_exists():
-            time.sleep(2)
-            self.click_reserve_btn()  # 点击在线预定
-            retry_times += 1
-            if retry_times > 5:
-                break
-        retry_times = 0
-        while self.reserve_online_book_btn_exists():
-            time.sleep(2)
-            self.click_reserve_online_book_btn()  # 点击在线订座,有就点
-            retry_times += 1
-            if retry_times > 5:
-                break
+        # 打开查理熊电竞馆小程序，直到在线预定出现
+        if not self.launch_mini_program():
+            return
+        # 点击在线预定，直到在线订座出现
+        self.automator.click_until(self.click_reserve_btn, self.reserve_online_book_btn_exists,
+                                   description="点击在线预定")
+        # 点击在线订座,有就点，直到按钮消失
+        self.automator.click_until(self.click_reserve_online_book_btn,
+                                   lambda: not self.reserve_online_book_btn_exists(),
+                                   description="点击在线订座")
         # self.adb_input_search_content('chalixiong')
 
 
@@ -150,6 +270,11 @@ class XingHaiProcess(QingNiaoAutoProcess):
     """
         星海电竞馆
     """
+    MINI_PROGRAM_NAME = '星海电竞馆'
+    SEARCH_KEYWORD = 'xinghaidianjingguan'
+
+    def mini_program_opened(self):
+        return self.member_enter_btn_exists()
 
     def click_xh_text_btn(self):
         self.automator.click_element('星海电竞馆', by='text')
@@ -161,32 +286,23 @@ class XingHaiProcess(QingNiaoAutoProcess):
         return self.automator.element_exists('会员中心', by='text')
 
     def main_process(self):
-        self.open_wechat()
-        if not self.search_bar_exists():
-            self.enter_search_page()
-
-        self.input_search_content("xinghaidianjingguan")
-        retry_times = 0
-        while not self.member_enter_btn_exists():
-            time.sleep(1)
-            self.click_xh_text_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
-
-        retry_times = 0
-        while self.member_enter_btn_exists():
-            time.sleep(1)
-            self.click_member_enter_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
+        # 打开星海电竞馆小程序，直到会员中心出现
+        if not self.launch_mini_program():
+            return
+        # 点击会员中心，直到按钮消失
+        self.automator.click_until(self.click_member_enter_btn, lambda: not self.member_enter_btn_exists(),
+                                   description="点击会员中心")
 
 
 class LeYouProcess(QingNiaoAutoProcess):
     """
         乐游电堂
     """
+    MINI_PROGRAM_NAME = '乐游电堂'
+    SEARCH_KEYWORD = 'leyoudiantang'
+
+    def mini_program_opened(self):
+        return self.fast_enter_btn_exists()
 
     def click_leyou_text_btn(self):
         self.automator.click_element('乐游电堂', by='text')
@@ -204,37 +320,26 @@ class LeYouProcess(QingNiaoAutoProcess):
         return self.automator.element_exists('一键订座', by='text')
 
     def main_process(self):
-        self.open_wechat()
-        if not self.search_bar_exists():
-            self.enter_search_page()
-        self.input_search_content("leyoudiantang")
-        retry_times = 0
-        while not self.fast_enter_btn_exists():
-            time.sleep(1)
-            self.click_leyou_text_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
-        retry_times = 0
-        while not self.one_short_reserve_btn_exists():
-            time.sleep(1)
-            self.click_fast_enter_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
-        retry_times = 0
-        while self.one_short_reserve_btn_exists():
-            time.sleep(1)
-            self.click_one_short_reserve_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
+        # 打开乐游电堂小程序，直到快捷入口出现
+        if not self.launch_mini_program():
+            return
+        # 点击快捷入口，直到一键订座出现
+        self.automator.click_until(self.click_fast_enter_btn, self.one_short_reserve_btn_exists,
+                                   description="点击快捷入口")
+        # 点击一键订座，直到按钮消失
+        self.automator.click_until(self.click_one_short_reserve_btn, lambda: not self.one_short_reserve_btn_exists(),
+                                   description="点击一键订座")
 
 
 class QingniaoUnitProcess(QingNiaoAutoProcess):
     """
         青鸟电竞联盟
     """
+    MINI_PROGRAM_NAME = '青鸟电竞联盟'
+    SEARCH_KEYWORD = 'qingniaodianjinglianmeng'
+
+    def mini_program_opened(self):
+        return self.fast_enter_btn_exists()
 
     def click_qingniao_text_btn(self):
         self.automator.click_element('青鸟电竞联盟', by='text')
@@ -252,37 +357,26 @@ class QingniaoUnitProcess(QingNiaoAutoProcess):
         return self.automator.element_exists('一键订座', by='text')
 
     def main_process(self):
-        self.open_wechat()
-        if not self.search_bar_exists():
-            self.enter_search_page()
-        self.input_search_content("qingniaodianjinglianmeng")
-        retry_times = 0
-        while not self.fast_enter_btn_exists():
-            time.sleep(1)
-            self.click_qingniao_text_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
-        retry_times = 0
-        while not self.one_short_reserve_btn_exists():
-            time.sleep(1)
-            self.click_fast_enter_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
-        retry_times = 0
-        while self.one_short_reserve_btn_exists():
-            time.sleep(1)
-            self.click_one_short_reserve_btn()
-            retry_times += 1
-            if retry_times > 5:
-                break
+        # 打开青鸟电竞联盟小程序，直到快捷入口出现
+        if not self.launch_mini_program():
+            return
+        # 点击快捷入口，直到一键订座出现
+        self.automator.click_until(self.click_fast_enter_btn, self.one_short_reserve_btn_exists,
+                                   description="点击快捷入口")
+        # 点击一键订座，直到按钮消失
+        self.automator.click_until(self.click_one_short_reserve_btn, lambda: not self.one_short_reserve_btn_exists(),
+                                   description="点击一键订座")
 
 
 class DianfengVSProcess(QingNiaoAutoProcess):
     """
         巅峰VS电竞
     """
+    MINI_PROGRAM_NAME = '巅峰VS电竞'
+    SEARCH_KEYWORD = 'dianfeng'
+
+    def mini_program_opened(self):
+        return self.nearby_offstore_enter_btn_exists()
 
     def click_dianfeng_item(self):
         self.automator.click_element('巅峰VS电竞', by='text')
@@ -290,12 +384,13 @@ class DianfengVSProcess(QingNiaoAutoProcess):
     def click_nearby_offstore_enter_btn(self):
         self.automator.click_element('附近门店', by='text')
 
+    def nearby_offstore_enter_btn_exists(self):
+        return self.automator.element_exists('附近门店', by='text')
+
     def main_process(self):
-        self.open_wechat()
-        if not self.search_bar_exists():
-            self.enter_search_page()
-        self.input_search_content('dianfeng')
-        self.click_dianfeng_item()
+        # 打开巅峰VS电竞小程序，直到附近门店出现
+        if not self.launch_mini_program():
+            return
         self.click_nearby_offstore_enter_btn()
 
 
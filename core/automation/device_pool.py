@@ -0,0 +1,167 @@
+import queue
+import threading
+import subprocess
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config.settings import AutomationConfig
+from core.automation.device_session import get_device_session_manager
+
+# 未配置 DEVICE_SERIALS 时优先使用的设备，与 AndroidAutomation 的默认设备一致
+DEFAULT_SERIAL = 'emulator-5558'
+
+
+def discover_devices() -> List[str]:
+    """
+    发现adb中所有在线的设备
+
+    Returns:
+        list: 状态为 device 的设备序列号，按序列号排序
+    """
+    try:
+        result = subprocess.run(["adb", "devices"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"获取设备列表失败: {e}")
+        return []
+    serials = []
+    for line in result.stdout.strip().split('\n')[1:]:  # 跳过标题行
+        parts = line.split("\t")
+        if len(parts) == 2 and parts[1].strip() == "device":
+            serials.append(parts[0].strip())
+    return sorted(serials)
+
+
+def default_serials() -> List[str]:
+    """
+    未配置设备时使用的设备：自动发现的设备中 DEFAULT_SERIAL 排在最前，
+    它在线且只使用一台设备（PROXY_PORT_COUNT=1）时总是使用它；没有发现任何设备时也使用 DEFAULT_SERIAL
+
+    Returns:
+        list: 设备序列号
+    """
+    serials = discover_devices()
+    if DEFAULT_SERIAL in serials:
+        serials.remove(DEFAULT_SERIAL)
+        serials.insert(0, DEFAULT_SERIAL)
+    return serials or [DEFAULT_SERIAL]
+
+
+class DeviceSlot:
+    """设备池中的一台设备及其专属的代理端口"""
+
+    def __init__(self, serial: str, proxy_port: int):
+        self.serial = serial
+        self.proxy_port = proxy_port
+
+    def __repr__(self):
+        return f"DeviceSlot({self.serial}, {self.proxy_port})"
+
+
+class DevicePool:
+    """
+    设备池
+    每台设备分配一个代理端口（PROXY_BASE_PORT 起依次递增），任务按顺序分配给空闲的设备并行执行，
+    同一台设备同一时间只执行一个任务
+    """
+
+    def __init__(self, serials: Optional[Sequence[str]] = None, base_port: Optional[int] = None,
+                 max_devices: Optional[int] = None, auto_setup: Optional[bool] = None):
+        """
+        Args:
+            serials: 设备序列号，默认为 DEVICE_SERIALS，未配置时自动发现（优先使用 DEFAULT_SERIAL）
+            base_port: 代理起始端口，默认为 PROXY_BASE_PORT
+            max_devices: 最多使用的设备数，默认为代理监听的端口数 PROXY_PORT_COUNT
+            auto_setup: 是否自动设置设备代理，默认为 DEVICE_PROXY_AUTO_SETUP
+        """
+        serials = list(serials or AutomationConfig.DEVICE_SERIALS or default_serials())
+        base_port = AutomationConfig.PROXY_BASE_PORT if base_port is None else base_port
+        max_devices = AutomationConfig.PROXY_PORT_COUNT if max_devices is None else max_devices
+        self.auto_setup = AutomationConfig.DEVICE_PROXY_AUTO_SETUP if auto_setup is None else auto_setup
+        if len(serials) > max_devices:
+            print(f"发现 {len(serials)} 台设备，代理只监听 {max_devices} 个端口，只使用前 {max_devices} 台: "
+                  f"{serials[:max_devices]}")
+        self.slots = [DeviceSlot(serial, base_port + index) for index, serial in enumerate(serials[:max_devices])]
+
+    @property
+    def shares_proxy(self) -> bool:
+        """只有一台设备时不按端口区分cookie，与单设备采集时一样取最新的cookie"""
+        return len(self.slots) <= 1
+
+    def cookie_port(self, slot: DeviceSlot) -> Optional[int]:
+        """查询该设备cookie时使用的代理端口，不需要区分时返回None"""
+        return None if self.shares_proxy else slot.proxy_port
+
+    def setup_proxy(self, slot: DeviceSlot) -> bool:
+        """
+        将设备的代理指向其专属端口：adb reverse 把设备上的端口转发到本机同一端口，
+        设备全局代理设置为 127.0.0.1:端口
+
+        Returns:
+            bool: 是否设置成功
+        """
+        try:
+            result = subprocess.run(
+                ["adb", "-s", slot.serial, "reverse", f"tcp:{slot.proxy_port}", f"tcp:{slot.proxy_port}"],
+                capture_output=True, text=True, timeout=10
+            )
+            if result.returncode != 0:
+                print(f"设备 {slot.serial} 端口转发失败: {result.stderr.strip()}")
+                return False
+            shell = get_device_session_manager().get_shell(slot.serial)
+            result = shell.run(["settings", "put", "global", "http_proxy", f"127.0.0.1:{slot.proxy_port}"])
+            if result.returncode != 0:
+                print(f"设备 {slot.serial} 设置代理失败: {result.stdout.strip()}")
+                return False
+            print(f"设备 {slot.serial} 的代理已指向端口 {slot.proxy_port}")
+            return True
+        except Exception as e:
+            print(f"设备 {slot.serial} 设置代理时出错: {e}")
+            return False
+
+    def run(self, tasks: Sequence[Any], worker: Callable[[DeviceSlot, Any], Dict]) -> List[Dict]:
+        """
+        在设备池上执行任务，每台设备一个线程，依次领取下一个任务
+
+        Args:
+            tasks: 任务列表
+            worker: 执行单个任务的函数 worker(slot, task)，返回结果字典
+
+        Returns:
+            list: 与 tasks 顺序一致的结果，任务出错时为 {"success": False, "error_msg": ...}
+        """
+        results: List[Optional[Dict]] = [None] * len(tasks)
+        if not self.slots:
+            print("没有可用的设备")
+            return [{"success": False, "error_msg": "没有可用的设备"} for _ in tasks]
+
+        pending = queue.Queue()
+        for index, task in enumerate(tasks):
+            pending.put((index, task))
+
+        def device_loop(slot: DeviceSlot):
+            if self.auto_setup and not self.setup_proxy(slot):
+                # 代理未指向专属端口时抓到的cookie无法归属到该设备，不领取任务
+                return
+            while True:
+                try:
+                    index, task = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = worker(slot, task)
+                except Exception as e:
+                    print(f"设备 {slot.serial} 执行任务 {task} 出错: {e}")
+                    results[index] = {"success": False, "error_msg": str(e)}
+
+        if len(self.slots) == 1:
+            device_loop(self.slots[0])
+        else:
+            threads = [threading.Thread(target=device_loop, args=(slot,), name=f"device-{slot.serial}")
+                       for slot in self.slots]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # 所有设备都不可用时剩下的任务没有执行
+        return [result if result is not None else {"success": False, "error_msg": "没有可用的设备执行该任务"}
+                for result in results]
@@ -0,0 +1,230 @@
+import time
+import threading
+import subprocess
+from typing import Dict, Optional
+
+import uiautomator2 as u2
+
+from core.automation.adb_shell import AdbShell
+from core.automation.flow_recorder import instrument_device
+from core.automation.waits import wait_until
+
+
+def adb_get_state(serial: Optional[str] = None, timeout: float = 5) -> Optional[str]:
+    """
+    查询设备状态（adb get-state），用于低成本的健康检查
+
+    Args:
+        serial: 设备序列号，None表示默认设备
+        timeout: 超时时间（秒），adb服务卡死时命令不会返回
+
+    Returns:
+        str: 设备状态，如 device、offline、unauthorized；adb无响应时返回None
+    """
+    cmd = ["adb", "-s", serial, "get-state"] if serial else ["adb", "get-state"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    if result.returncode != 0:
+        # 设备不存在或离线时 get-state 返回非0，错误信息中包含原因
+        return (result.stderr or "").strip() or "unknown"
+    return result.stdout.strip()
+
+
+def restart_adb_server(serial: Optional[str] = None, timeout: float = 15) -> bool:
+    """
+    重启adb服务（kill-server + start-server），并等待设备重新上线
+
+    Args:
+        serial: 需要等待上线的设备序列号，None表示默认设备
+        timeout: 等待设备上线的超时时间（秒）
+
+    Returns:
+        bool: 设备是否重新上线
+    """
+    print("adb服务无响应，正在重启adb服务")
+    try:
+        subprocess.run(["adb", "kill-server"], capture_output=True, text=True, timeout=10)
+    except subprocess.TimeoutExpired:
+        print("adb kill-server 超时")
+    try:
+        result = subprocess.run(["adb", "start-server"], capture_output=True, text=True, timeout=15)
+        if result.returncode != 0:
+            print(f"adb start-server 命令失败: {result.stderr}")
+            return False
+    except subprocess.TimeoutExpired:
+        print("adb start-server 超时")
+        return False
+    online = wait_until(lambda: adb_get_state(serial) == "device", timeout=timeout, interval=0.2)
+    print("adb服务已重启，设备已上线" if online else "adb服务已重启，但设备未上线")
+    return online
+
+
+class DeviceSession:
+    """一个设备的 uiautomator2 连接、adb shell 通道及其健康状态"""
+
+    def __init__(self, serial: Optional[str], device):
+        self.serial = serial
+        self.device = device
+        self.shell = AdbShell(serial)  # 首次执行命令时才启动
+        self.initialized = False  # 是否已完成ATX检查等首次连接的初始化
+        self.adb_generation = 0  # 建立连接时adb服务的重启代数，adb服务重启后需要重新连接
+        self.last_check = time.monotonic()
+        self.lock = threading.RLock()
+
+
+class DeviceSessionManager:
+    """
+    设备会话管理器
+    每个设备序列号只保留一个 uiautomator2 连接，供所有品牌流程共享；
+    取用时做低成本的健康检查（adb get-state + 设备信息），只有adb确实无响应时才重启adb服务；
+    多台设备并行时重启只由一个线程执行，重启后所有设备的会话在下次取用时重新连接
+    """
+
+    # 两次健康检查的最小间隔（秒），间隔内直接复用连接
+    HEALTH_CHECK_INTERVAL = 30
+
+    def __init__(self):
+        self._sessions: Dict[Optional[str], DeviceSession] = {}
+        self._lock = threading.Lock()
+        # adb服务是所有设备共用的，重启需要串行执行
+        self._restart_lock = threading.Lock()
+        self._adb_generation = 0
+        self.stats = {"connects": 0, "health_checks": 0, "reconnects": 0, "adb_restarts": 0}
+
+    def _connect(self, serial: Optional[str]):
+        """建立 uiautomator2 连接"""
+        self.stats["connects"] += 1
+        device = u2.connect(serial) if serial else u2.connect()
+        if not device:
+            raise Exception("无法连接到安卓设备")
+        # 设备的jsonrpc和shell调用计入当前记录的流程步骤
+        return instrument_device(device)
+
+    def _ensure_adb(self, serial: Optional[str]) -> bool:
+        """检查adb和设备状态，adb无响应时重启adb服务"""
+        state = adb_get_state(serial)
+        if state is None:
+            with self._restart_lock:
+                # 等待锁期间其他线程可能已经重启过adb服务，重新检查
+                state = adb_get_state(serial)
+                if state is None:
+                    self.stats["adb_restarts"] += 1
+                    # 重启会断开所有设备的端口转发和adb shell通道，各会话在下次取用时重新连接
+                    self._adb_generation += 1
+                    if not restart_adb_server(serial):
+                        return False
+                    state = adb_get_state(serial)
+        if state != "device":
+            print(f"设备 {serial or '默认设备'} 状态异常: {state}")
+            return False
+        return True
+
+    def _reconnect(self, session: DeviceSession):
+        """重新建立会话的 uiautomator2 连接，记录当前的adb服务重启代数"""
+        generation = self._adb_generation
+        session.device = self._connect(session.serial)
+        session.adb_generation = generation
+        session.last_check = time.monotonic()
+
+    def _check_health(self, session: DeviceSession) -> bool:
+        """
+        健康检查：adb能查到设备且 uiautomator2 能返回设备信息，
+        uiautomator2 无响应时重新连接（不重启adb服务）
+
+        Returns:
+            bool: 会话是否可用
+        """
+        self.stats["health_checks"] += 1
+        if not self._ensure_adb(session.serial):
+            return False
+        if session.adb_generation != self._adb_generation:
+            # 检查时重启了adb服务，端口转发已失效
+            self.stats["reconnects"] += 1
+            session.shell.close()
+            self._reconnect(session)
+            return True
+        try:
+            session.device.info
+        except Exception as e:
+            print(f"设备 {session.serial} 的uiautomator2连接无响应，重新连接: {e}")
+            self.stats["reconnects"] += 1
+            self._reconnect(session)
+        session.last_check = time.monotonic()
+        return True
+
+    def get_session(self, serial: Optional[str] = None, force_check: bool = False) -> DeviceSession:
+        """
+        获取设备会话，没有会话时建立连接，距上次检查超过 HEALTH_CHECK_INTERVAL 时先做健康检查
+
+        Args:
+            serial: 设备序列号或IP地址，None表示默认设备
+            force_check: 是否忽略检查间隔，立即做健康检查
+
+        Returns:
+            DeviceSession: 设备会话
+
+        Raises:
+            Exception: 设备不可用
+        """
+        with self._lock:
+            session = self._sessions.get(serial)
+            if session is None:
+                session = DeviceSession(serial, None)
+                self._sessions[serial] = session
+
+        with session.lock:
+            if session.device is None:
+                if not self._ensure_adb(serial):
+                    raise Exception(f"设备 {serial or '默认设备'} 不可用")
+                self._reconnect(session)
+            elif session.adb_generation != self._adb_generation:
+                # 建立连接后adb服务被重启过（可能由其他设备的线程触发），端口转发已失效
+                print(f"adb服务已重启，设备 {serial or '默认设备'} 重新连接")
+                if not self._ensure_adb(serial):
+                    raise Exception(f"设备 {serial or '默认设备'} 不可用")
+                self.stats["reconnects"] += 1
+                session.shell.close()
+                self._reconnect(session)
+            elif force_check or time.monotonic() - session.last_check > self.HEALTH_CHECK_INTERVAL:
+                if not self._check_health(session):
+                    raise Exception(f"设备 {serial or '默认设备'} 不可用")
+            return session
+
+    def close_session(self, serial: Optional[str] = None):
+        """丢弃设备会话并关闭其adb shell通道，下次取用时重新连接"""
+        with self._lock:
+            session = self._sessions.pop(serial, None)
+        if session is not None:
+            session.shell.close()
+
+    def get_shell(self, serial: Optional[str] = None) -> AdbShell:
+        """
+        获取设备的adb shell通道，不建立 uiautomator2 连接
+
+        Args:
+            serial: 设备序列号，None表示默认设备
+
+        Returns:
+            AdbShell: 设备的adb shell通道
+        """
+        with self._lock:
+            session = self._sessions.get(serial)
+            if session is None:
+                session = DeviceSession(serial, None)
+                self._sessions[serial] = session
+            return session.shell
+
+
+_session_manager = None
+_session_manager_lock = threading.Lock()
+
+
+def get_device_session_manager() -> DeviceSessionManager:
+    """获取进程内共享的设备会话管理器"""
+    global _session_manager
+    with _session_manager_lock:
+        if _session_manager is None:
+            _session_manager = DeviceSessionManager()
+        return _session_manager
@@ -0,0 +1,334 @@
+"""
+自动化流程跟踪
+
+一次品牌流程（如吉姆电竞）运行时，记录每个步骤的选择器、设备RPC次数（uiautomator2 jsonrpc 调用和 adb shell 命令）、
+耗时和重试次数，运行结束后追加写入 cache/flow_traces.jsonl，每行一次运行。
+汇总多次运行中最慢的步骤，用于根据真实数据调整等待时间和选择器。
+
+使用方法：
+    python -m core.automation.flow_recorder --top 20
+    python -m core.automation.flow_recorder --flow JiMuProcess --last 50
+"""
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# 添加项目根目录到Python路径，以便正确导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config.settings import CacheConfig
+
+TRACE_FILE_NAME = "flow_traces.jsonl"
+
+# 当前线程正在记录的流程（每台设备由一个线程驱动）
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def get_trace_path() -> str:
+    """流程跟踪文件路径"""
+    return os.path.join(CacheConfig.CACHE_DIR, TRACE_FILE_NAME)
+
+
+def current_recorder() -> Optional["FlowRecorder"]:
+    """当前线程正在记录的流程，没有时返回None"""
+    return getattr(_local, "recorder", None)
+
+
+def count_rpc(kind: str):
+    """记录一次设备RPC，没有正在记录的流程时忽略"""
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.count_rpc(kind)
+
+
+def count_retry():
+    """记录当前步骤的一次重试，没有正在记录的流程时忽略"""
+    recorder = current_recorder()
+    if recorder is not None:
+        recorder.count_retry()
+
+
+class FlowRecorder:
+    """
+    流程记录器
+    作为上下文管理器使用时成为当前线程的记录器，期间 AndroidAutomation 的操作都会记录为步骤，
+    步骤可以嵌套（如 click_until 中的 click_element），RPC次数同时计入所有外层步骤
+    """
+
+    def __init__(self, flow: str, device: Optional[str] = None, trace_path: Optional[str] = None):
+        """
+        Args:
+            flow: 流程名称，如 JiMuProcess
+            device: 执行流程的设备序列号
+            trace_path: 跟踪文件路径，默认为 cache/flow_traces.jsonl
+        """
+        self.flow = flow
+        self.device = device
+        self.trace_path = trace_path or get_trace_path()
+        self.steps: List[Dict[str, Any]] = []
+        self._stack: List[Dict[str, Any]] = []
+        self._previous = None
+        self._start = None
+        self._rpc: Dict[str, int] = {}
+        self.run: Dict[str, Any] = {}
+
+    def __enter__(self):
+        self._previous = current_recorder()
+        _local.recorder = self
+        self._start = time.perf_counter()
+        self.run = {"flow": self.flow, "device": self.device, "started_at": datetime.now().isoformat(timespec="seconds")}
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _local.recorder = self._previous
+        self.run.update({
+            "success": exc_type is None,
+            "error_msg": str(exc_val) if exc_val else None,
+            "wall_ms": round((time.perf_counter() - self._start) * 1000, 1),
+            "rpc": sum(self._rpc.values()),
+            "rpc_by_kind": self._rpc,
+            "steps": self.steps,
+        })
+        self.save()
+        print(f"{self.flow} 流程用时 {self.run['wall_ms'] / 1000:.1f}s，设备RPC {self.run['rpc']} 次，"
+              f"步骤 {len(self.steps)} 个")
+        return False
+
+    @contextmanager
+    def step(self, name: str, selector: Optional[str] = None):
+        """
+        记录一个步骤
+
+        Args:
+            name: 步骤名称，如 click_element、open_wechat
+            selector: 步骤的选择器或参数，如 text:会员中心
+        """
+        record = {"name": name, "selector": selector, "depth": len(self._stack),
+                  "rpc": 0, "retries": 0, "ok": True, "wall_ms": 0.0}
+        self.steps.append(record)
+        self._stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record["ok"] = False
+            raise
+        finally:
+            record["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._stack.pop()
+
+    def count_rpc(self, kind: str):
+        """本次运行和当前所有未结束的步骤的RPC次数加一"""
+        self._rpc[kind] = self._rpc.get(kind, 0) + 1
+        for record in self._stack:
+            record["rpc"] += 1
+
+    def count_retry(self):
+        """当前步骤的重试次数加一"""
+        if self._stack:
+            self._stack[-1]["retries"] += 1
+
+    def save(self):
+        """将本次运行追加写入跟踪文件"""
+        try:
+            os.makedirs(os.path.dirname(self.trace_path), exist_ok=True)
+            with _write_lock:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(self.run, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"保存流程跟踪失败: {e}")
+
+
+@contextmanager
+def trace_step(name: str, selector: Optional[str] = None):
+    """记录一个步骤，没有正在记录的流程时不做任何事，返回步骤记录或None"""
+    recorder = current_recorder()
+    if recorder is None:
+        yield None
+        return
+    with recorder.step(name, selector) as record:
+        yield record
+
+
+def flow_step(name: Optional[str] = None, selector_args: tuple = ()):
+    """
+    将方法记录为流程步骤的装饰器，没有正在记录的流程时直接调用
+
+    Args:
+        name: 步骤名称，默认为方法名
+        selector_args: 作为选择器记录的参数名，如 ("by", "selector")，多个参数按顺序以冒号拼接（text:会员中心）
+
+    Returns:
+        装饰器；方法返回False时步骤记为失败
+    """
+
+    def decorator(func: Callable):
+        signature = inspect.signature(func)
+        step_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = current_recorder()
+            if recorder is None:
+                return func(*args, **kwargs)
+            selector = None
+            if selector_args:
+                bound = signature.bind_partial(*args, **kwargs)
+                bound.apply_defaults()
+                values = [str(bound.arguments[arg]) for arg in selector_args
+                          if bound.arguments.get(arg) is not None]
+                selector = ":".join(values) or None
+            with recorder.step(step_name, selector) as record:
+                result = func(*args, **kwargs)
+                if result is False:
+                    record["ok"] = False
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+# 各版本 uiautomator2 中每次 jsonrpc 请求都会经过的方法：3.x 为 jsonrpc_call，
+# 2.x（requirements.txt 固定的 2.16.22）没有公开的 jsonrpc_call，由 jsonrpc 包装器经 _jsonrpc_retry_call 调用 _jsonrpc_call
+JSONRPC_HOOKS = ("jsonrpc_call", "_jsonrpc_call")
+
+
+def _wrap_counted(device, method_name: str, kind: str):
+    """将设备对象的方法替换为先计数再调用原方法的包装"""
+    method = getattr(device, method_name)
+
+    def counted(*args, **kwargs):
+        count_rpc(kind)
+        return method(*args, **kwargs)
+
+    setattr(device, method_name, counted)
+
+
+def instrument_device(device):
+    """
+    统计设备的RPC：包装 uiautomator2 设备对象发送 jsonrpc 请求的方法（见 JSONRPC_HOOKS）和 shell，
+    每次调用计入当前线程正在记录的流程；同一设备对象只包装一次
+    """
+    if device is None or getattr(device, "_flow_recorder_instrumented", False):
+        return device
+    jsonrpc_hook = next((name for name in JSONRPC_HOOKS if callable(getattr(device, name, None))), None)
+    if jsonrpc_hook is None:
+        print(f"警告: 设备对象 {type(device).__name__} 没有 {' / '.join(JSONRPC_HOOKS)} 方法，"
+              f"流程跟踪中不会统计 uiautomator2 RPC 次数")
+    else:
+        # 统一记为 jsonrpc_call，不同版本的跟踪可以一起汇总
+        _wrap_counted(device, jsonrpc_hook, "jsonrpc_call")
+    if callable(getattr(device, "shell", None)):
+        _wrap_counted(device, "shell", "shell")
+    device._flow_recorder_instrumented = True
+    return device
+
+
+def load_traces(trace_path: Optional[str] = None, flow: Optional[str] = None,
+                last: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    读取流程跟踪
+
+    Args:
+        trace_path: 跟踪文件路径，默认为 cache/flow_traces.jsonl
+        flow: 只读取该流程的运行
+        last: 只读取最近的N次运行
+
+    Returns:
+        list: 每次运行的记录，按写入顺序
+    """
+    trace_path = trace_path or get_trace_path()
+    if not os.path.exists(trace_path):
+        return []
+    runs = []
+    with open(trace_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                run = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if flow is None or run.get("flow") == flow:
+                runs.append(run)
+    return runs[-last:] if last else runs
+
+
+def summarize_traces(runs: List[Dict[str, Any]], top: int = 20) -> Dict[str, Any]:
+    """
+    汇总多次运行：每个流程的平均用时和成功率，以及平均用时最长的步骤
+
+    Args:
+        runs: load_traces 返回的运行记录
+        top: 返回的最慢步骤数
+
+    Returns:
+        dict: {"flows": [...], "slowest_steps": [...]}
+    """
+    flows: Dict[str, Dict[str, Any]] = {}
+    steps: Dict[tuple, Dict[str, Any]] = {}
+    for run in runs:
+        flow = flows.setdefault(run.get("flow"), {"flow": run.get("flow"), "runs": 0, "success": 0,
+                                                  "total_ms": 0.0, "rpc": 0})
+        flow["runs"] += 1
+        flow["success"] += 1 if run.get("success") else 0
+        flow["total_ms"] += run.get("wall_ms", 0)
+        flow["rpc"] += run.get("rpc", 0)
+        for step in run.get("steps", []):
+            key = (run.get("flow"), step["name"], step.get("selector"))
+            item = steps.setdefault(key, {"flow": key[0], "name": key[1], "selector": key[2], "depth": step["depth"],
+                                          "count": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                          "rpc": 0, "retries": 0})
+            item["count"] += 1
+            item["failed"] += 0 if step.get("ok", True) else 1
+            item["total_ms"] += step["wall_ms"]
+            item["max_ms"] = max(item["max_ms"], step["wall_ms"])
+            item["rpc"] += step["rpc"]
+            item["retries"] += step["retries"]
+            item["depth"] = min(item["depth"], step["depth"])
+
+    for item in list(flows.values()) + list(steps.values()):
+        count = item.get("runs") or item.get("count")
+        item["avg_ms"] = round(item["total_ms"] / count, 1)
+        item["avg_rpc"] = round(item["rpc"] / count, 1)
+    slowest = sorted(steps.values(), key=lambda item: item["avg_ms"], reverse=True)[:top]
+    return {"flows": sorted(flows.values(), key=lambda item: item["avg_ms"], reverse=True), "slowest_steps": slowest}
+
+
+def print_summary(summary: Dict[str, Any]):
+    """打印汇总结果"""
+    print("流程                      运行次数  成功  平均用时(s)  平均RPC")
+    for flow in summary["flows"]:
+        print(f"{str(flow['flow']):<26}{flow['runs']:>8}{flow['success']:>6}{flow['avg_ms'] / 1000:>13.1f}"
+              f"{flow['avg_rpc']:>9.1f}")
+    print()
+    print("最慢的步骤（按平均用时排序）")
+    print("平均(ms)   最大(ms)  次数  失败  重试  平均RPC  流程 / 步骤 / 选择器")
+    for step in summary["slowest_steps"]:
+        indent = "  " * step["depth"]
+        print(f"{step['avg_ms']:>8.0f}{step['max_ms']:>11.0f}{step['count']:>6}{step['failed']:>6}"
+              f"{step['retries']:>6}{step['avg_rpc']:>9.1f}  {step['flow']} / {indent}{step['name']}"
+              f"{' / ' + step['selector'] if step['selector'] else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="汇总自动化流程跟踪中最慢的步骤")
+    parser.add_argument('--flow', help="只汇总该流程，如 JiMuProcess")
+    parser.add_argument('--last', type=int, help="只汇总最近的N次运行")
+    parser.add_argument('--top', type=int, default=20, help="显示的最慢步骤数")
+    parser.add_argument('--file', help="跟踪文件路径，默认为 cache/flow_traces.jsonl")
+    args = parser.parse_args()
+
+    traces = load_traces(args.file, args.flow, args.last)
+    if not traces:
+        print("没有流程跟踪记录")
+    else:
+        print_summary(summarize_traces(traces, args.top))
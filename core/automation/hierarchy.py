@@ -0,0 +1,102 @@
+import re
+import time
+from typing import List, Optional, Tuple
+
+from lxml import etree
+
+# 选择器类型与界面层级中节点属性的对应关系
+SELECTOR_ATTRIBUTES = {
+    "text": "text",
+    "resourceId": "resource-id",
+    "className": "class",
+    "description": "content-desc",
+}
+# 支持在本地求值的选择器类型
+SELECTOR_TYPES = ("text", "resourceId", "className", "description", "xpath",
+                  "textContains", "textStartsWith", "resourceIdMatches")
+BOUNDS_PATTERN = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+
+class HierarchySnapshot:
+    """
+    界面层级快照
+    一次 dump_hierarchy 的结果解析为 lxml 树，在本地对 text/resourceId/XPath 等选择器求值，
+    同一个步骤内的多次查找不再逐个向设备发请求
+    """
+
+    def __init__(self, xml: str):
+        """
+        解析界面层级
+
+        Args:
+            xml: d.dump_hierarchy() 返回的XML
+        """
+        self.created_at = time.monotonic()
+        self.root = etree.fromstring(xml.encode("utf-8") if isinstance(xml, str) else xml)
+        # 与 uiautomator2 的 xpath 插件一致：节点标签改为类名，支持 //android.widget.ImageView 这样的写法
+        for node in self.root.iter("node"):
+            node.tag = (node.get("class") or "node").replace("$", "-")
+
+    @property
+    def age(self) -> float:
+        """快照创建后经过的时间（秒）"""
+        return time.monotonic() - self.created_at
+
+    def find_all(self, selector: str, by: str = "text") -> List[etree._Element]:
+        """
+        查找所有匹配的节点
+
+        Args:
+            selector: 选择器值
+            by: 选择器类型，可选值: "text", "resourceId", "className", "description", "xpath",
+                "textContains", "textStartsWith", "resourceIdMatches"
+
+        Returns:
+            list: 匹配的节点，按文档顺序
+        """
+        if by == "xpath":
+            return [node for node in self.root.xpath(selector) if isinstance(node, etree._Element)]
+        if by in SELECTOR_ATTRIBUTES:
+            attribute = SELECTOR_ATTRIBUTES[by]
+            return [node for node in self.root.iter() if node.get(attribute) == selector]
+        if by == "textContains":
+            return [node for node in self.root.iter() if selector in (node.get("text") or "")]
+        if by == "textStartsWith":
+            return [node for node in self.root.iter() if (node.get("text") or "").startswith(selector)]
+        if by == "resourceIdMatches":
+            pattern = re.compile(selector)
+            return [node for node in self.root.iter() if pattern.fullmatch(node.get("resource-id") or "")]
+        raise ValueError(f"不支持的选择器类型: {by}")
+
+    def find(self, selector: str, by: str = "text") -> Optional[etree._Element]:
+        """查找第一个匹配的节点，没有时返回None"""
+        nodes = self.find_all(selector, by)
+        return nodes[0] if nodes else None
+
+    def exists(self, selector: str, by: str = "text") -> bool:
+        """判断是否存在匹配的节点"""
+        return self.find(selector, by) is not None
+
+    @staticmethod
+    def bounds(node: etree._Element) -> Optional[Tuple[int, int, int, int]]:
+        """
+        解析节点的屏幕区域
+
+        Returns:
+            tuple: (x1, y1, x2, y2)，节点没有有效区域时返回None
+        """
+        match = BOUNDS_PATTERN.match(node.get("bounds") or "")
+        if not match:
+            return None
+        x1, y1, x2, y2 = map(int, match.groups())
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
+
+    @classmethod
+    def center(cls, node: etree._Element) -> Optional[Tuple[int, int]]:
+        """节点区域的中心坐标，没有有效区域时返回None"""
+        bounds = cls.bounds(node)
+        if bounds is None:
+            return None
+        return (bounds[0] + bounds[2]) // 2, (bounds[1] + bounds[3]) // 2
@@ -0,0 +1,508 @@
+import os
+import math
+import time
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from config.settings import AutomationConfig, CacheConfig
+from core.utils.tools.tools import load_json_file, save_json_file
+
+
+class TemplateCache:
+    """
+    图片模板缓存
+    模板只从磁盘读取一次并转换为灰度图，以 (路径, 修改时间) 为键缓存，模板文件被替换后自动重新加载
+    """
+
+    def __init__(self):
+        self._templates: Dict[str, Tuple[int, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_gray(template_path: str) -> Optional[np.ndarray]:
+        """读取灰度图（用 imdecode 读取，兼容中文路径）"""
+        data = np.fromfile(template_path, dtype=np.uint8)
+        if data.size == 0:
+            return None
+        return cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+
+    def get(self, template_path: str) -> Optional[np.ndarray]:
+        """
+        获取灰度模板
+
+        Args:
+            template_path: 模板图片路径
+
+        Returns:
+            np.ndarray: 灰度模板，文件不存在或无法解码时返回None
+        """
+        path = os.path.abspath(template_path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._templates.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+
+        template = self._read_gray(path)
+        if template is None:
+            return None
+        with self._lock:
+            self._templates[path] = (mtime, template)
+        return template
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._templates.clear()
+
+
+def find_peaks(result: np.ndarray, threshold: float, neighborhood: Tuple[int, int]):
+    """
+    从匹配结果矩阵中提取满足阈值的局部极大值点（用膨胀代替逐点比较）
+
+    Args:
+        result: cv2.matchTemplate 的结果矩阵
+        threshold: 匹配阈值
+        neighborhood: 局部极大值的邻域大小 (宽, 高)
+
+    Returns:
+        tuple: (x坐标数组, y坐标数组, 得分数组)
+    """
+    kernel = np.ones((max(neighborhood[1], 1), max(neighborhood[0], 1)), np.uint8)
+    dilated = cv2.dilate(result, kernel)
+    ys, xs = np.nonzero((result >= threshold) & (result >= dilated))
+    return xs, ys, result[ys, xs]
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.3) -> np.ndarray:
+    """
+    按IoU做非极大值抑制，重叠的框只保留得分最高的一个
+
+    Args:
+        boxes: N x 4 的框数组 (x1, y1, x2, y2)
+        scores: 长度为N的得分数组
+        iou_threshold: 与已保留框的IoU超过该值的框被抑制
+
+    Returns:
+        np.ndarray: 保留的框的下标，按得分从高到低
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    boxes = boxes.astype(np.float64)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(scores, kind='stable')[::-1]
+
+    keep = []
+    while order.size:
+        current, rest = order[0], order[1:]
+        keep.append(current)
+        # 当前框与其余所有框的交集一次算出
+        inter_w = np.clip(np.minimum(x2[current], x2[rest]) - np.maximum(x1[current], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[current], y2[rest]) - np.maximum(y1[current], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[current] + areas[rest] - inter)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class TemplateMatcher:
+    """
+    模板匹配引擎
+    - 区域提示：模板可以登记一个相对屏幕的查找区域 (x1, y1, x2, y2)，先在区域内查找，找不到再查全屏
+    - 粗到精：先在缩小的画面上粗匹配定位，再在原分辨率下只对候选位置附近的小窗口精匹配
+    - 多尺度：按设备分辨率推算模板缩放比例并在其附近尝试几个比例，命中后按（模板, 分辨率）记住该比例
+    - 统计：按模板记录匹配耗时和得分，用于调整模板和阈值
+    """
+
+    # 相对按分辨率推算的比例依次尝试的缩放系数
+    SCALE_STEPS = (1.0, 0.9, 1.1, 0.8, 1.2)
+    # 粗匹配时模板短边的最小像素，更小的模板直接在原分辨率下匹配
+    MIN_COARSE_SIZE = 16
+    # 粗匹配得分低于 阈值 - COARSE_SLACK 时认为没有匹配，不再精匹配
+    COARSE_SLACK = 0.2
+    # 匹配统计写入本地文件的最小间隔（秒），匹配过程中按此间隔保存，不依赖流程结束时的保存
+    STATS_SAVE_INTERVAL = 60
+
+    def __init__(self, template_cache: Optional[TemplateCache] = None, base_width: Optional[int] = None,
+                 coarse_factor: Optional[float] = None, stats_path: Optional[str] = None):
+        """
+        初始化匹配引擎
+
+        Args:
+            template_cache: 模板缓存，默认使用进程内共享的缓存
+            base_width: 模板截取时设备屏幕的短边像素，默认为 AutomationConfig.TEMPLATE_BASE_WIDTH
+            coarse_factor: 粗匹配缩小比例，默认为 AutomationConfig.TEMPLATE_COARSE_FACTOR，0或1表示不做粗匹配
+            stats_path: 匹配统计文件路径，默认在 CacheConfig.CACHE_DIR 下
+        """
+        self.template_cache = template_cache or get_template_cache()
+        self.base_width = base_width or AutomationConfig.TEMPLATE_BASE_WIDTH
+        self.coarse_factor = AutomationConfig.TEMPLATE_COARSE_FACTOR if coarse_factor is None else coarse_factor
+        self.stats_path = stats_path or os.path.join(CacheConfig.CACHE_DIR, 'template_match_stats.json')
+        self.roi_hints: Dict[str, Tuple[float, float, float, float]] = {}
+        self._lock = threading.RLock()
+        # (模板路径, 缩放比例) -> (原模板, 缩放后的模板, 粗匹配模板)
+        self._scaled: Dict[Tuple[str, float], Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]] = {}
+        # 最近一次缩小的屏幕区域 (屏幕, 区域, 缩小后的区域)
+        self._coarse_screen = None
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        # (模板路径, 分辨率) -> 已确认的缩放比例，从统计文件中恢复
+        self._learned_scales: Dict[Tuple[str, str], float] = {}
+        self._last_saved = time.monotonic()
+        for path, stats in (load_json_file(self.stats_path) or {}).items():
+            self._stats[path] = stats
+            for resolution, scale in stats.get("scales", {}).items():
+                self._learned_scales[(path, resolution)] = scale
+
+    @property
+    def coarse_enabled(self) -> bool:
+        return 0 < self.coarse_factor < 1
+
+    def set_roi_hint(self, template_path: str, roi: Optional[Sequence[float]]):
+        """
+        登记模板的查找区域
+
+        Args:
+            template_path: 模板图片路径
+            roi: 相对屏幕宽高的区域 (x1, y1, x2, y2)，取值0-1，如 (0, 0.8, 1, 1) 为屏幕底部；None表示取消
+        """
+        path = os.path.abspath(template_path)
+        with self._lock:
+            if roi is None:
+                self.roi_hints.pop(path, None)
+            else:
+                self.roi_hints[path] = tuple(roi)
+
+    @staticmethod
+    def _roi_rect(screen_shape, roi) -> Tuple[int, int, int, int]:
+        """将相对区域换算为屏幕像素区域 (x1, y1, x2, y2)"""
+        height, width = screen_shape[:2]
+        if roi is None:
+            return 0, 0, width, height
+        x1, y1, x2, y2 = roi
+        return (max(int(x1 * width), 0), max(int(y1 * height), 0),
+                min(int(math.ceil(x2 * width)), width), min(int(math.ceil(y2 * height)), height))
+
+    @staticmethod
+    def _resolution(screen_shape) -> str:
+        return f"{screen_shape[1]}x{screen_shape[0]}"
+
+    def _candidate_scales(self, path: str, screen_shape) -> List[float]:
+        """候选缩放比例：已确认过的比例，或按分辨率推算的比例及其附近的几个比例"""
+        learned = self._learned_scales.get((path, self._resolution(screen_shape)))
+        if learned:
+            return [learned]
+        expected = min(screen_shape[:2]) / self.base_width
+        return [round(expected * step, 3) for step in self.SCALE_STEPS]
+
+    def _scaled_template(self, path: str, template: np.ndarray, scale: float):
+        """获取缩放后的模板和粗匹配模板（模板重新加载后自动重新生成）"""
+        key = (path, scale)
+        with self._lock:
+            cached = self._scaled.get(key)
+        if cached and cached[0] is template:
+            return cached[1], cached[2]
+
+        scaled = template
+        if scale != 1:
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            scaled = cv2.resize(template, None, fx=scale, fy=scale, interpolation=interpolation)
+        coarse = None
+        if self.coarse_enabled and min(scaled.shape[:2]) * self.coarse_factor >= self.MIN_COARSE_SIZE:
+            coarse = cv2.resize(scaled, None, fx=self.coarse_factor, fy=self.coarse_factor,
+                                interpolation=cv2.INTER_AREA)
+        with self._lock:
+            self._scaled[key] = (template, scaled, coarse)
+        return scaled, coarse
+
+    def _coarse_region(self, screen: np.ndarray, rect) -> np.ndarray:
+        """缩小的屏幕区域，同一帧同一区域只缩小一次"""
+        with self._lock:
+            cached = self._coarse_screen
+            if cached and cached[0] is screen and cached[1] == rect:
+                return cached[2]
+        x1, y1, x2, y2 = rect
+        coarse = cv2.resize(screen[y1:y2, x1:x2], None, fx=self.coarse_factor, fy=self.coarse_factor,
+                            interpolation=cv2.INTER_AREA)
+        with self._lock:
+            self._coarse_screen = (screen, rect, coarse)
+        return coarse
+
+    @staticmethod
+    def _best_in(region: np.ndarray, template: np.ndarray) -> Tuple[float, Optional[Tuple[int, int]]]:
+        """在区域内匹配模板，返回最高得分和左上角坐标，模板比区域大时返回 (-1, None)"""
+        if template.shape[0] > region.shape[0] or template.shape[1] > region.shape[1]:
+            return -1.0, None
+        result = cv2.matchTemplate(region, template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return float(max_val), max_loc
+
+    def _refine(self, screen: np.ndarray, rect, scaled: np.ndarray, approx: Tuple[int, int]):
+        """在粗匹配位置附近的小窗口内按原分辨率精匹配"""
+        margin = int(math.ceil(2 / self.coarse_factor)) + 2
+        height, width = scaled.shape[:2]
+        wx1, wy1 = max(rect[0], approx[0] - margin), max(rect[1], approx[1] - margin)
+        wx2, wy2 = min(rect[2], approx[0] + width + margin), min(rect[3], approx[1] + height + margin)
+        score, loc = self._best_in(screen[wy1:wy2, wx1:wx2], scaled)
+        if loc is None:
+            return score, None
+        return score, (loc[0] + wx1, loc[1] + wy1)
+
+    def _search(self, screen: np.ndarray, path: str, template: np.ndarray, rect, threshold: float):
+        """
+        在屏幕区域内按候选比例查找模板
+
+        Returns:
+            dict: 最佳匹配（可能低于阈值），模板在所有比例下都比区域大时返回None
+        """
+        x1, y1, x2, y2 = rect
+        region = screen[y1:y2, x1:x2]
+        best = None
+        for scale in self._candidate_scales(path, screen.shape):
+            scaled, coarse = self._scaled_template(path, template, scale)
+            if coarse is not None:
+                score, loc = self._best_in(self._coarse_region(screen, rect), coarse)
+                if loc is not None:
+                    loc = (int(loc[0] / self.coarse_factor) + x1, int(loc[1] / self.coarse_factor) + y1)
+            else:
+                score, loc = self._best_in(region, scaled)
+                if loc is not None:
+                    loc = (loc[0] + x1, loc[1] + y1)
+            if loc is not None and (best is None or score > best["score"]):
+                best = {"score": score, "loc": loc, "scale": scale, "scaled": scaled, "coarse": coarse is not None}
+            if best and best["score"] >= threshold:
+                break
+
+        if best is None:
+            return None
+
+        score, loc, scaled = best["score"], best["loc"], best["scaled"]
+        if best["coarse"]:
+            if score < threshold - self.COARSE_SLACK:
+                # 粗匹配得分太低，认为画面中没有该模板
+                return self._to_match(loc, scaled, score, best["scale"])
+            score, refined_loc = self._refine(screen, rect, scaled, loc)
+            if score < threshold:
+                # 粗匹配可能选错了峰值，退回到原分辨率全区域匹配
+                score, refined_loc = self._best_in(region, scaled)
+                refined_loc = refined_loc and (refined_loc[0] + x1, refined_loc[1] + y1)
+            loc = refined_loc or loc
+        return self._to_match(loc, scaled, score, best["scale"])
+
+    @staticmethod
+    def _to_match(top_left, template: np.ndarray, score: float, scale: float) -> Dict[str, Any]:
+        """转换为 find_image 的匹配结果格式"""
+        height, width = template.shape[:2]
+        return {
+            "x": int(top_left[0] + width // 2),
+            "y": int(top_left[1] + height // 2),
+            "match_value": float(score),
+            "top_left": (int(top_left[0]), int(top_left[1])),
+            "scale": scale,
+            "size": (int(width), int(height))
+        }
+
+    def match_best(self, screen: np.ndarray, template_path: str, threshold: float = 0.8,
+                   roi: Optional[Sequence[float]] = None) -> Optional[Dict[str, Any]]:
+        """
+        查找模板在屏幕上的最佳匹配
+
+        Args:
+            screen: 灰度屏幕画面
+            template_path: 模板图片路径
+            threshold: 匹配阈值
+            roi: 相对屏幕的查找区域 (x1, y1, x2, y2)，默认使用登记的区域提示
+
+        Returns:
+            dict: 最佳匹配（match_value 可能低于阈值，由调用方判断），无法匹配时返回None
+        """
+        start = time.perf_counter()
+        path = os.path.abspath(template_path)
+        template = self.template_cache.get(path)
+        if template is None:
+            return None
+
+        roi = roi if roi is not None else self.roi_hints.get(path)
+        best = None
+        rects = [self._roi_rect(screen.shape, roi)]
+        if roi is not None:
+            # 区域提示只是提示，区域内找不到时再查全屏
+            rects.append(self._roi_rect(screen.shape, None))
+        for rect in rects:
+            match = self._search(screen, path, template, rect, threshold)
+            if match and (best is None or match["match_value"] > best["match_value"]):
+                best = match
+            if best and best["match_value"] >= threshold:
+                break
+
+        self._record(path, screen.shape, best, threshold, time.perf_counter() - start)
+        return best
+
+    def match_all(self, screen: np.ndarray, template_path: str, threshold: float = 0.8,
+                  roi: Optional[Sequence[float]] = None, iou_threshold: float = 0.3) -> List[Dict[str, Any]]:
+        """
+        查找模板在屏幕上的所有匹配位置（按最佳匹配确定的缩放比例在原分辨率下匹配）
+        每个实例周围满足阈值的大量相邻位置经局部极大值过滤和非极大值抑制后只保留一个
+
+        Args:
+            screen: 灰度屏幕画面
+            template_path: 模板图片路径
+            threshold: 匹配阈值
+            roi: 相对屏幕的查找区域 (x1, y1, x2, y2)，默认使用登记的区域提示
+            iou_threshold: 非极大值抑制的IoU阈值
+
+        Returns:
+            list: 每个实例一个匹配结果，按匹配度从高到低排列
+        """
+        best = self.match_best(screen, template_path, threshold, roi)
+        if best is None or best["match_value"] < threshold:
+            return []
+
+        path = os.path.abspath(template_path)
+        scaled, _ = self._scaled_template(path, self.template_cache.get(path), best["scale"])
+        roi = roi if roi is not None else self.roi_hints.get(path)
+        x1, y1, x2, y2 = self._roi_rect(screen.shape, roi)
+        if not (x1 <= best["top_left"][0] < x2 and y1 <= best["top_left"][1] < y2):
+            x1, y1, x2, y2 = self._roi_rect(screen.shape, None)
+        result = cv2.matchTemplate(screen[y1:y2, x1:x2], scaled, cv2.TM_CCOEFF_NORMED)
+
+        return self._extract_matches(result, scaled, threshold, (x1, y1), best["scale"], iou_threshold)
+
+    def _extract_matches(self, result: np.ndarray, template: np.ndarray, threshold: float,
+                         offset: Tuple[int, int], scale: float, iou_threshold: float) -> List[Dict[str, Any]]:
+        """从匹配结果矩阵中提取每个实例的最佳位置"""
+        height, width = template.shape[:2]
+        xs, ys, scores = find_peaks(result, threshold, (width // 4 | 1, height // 4 | 1))
+        boxes = np.stack([xs, ys, xs + width, ys + height], axis=1)
+        keep = non_max_suppression(boxes, scores, iou_threshold)
+        return [self._to_match((int(xs[i]) + offset[0], int(ys[i]) + offset[1]), template, scores[i], scale)
+                for i in keep]
+
+    def _record(self, path: str, screen_shape, match: Optional[Dict[str, Any]], threshold: float, seconds: float):
+        """记录一次匹配的耗时和得分"""
+        cost_ms = seconds * 1000
+        score = match["match_value"] if match else None
+        hit = score is not None and score >= threshold
+        with self._lock:
+            stats = self._stats.setdefault(path, {
+                "calls": 0, "hits": 0, "total_ms": 0.0, "max_ms": 0.0, "last_score": None,
+                "min_hit_score": None, "max_miss_score": None, "scales": {}
+            })
+            stats["calls"] += 1
+            stats["total_ms"] += cost_ms
+            stats["max_ms"] = max(stats["max_ms"], cost_ms)
+            stats["last_score"] = score
+            stats["threshold"] = threshold
+            if hit:
+                stats["hits"] += 1
+                stats["min_hit_score"] = score if stats["min_hit_score"] is None else min(stats["min_hit_score"], score)
+                resolution = self._resolution(screen_shape)
+                self._learned_scales[(path, resolution)] = match["scale"]
+                stats["scales"][resolution] = match["scale"]
+            elif score is not None:
+                stats["max_miss_score"] = (score if stats["max_miss_score"] is None
+                                           else max(stats["max_miss_score"], score))
+            due = time.monotonic() - self._last_saved >= self.STATS_SAVE_INTERVAL
+        if due:
+            self.save_stats()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取各模板的匹配统计
+
+        Returns:
+            dict: 模板路径 -> 调用次数、命中次数、平均/最大耗时(ms)、命中最低分、未命中最高分、各分辨率的缩放比例
+        """
+        with self._lock:
+            result = {}
+            for path, stats in self._stats.items():
+                item = dict(stats, scales=dict(stats["scales"]))
+                item["avg_ms"] = stats["total_ms"] / stats["calls"] if stats["calls"] else 0.0
+                result[path] = item
+            return result
+
+    def save_stats(self):
+        """将匹配统计写入本地文件（下次启动时恢复已确认的缩放比例）"""
+        with self._lock:
+            self._last_saved = time.monotonic()
+        try:
+            save_json_file(self.stats_path, self.get_stats())
+        except OSError as e:
+            print(f"保存模板匹配统计失败: {e}")
+
+
+_template_cache = None
+_template_matcher = None
+
+
+def get_template_cache() -> TemplateCache:
+    """获取进程内共享的模板缓存"""
+    global _template_cache
+    if _template_cache is None:
+        _template_cache = TemplateCache()
+    return _template_cache
+
+
+def get_template_matcher() -> TemplateMatcher:
+    """获取进程内共享的模板匹配引擎"""
+    global _template_matcher
+    if _template_matcher is None:
+        _template_matcher = TemplateMatcher()
+    return _template_matcher
+
+
+def benchmark_find_multiple(rows: int = 8, cols: int = 5, repeat: int = 5):
+    """
+    在密集匹配的模拟截图上对比逐点转换字典和局部极大值 + NMS 两种多目标提取方式
+
+    :param rows: 图标行数
+    :param cols: 图标列数
+    :param repeat: 重复次数
+    :return: dict，原始命中点数、实例数和两种方式的耗时(ms)
+    """
+    # 模拟截图：1080x1920 的浅色背景上按网格排列相同的图标（如门店列表中的按钮）
+    screen = np.full((1920, 1080), 235, np.uint8)
+    icon = np.full((120, 160), 235, np.uint8)
+    cv2.circle(icon, (40, 60), 30, 60, -1)
+    cv2.rectangle(icon, (85, 35), (150, 85), 120, -1)
+    cv2.putText(icon, 'GO', (92, 72), cv2.FONT_HERSHEY_SIMPLEX, 1, 255, 2)
+    for row in range(rows):
+        for col in range(cols):
+            y, x = 80 + row * 220, 40 + col * 205
+            screen[y:y + 120, x:x + 160] = icon
+    screen = cv2.GaussianBlur(screen, (3, 3), 0)
+    template = icon
+    result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+    threshold = 0.6
+    h, w = template.shape[:2]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        legacy = []
+        locations = np.where(result >= threshold)
+        for pt in zip(*locations[::-1]):
+            legacy.append({"x": int(pt[0] + w // 2), "y": int(pt[1] + h // 2),
+                           "match_value": float(result[pt[1], pt[0]]), "top_left": (int(pt[0]), int(pt[1]))})
+    legacy_ms = (time.perf_counter() - start) / repeat * 1000
+
+    matcher = TemplateMatcher(coarse_factor=0)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        matches = matcher._extract_matches(result, template, threshold, (0, 0), 1.0, 0.3)
+    nms_ms = (time.perf_counter() - start) / repeat * 1000
+
+    print(f"图标 {rows * cols} 个，阈值以上的原始命中点 {len(legacy)} 个")
+    print(f"逐点转换: {legacy_ms:.2f}ms，返回 {len(legacy)} 项")
+    print(f"局部极大值 + NMS: {nms_ms:.2f}ms，返回 {len(matches)} 项")
+    return {"raw_hits": len(legacy), "instances": len(matches), "legacy_ms": legacy_ms, "nms_ms": nms_ms}
+
+
+if __name__ == '__main__':
+    benchmark_find_multiple()
@@ -0,0 +1,96 @@
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from config.settings import CacheConfig
+from core.utils.tools.tools import load_json_file, save_json_file
+
+
+class LaunchCache:
+    """
+    小程序打开方式缓存
+    按 (设备, 品牌) 记录上次成功打开小程序的方式和用时，下次优先尝试该方式；
+    某种方式失败时记录失败时间，一段时间内不再优先尝试
+    """
+
+    # 打开方式失败后，多长时间内排在其他方式之后（秒）
+    FAILURE_COOLDOWN = 6 * 3600
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """
+        Args:
+            cache_path: 缓存文件路径，默认为 cache/mini_program_launch.json
+        """
+        self.cache_path = cache_path or os.path.join(CacheConfig.CACHE_DIR, "mini_program_launch.json")
+        self._entries: Dict[str, Dict] = load_json_file(self.cache_path, {}) or {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(device: Optional[str], flow: str) -> str:
+        return f"{device or 'default'}/{flow}"
+
+    def order_modes(self, device: Optional[str], flow: str, modes: List[str]) -> List[str]:
+        """
+        确定本次尝试的打开方式顺序：上次成功的方式在前，最近失败过的方式在后，search 总是最后兜底
+
+        Args:
+            device: 设备序列号
+            flow: 品牌流程名称
+            modes: 配置的打开方式顺序
+
+        Returns:
+            list: 本次尝试的顺序
+        """
+        with self._lock:
+            entry = dict(self._entries.get(self._key(device, flow), {}))
+        failures = entry.get("failures", {})
+        now = time.time()
+        ordered = [mode for mode in modes if mode != "search"]
+        # 稳定排序：最近失败过的方式排在后面
+        ordered.sort(key=lambda mode: now - failures.get(mode, 0) < self.FAILURE_COOLDOWN)
+        last_mode = entry.get("mode")
+        if last_mode in ordered:
+            ordered.remove(last_mode)
+            ordered.insert(0, last_mode)
+        return ordered + ["search"]
+
+    def record(self, device: Optional[str], flow: str, mode: str, success: bool, seconds: float):
+        """
+        记录一次打开结果并写入缓存文件
+
+        Args:
+            device: 设备序列号
+            flow: 品牌流程名称
+            mode: 打开方式
+            success: 是否成功
+            seconds: 用时（秒）
+        """
+        with self._lock:
+            entry = self._entries.setdefault(self._key(device, flow), {})
+            if success:
+                entry.update({"mode": mode, "seconds": round(seconds, 1),
+                              "updated_at": datetime.now().isoformat(timespec="seconds")})
+                entry.get("failures", {}).pop(mode, None)
+            else:
+                entry.setdefault("failures", {})[mode] = time.time()
+                if entry.get("mode") == mode:
+                    entry.pop("mode", None)
+            try:
+                save_json_file(self.cache_path, self._entries)
+            except OSError as e:
+                print(f"保存小程序打开方式缓存失败: {e}")
+
+
+_launch_cache = None
+_launch_cache_lock = threading.Lock()
+
+
+def get_launch_cache() -> LaunchCache:
+    """获取进程内共享的小程序打开方式缓存"""
+    global _launch_cache
+    with _launch_cache_lock:
+        if _launch_cache is None:
+            _launch_cache = LaunchCache()
+        return _launch_cache
@@ -0,0 +1,37 @@
+import time
+from typing import Callable, Optional
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 10, interval: float = 0.1,
+               max_interval: float = 1.0, backoff: float = 1.5,
+               on_poll: Optional[Callable[[], bool]] = None) -> bool:
+    """
+    等待条件满足，自适应轮询：开始时快速检查，之后逐渐拉长间隔，条件满足立即返回
+
+    Args:
+        condition: 条件函数，抛出异常时视为条件不满足
+        timeout: 超时时间（秒），0表示只检查一次
+        interval: 首次轮询间隔（秒）
+        max_interval: 最大轮询间隔（秒）
+        backoff: 每次轮询后间隔的放大倍数
+        on_poll: 每次检查前调用，返回False时跳过本次检查（如界面没有变化）
+
+    Returns:
+        bool: 超时前条件是否满足
+    """
+    deadline = time.monotonic() + timeout
+    first = True
+    while True:
+        if first or on_poll is None or on_poll():
+            try:
+                if condition():
+                    return True
+            except Exception as e:
+                print(f"等待条件检查出错，继续等待: {e}")
+        first = False
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * backoff, max_interval)
@@ -0,0 +1,248 @@
+"""
+在线率历史数据列式归档导出
+
+用游标逐天读取 MongoDB 中的 online_rate_new，将 "12 / 80" 这样的值解析为在线数和总数两列，
+按日期分区写入 Parquet（已安装 pyarrow 时）或 gzip 压缩的 CSV，供按月、按年分析时快速加载。
+
+目录结构（Hive 分区）：
+    result/archive/date=yyyy-mm-dd/part-0.parquet
+    result/archive/date=yyyy-mm-dd/part-0.csv.gz
+
+使用方法：
+    python -m core.scripts.archive_export --from 2026-01-01 --to 2026-12-31
+    python -m core.scripts.archive_export --format csv --overwrite
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+# 添加项目根目录到Python路径，以便正确导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    import pandas as pd
+except ImportError:
+    print("pandas未安装，请运行 pip install pandas 安装")
+    sys.exit(1)
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 归档数据的列：日期由分区目录提供，Parquet 文件中不重复保存
+ARCHIVE_COLUMNS = ['hour', 'store_key', 'store_id', 'store_name', 'online', 'total', 'online_rate']
+ONLINE_VALUE_PATTERN = r'^\s*(\d+)\s*/\s*(\d+)\s*$'
+# 读取CSV时的列类型，与Parquet保持一致
+CSV_DTYPES = {'date': 'string', 'hour': 'Int8', 'store_key': 'string', 'store_id': 'string',
+              'store_name': 'string', 'online': 'Int32', 'total': 'Int32', 'online_rate': 'float32'}
+
+
+def get_db_manager():
+    from core.utils.database import get_db_manager
+    return get_db_manager()
+
+
+def get_archive_folder():
+    """获取归档目录 result/archive"""
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    archive_path = os.path.join(project_root, 'result', 'archive')
+    if not os.path.exists(archive_path):
+        os.makedirs(archive_path)
+    return archive_path
+
+
+def resolve_format(file_format='auto'):
+    """确定输出格式，auto 时有 pyarrow 用 parquet，否则用 csv"""
+    if file_format == 'auto':
+        return 'parquet' if HAS_PYARROW else 'csv'
+    if file_format == 'parquet' and not HAS_PYARROW:
+        print("pyarrow未安装，无法导出Parquet，改为导出压缩CSV（pip install pyarrow 后可使用Parquet）")
+        return 'csv'
+    return file_format
+
+
+def get_partition_path(archive_folder, date_str, file_format):
+    """获取某一天的分区文件路径"""
+    suffix = 'parquet' if file_format == 'parquet' else 'csv.gz'
+    return os.path.join(archive_folder, f"date={date_str}", f"part-0.{suffix}")
+
+
+def empty_frame():
+    """列为 ARCHIVE_COLUMNS、类型与导出数据一致的空表"""
+    return pd.DataFrame({column: pd.Series(dtype=CSV_DTYPES[column]) for column in ARCHIVE_COLUMNS})
+
+
+def document_to_frame(document):
+    """
+    将一天的文档展开为长表，并把 "在线数 / 总数" 解析为数值列
+
+    :param document: online_rate_new 中一天的文档 {"sheet_date": ..., "data": {小时: {门店: "12 / 80"}}}
+    :return: DataFrame，列为 ARCHIVE_COLUMNS
+    """
+    hour_data = document.get('data') or {}
+    hours = [hour_key for hour_key, stores in hour_data.items() for _ in range(len(stores))]
+    store_keys = [store_key for stores in hour_data.values() for store_key in stores]
+    values = [value for stores in hour_data.values() for value in stores.values()]
+    if not store_keys:
+        # 当天没有数据（data 为空或各小时都没有门店）时返回空表，不中断导出
+        return empty_frame()
+
+    df = pd.DataFrame({
+        'hour': pd.to_numeric(pd.Series(hours, dtype=object), errors='coerce').astype('Int8'),
+        'store_key': pd.Series(store_keys, dtype='string'),
+    })
+    # 门店键格式为 "门店ID-门店名称"
+    split = df['store_key'].str.split('-', n=1, expand=True)
+    if split.shape[1] < 2:
+        split[1] = pd.NA
+    df['store_id'] = split[0]
+    df['store_name'] = split[1].fillna(split[0])
+
+    parsed = pd.Series(values, dtype='string').str.extract(ONLINE_VALUE_PATTERN)
+    df['online'] = pd.to_numeric(parsed[0], errors='coerce').astype('Int32')
+    df['total'] = pd.to_numeric(parsed[1], errors='coerce').astype('Int32')
+    rate = df['online'].astype('Float32') / df['total'].astype('Float32').where(df['total'] > 0)
+    df['online_rate'] = rate.astype('float32')
+    return df[ARCHIVE_COLUMNS]
+
+
+def write_partition(df, archive_folder, date_str, file_format):
+    """
+    写入一天的分区文件（先写临时文件再替换）
+
+    :return: 分区文件路径
+    """
+    partition_path = get_partition_path(archive_folder, date_str, file_format)
+    os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+    temp_path = f"{partition_path}.tmp"
+    if file_format == 'parquet':
+        df.to_parquet(temp_path, engine='pyarrow', index=False, compression='zstd')
+    else:
+        # CSV没有分区发现，文件中保留日期列
+        df.insert(0, 'date', date_str)
+        df.to_csv(temp_path, index=False, compression='gzip')
+    os.replace(temp_path, partition_path)
+    return partition_path
+
+
+def export_archive(date_from=None, date_to=None, file_format='auto', overwrite=False,
+                   archive_folder=None, batch_size=7):
+    """
+    导出在线率历史数据
+
+    :param date_from: 开始日期（含），格式为yyyy-mm-dd，默认不限
+    :param date_to: 结束日期（含），格式为yyyy-mm-dd，默认不限
+    :param file_format: 输出格式 auto/parquet/csv
+    :param overwrite: 是否重新导出已存在的分区（当天的分区总是重新导出）
+    :param archive_folder: 归档目录，默认为 result/archive
+    :param batch_size: 游标每批读取的文档数（一个文档为一天的数据）
+    :return: dict，导出的天数、行数、跳过的天数和耗时
+    """
+    file_format = resolve_format(file_format)
+    archive_folder = archive_folder or get_archive_folder()
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    date_query = {}
+    if date_from:
+        date_query['$gte'] = date_from
+    if date_to:
+        date_query['$lte'] = date_to
+
+    # 已导出的历史分区不再从数据库读取
+    skipped = []
+    if not overwrite and os.path.exists(archive_folder):
+        for name in os.listdir(archive_folder):
+            if not name.startswith('date='):
+                continue
+            date_str = name[len('date='):]
+            if date_str != today and os.path.exists(get_partition_path(archive_folder, date_str, file_format)):
+                skipped.append(date_str)
+    if skipped:
+        date_query['$nin'] = skipped
+
+    db_manager = get_db_manager()
+    if not db_manager.connect():
+        print("无法连接到数据库")
+        return {"success": False, "error_msg": "无法连接到数据库"}
+
+    start = time.perf_counter()
+    days = rows = 0
+    try:
+        collection = db_manager.db['online_rate_new']
+        query = {"sheet_date": date_query} if date_query else {}
+        cursor = collection.find(query, {"_id": 0, "sheet_date": 1, "data": 1}).sort("sheet_date", 1)
+        cursor = cursor.batch_size(batch_size)
+        # 逐天处理，内存占用只与一天的数据量有关
+        for document in cursor:
+            date_str = document.get('sheet_date')
+            if not date_str:
+                continue
+            df = document_to_frame(document)
+            write_partition(df, archive_folder, date_str, file_format)
+            days += 1
+            rows += len(df)
+            print(f"已导出 {date_str}: {len(df)} 行")
+    finally:
+        db_manager.disconnect()
+
+    cost = time.perf_counter() - start
+    print(f"导出完成: {days} 天，{rows} 行，跳过已存在的 {len(skipped)} 天，耗时 {cost:.2f}s，目录 {archive_folder}")
+    return {"success": True, "days": days, "rows": rows, "skipped": len(skipped), "seconds": cost}
+
+
+def load_archive(date_from=None, date_to=None, columns=None, archive_folder=None, filters=None):
+    """
+    加载归档数据，按日期分区过滤（只读取范围内的分区文件）
+
+    :param date_from: 开始日期（含），格式为yyyy-mm-dd
+    :param date_to: 结束日期（含），格式为yyyy-mm-dd
+    :param columns: 只读取的列
+    :param archive_folder: 归档目录，默认为 result/archive
+    :param filters: Parquet 格式时额外下推的 pyarrow.dataset 表达式，如 ds.field('store_id') == '41939'
+    :return: DataFrame，包含 date 列
+    """
+    archive_folder = archive_folder or get_archive_folder()
+    partitions = []
+    for name in sorted(os.listdir(archive_folder)):
+        date_str = name[len('date='):] if name.startswith('date=') else None
+        if date_str is None or (date_from and date_str < date_from) or (date_to and date_str > date_to):
+            continue
+        partitions.append((date_str, os.path.join(archive_folder, name)))
+
+    frames = []
+    parquet_paths = [os.path.join(path, 'part-0.parquet') for _, path in partitions
+                     if os.path.exists(os.path.join(path, 'part-0.parquet'))]
+    read_columns = None if columns is None else ['date'] + [c for c in columns if c != 'date']
+    if parquet_paths and HAS_PYARROW:
+        import pyarrow.dataset as ds
+        # 按日期范围筛选后的分区文件组成数据集，列裁剪和 filters 在读取时下推
+        dataset = ds.dataset(parquet_paths, format='parquet', partitioning='hive',
+                             partition_base_dir=archive_folder)
+        frames.append(dataset.to_table(columns=read_columns, filter=filters).to_pandas())
+    else:
+        for _, path in partitions:
+            csv_path = os.path.join(path, 'part-0.csv.gz')
+            if os.path.exists(csv_path):
+                frames.append(pd.read_csv(csv_path, usecols=read_columns, dtype=CSV_DTYPES))
+
+    if not frames:
+        return pd.DataFrame(columns=['date'] + (columns or ARCHIVE_COLUMNS))
+    df = pd.concat(frames, ignore_index=True)
+    return df[['date'] + [c for c in df.columns if c != 'date']]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在线率历史数据列式归档导出")
+    parser.add_argument('--from', dest='date_from', help="开始日期（含），格式为yyyy-mm-dd")
+    parser.add_argument('--to', dest='date_to', help="结束日期（含），格式为yyyy-mm-dd")
+    parser.add_argument('--format', dest='file_format', choices=['auto', 'parquet', 'csv'], default='auto',
+                        help="输出格式，auto 时有 pyarrow 用 parquet，否则用压缩CSV")
+    parser.add_argument('--overwrite', action='store_true', help="重新导出已存在的分区")
+    parser.add_argument('--output', help="归档目录，默认为 result/archive")
+    args = parser.parse_args()
+
+    export_archive(args.date_from, args.date_to, args.file_format, args.overwrite, args.output)
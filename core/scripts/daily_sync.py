@@ -7,14 +7,14 @@ import psutil
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 try:
+    import numpy as np
     import pandas as pd
 except ImportError:
     print("pandas未安装，请运行 pip install pandas 安装")
     sys.exit(1)
 
 try:
-    from openpyxl import load_workbook
-    from openpyxl.utils.dataframe import dataframe_to_rows
+    from openpyxl import Workbook, load_workbook
 except ImportError:
     print("openpyxl未安装，请运行 pip install openpyxl 安装")
     sys.exit(1)
@@ -63,73 +63,78 @@ def get_current_date():
     return now.strftime('%Y-%m-%d')
 
 
-def prepare_data_for_excel(collection_data):
+# 表格中的小时列（12:00 到 23:00）及其在数据库中的键（两位数带前导零），只生成一次
+EXCEL_HOURS = [f'{hour}:00' for hour in range(12, 24)]
+DB_HOUR_KEYS = [f'{hour:02d}' for hour in range(12, 24)]
+DEFAULT_CELL_VALUE = '0 / 0'
+
+
+def order_shops(shops, shop_order_map):
+    """
+    门店排序：先按预定义排序，不在排序文件中的门店按字母顺序追加
+    :param shops: 门店名称集合
+    :param shop_order_map: 门店排序映射
+    :return: 排好序的门店名称数组
+    """
+    shops = np.array(sorted(shops), dtype=object)
+    # 不在排序文件中的门店排序值为inf，稳定排序后保持字母顺序排在最后
+    order_values = np.array([shop_order_map.get(shop, np.inf) for shop in shops], dtype='float64')
+    return shops[np.argsort(order_values, kind='stable')]
+
+
+def prepare_data_for_excel(collection_data, shop_order_map=None):
     """
     准备数据以写入Excel
     :param collection_data: MongoDB中的数据
+    :param shop_order_map: 门店排序映射，默认从shop_order.json加载
     :return: DataFrame格式的数据
     """
     # 获取门店排序映射
-    shop_order_map = get_shop_order()
-    
+    if shop_order_map is None:
+        shop_order_map = get_shop_order()
+
     if not collection_data or 'data' not in collection_data:
         # 如果没有数据，创建空的数据框架
-        # 从12:00到23:00的12个小时
-        hours = [f'{hour}:00' for hour in range(12, 24)]
-        df = pd.DataFrame(columns=['门店名称'] + hours)
-        return df
-
-    # 提取所有门店名称
-    all_shops = set()
-    for hour_data in collection_data['data'].values():
-        all_shops.update(hour_data.keys())
-    
-    # 使用预定义的门店排序，如果没有在排序文件中的门店则按字母顺序追加
-    all_shops_list = list(all_shops)
-    # 先按预定义排序，再把不在预定义排序中的门店按字母顺序排列
-    ordered_shops = []
-    unordered_shops = []
-    
-    for shop in all_shops_list:
-        if shop in shop_order_map:
-            ordered_shops.append((shop_order_map[shop], shop))
-        else:
-            unordered_shops.append(shop)
-    
-    # 按照预定义顺序排序
-    ordered_shops.sort(key=lambda x: x[0])
-    ordered_shop_names = [shop for _, shop in ordered_shops]
-    
-    # 未定义顺序的门店按字母排序
-    unordered_shops.sort()
-    
-    # 合并最终排序结果
-    all_shops = ordered_shop_names + unordered_shops
-    
-    # 创建数据框架
-    hours = [f'{hour}:00' for hour in range(12, 24)]  # 12:00 到 23:00
-    df_data = {'门店名称': all_shops}
-    
-    # 为每个小时填充数据
-    for hour in hours:
-        # 修复：处理数据库中小时格式的匹配
-        hour_part = hour.split(':')[0]  # 提取小时部分，如 '0', '1', '2', '10', '11' 等
-        # 数据库中存储的格式是两位数带前导零的格式
-        hour_key = f"{int(hour_part):02d}"  # 转换为两位数格式，如 '0', '1' -> '00', '01'
-        
-        hour_column = []
-        
-        for shop in all_shops:
-            # 检查该小时是否有此店铺的数据（尝试匹配数据库中的格式）
-            if hour_key in collection_data['data'] and shop in collection_data['data'][hour_key]:
-                hour_column.append(collection_data['data'][hour_key][shop])
-            else:
-                hour_column.append('0 / 0')  # 默认值
-        
-        df_data[hour] = hour_column
-    
-    df = pd.DataFrame(df_data)
-    return df
+        return pd.DataFrame(columns=['门店名称'] + EXCEL_HOURS)
+
+    hour_data = collection_data['data']
+
+    # 所有小时中出现过的门店（包括只在12:00以前出现的门店）
+    all_shops = order_shops(set().union(*hour_data.values()), shop_order_map)
+
+    # 每个小时一列，数据库中的小时键为两位数带前导零的格式，缺失的数据为默认值
+    df_data = {'门店名称': all_shops.tolist()}
+    for hour, hour_key in zip(EXCEL_HOURS, DB_HOUR_KEYS):
+        hour_values = hour_data.get(hour_key, {})
+        df_data[hour] = [hour_values.get(shop, DEFAULT_CELL_VALUE) for shop in all_shops]
+
+    return pd.DataFrame(df_data)
+
+
+def benchmark_prepare_data(store_counts=(1000, 10000), repeat=3):
+    """
+    测试不同门店数下prepare_data_for_excel的耗时
+    :param store_counts: 模拟的门店数
+    :param repeat: 每组重复次数，取最短耗时
+    """
+    import time
+
+    results = []
+    for store_count in store_counts:
+        shops = [f'{i}-门店{i:05d}' for i in range(store_count)]
+        collection_data = {'data': {
+            f'{hour:02d}': {shop: f'{(i + hour) % 50} / 80' for i, shop in enumerate(shops) if (i + hour) % 7}
+            for hour in range(0, 24)
+        }}
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            prepare_data_for_excel(collection_data)
+            cost = time.perf_counter() - start
+            best = cost if best is None else min(best, cost)
+        results.append((store_count, best))
+        print(f"{store_count} 个门店: {best * 1000:.1f}ms")
+    return results
 
 
 def is_excel_running(file_path):
@@ -215,106 +220,367 @@ def check_and_wait_for_excel(file_path, timeout=30):
     return False
 
 
-def sync_daily_data():
-    """主函数：同步每日数据到Excel文件"""
+def get_daily_workbook_path(result_folder, date_str):
+    """
+    获取单日工作簿路径，格式为 result/daily/yyyy-mm/yyyy-mm-dd.xlsx
+
+    :param result_folder: result文件夹路径
+    :param date_str: 日期，格式为yyyy-mm-dd
+    :return: 单日工作簿路径
+    """
+    daily_folder = os.path.join(result_folder, 'daily', date_str[:7])
+    if not os.path.exists(daily_folder):
+        os.makedirs(daily_folder)
+    return os.path.join(daily_folder, f"{date_str}.xlsx")
+
+
+# 工作簿共用的命名样式：表头黑底白字加粗居中，数据列居中
+HEADER_STYLE_NAME = 'online_rate_header'
+CENTER_STYLE_NAME = 'online_rate_center'
+
+
+def register_named_styles(workbook):
+    """
+    在工作簿中注册表头和居中命名样式（已注册时跳过），所有单元格共用同一组样式
+    :param workbook: openpyxl工作簿
+    """
+    from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+    from openpyxl.styles.fonts import DEFAULT_FONT
+    if HEADER_STYLE_NAME in workbook.named_styles:
+        return
+    center = Alignment(horizontal='center', vertical='center')
+    workbook.add_named_style(NamedStyle(
+        name=HEADER_STYLE_NAME,
+        font=Font(name=DEFAULT_FONT.name, sz=DEFAULT_FONT.sz, family=DEFAULT_FONT.family,
+                  scheme=DEFAULT_FONT.scheme, color='FFFFFFFF', bold=True),  # 白色字体，加粗
+        fill=PatternFill(start_color='FF000000', end_color='FF000000', fill_type='solid'),  # 黑色背景
+        alignment=center
+    ))
+    workbook.add_named_style(NamedStyle(name=CENTER_STYLE_NAME, font=DEFAULT_FONT, alignment=center))
+
+
+def compute_column_widths(headers, values):
+    """
+    根据表头和数据的字符串长度计算列宽（一次向量化计算所有单元格的长度）
+    第一列宽度在10到80之间，其他列最小宽度为20
+    :param headers: 表头列表
+    :param values: 二维数据数组
+    :return: 每列宽度的列表
+    """
+    max_lengths = np.array([len(str(header)) for header in headers])
+    if values.size:
+        max_lengths = np.maximum(max_lengths, np.char.str_len(values.astype(str)).max(axis=0))
+    widths = np.maximum(max_lengths + 2, 20)
+    if len(widths):
+        widths[0] = min(max(max_lengths[0] + 2, 10), 80)
+    return widths.tolist()
+
+
+def write_sheet(workbook, sheet_name, excel_data):
+    """
+    在工作簿中新建工作表并写入数据（同名工作表会被替换，只写模式的工作簿除外）
+    列宽和冻结窗格在写入数据前设置，单元格使用共享的命名样式，只写模式下逐行流式写入磁盘
+    :param workbook: openpyxl工作簿，推荐使用 Workbook(write_only=True)
+    :param sheet_name: 工作表名
+    :param excel_data: DataFrame格式的数据
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    # 如果sheet已存在，删除它（避免重复）
+    if not workbook.write_only and sheet_name in workbook.sheetnames:
+        del workbook[sheet_name]
+
+    register_named_styles(workbook)
+    worksheet = workbook.create_sheet(title=sheet_name)
+
+    headers = [str(column) for column in excel_data.columns]
+    # 缺失值写为空单元格
+    values = excel_data.astype(object).where(excel_data.notna(), None).to_numpy()
+
+    for idx, width in enumerate(compute_column_widths(headers, values), 1):
+        worksheet.column_dimensions[get_column_letter(idx)].width = width
+    # 冻结第一行和第一列
+    worksheet.freeze_panes = 'B2'
+
+    def styled_cell(value, style_name):
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell.style = style_name
+        return cell
+
+    worksheet.append([styled_cell(header, HEADER_STYLE_NAME) for header in headers])
+    # 第一列为门店名称，保持默认样式；其他列居中
+    for row in values.tolist():
+        worksheet.append(row[:1] + [styled_cell(value, CENTER_STYLE_NAME) for value in row[1:]])
+    return worksheet
+
+
+def save_workbook(workbook, excel_path):
+    """先写入临时文件再替换，避免中途失败损坏已有文件"""
+    temp_path = f"{excel_path}.tmp.xlsx"
+    workbook.save(temp_path)
+    os.replace(temp_path, excel_path)
+
+
+def write_daily_workbook(excel_data, date_str, result_folder=None):
+    """
+    将一天的数据写入单独的工作簿，耗时只与当天数据量有关
+    :param excel_data: DataFrame格式的数据
+    :param date_str: 日期，格式为yyyy-mm-dd
+    :param result_folder: result文件夹路径
+    :return: 单日工作簿路径
+    """
+    result_folder = result_folder or ensure_result_folder()
+    daily_path = get_daily_workbook_path(result_folder, date_str)
+    workbook = Workbook(write_only=True)
+    write_sheet(workbook, date_str, excel_data)
+    save_workbook(workbook, daily_path)
+    return daily_path
+
+
+def assemble_monthly_workbook(year_month=None, result_folder=None, frames=None):
+    """
+    按需将当月所有单日工作簿合并为月度文件 result/yyyy-mm.xlsx
+    旧版月度文件中没有对应单日工作簿的工作表会保留；月度文件比所有单日工作簿都新时跳过
+    :param year_month: 年月，格式为yyyy-mm，默认为当月
+    :param result_folder: result文件夹路径
+    :param frames: 已在内存中的数据 {日期: DataFrame}，这些日期不再从单日工作簿读取
+    :return: 月度文件路径，没有数据或文件被占用时返回None
+    """
+    result_folder = result_folder or ensure_result_folder()
+    year_month = year_month or get_current_year_month()
+    excel_path = os.path.join(result_folder, f"{year_month}.xlsx")
+    daily_folder = os.path.join(result_folder, 'daily', year_month)
+
+    daily_files = {}
+    if os.path.exists(daily_folder):
+        for filename in os.listdir(daily_folder):
+            if filename.endswith('.xlsx') and not filename.endswith('.tmp.xlsx'):
+                daily_files[filename[:-5]] = os.path.join(daily_folder, filename)
+    if not daily_files:
+        print(f"{year_month} 没有单日工作簿，无需合并")
+        return None
+
+    if os.path.exists(excel_path):
+        monthly_mtime = os.path.getmtime(excel_path)
+        if all(os.path.getmtime(path) <= monthly_mtime for path in daily_files.values()):
+            print(f"月度文件已是最新: {excel_path}")
+            return excel_path
+
+    # 检查Excel文件是否正在运行
+    if not check_and_wait_for_excel(excel_path):
+        print("由于Excel文件正在运行且超时，跳过合并")
+        return None
+
+    # 旧版月度文件中的工作表（还没有单日工作簿的日期）
+    legacy_sheets = {}
+    if os.path.exists(excel_path):
+        legacy_sheets = pd.read_excel(excel_path, sheet_name=None, dtype=str)
+
+    workbook = Workbook(write_only=True)
+    frames = frames or {}
+    for sheet_name in sorted(set(daily_files) | set(legacy_sheets) | set(frames)):
+        if sheet_name in frames:
+            excel_data = frames[sheet_name]
+        elif sheet_name in daily_files:
+            excel_data = pd.read_excel(daily_files[sheet_name], sheet_name=0, dtype=str)
+        else:
+            excel_data = legacy_sheets[sheet_name]
+        write_sheet(workbook, sheet_name, excel_data)
+    save_workbook(workbook, excel_path)
+    print(f"已合并 {len(workbook.sheetnames)} 个工作表到 {excel_path}")
+    return excel_path
+
+
+def sync_daily_data(assemble=False):
+    """
+    主函数：同步每日数据到Excel文件
+    每次只写入当天的单日工作簿，月度文件在需要时再合并，避免每次都加载和重写整个月的数据
+    :param assemble: 同步后是否合并当月的月度文件
+    """
     # 确保result文件夹存在
     result_folder = ensure_result_folder()
-    
-    # 获取当前年月作为文件名
-    year_month = get_current_year_month()
-    excel_filename = f"{year_month}.xlsx"
-    excel_path = os.path.join(result_folder, excel_filename)
-    
+
+    # 获取当前日期作为sheet名
+    current_date = get_current_date()
+    daily_path = get_daily_workbook_path(result_folder, current_date)
+
     # 检查Excel文件是否正在运行
-    if not check_and_wait_for_excel(excel_path):
+    if not check_and_wait_for_excel(daily_path):
         print("由于Excel文件正在运行且超时，程序安全退出")
         return
-    
-    # 获取当前日期作为sheet名
-    current_date = get_current_date()
-    
+
     # 获取数据库管理器并连接
     db_manager = get_db_manager()
     if not db_manager.connect():
         print("无法连接到数据库")
         return
-    
+
     try:
         # 从MongoDB获取当天的数据
         collection = db_manager.db['online_rate_new']
         date_data = collection.find_one({"sheet_date": current_date})
-        
-        # 准备要写入Excel的数据
-        excel_data = prepare_data_for_excel(date_data)
-        
-        # 检查Excel文件是否存在，如果不存在则创建
-        if not os.path.exists(excel_path):
-            print(f"创建新的Excel文件: {excel_path}")
-            # 创建一个新的Excel文件并将数据写入当前日期的sheet
-            with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-                excel_data.to_excel(writer, sheet_name=current_date, index=False)
-            print(f"已创建文件: {excel_path} 并添加了 {current_date} 工作表，写入了 {len(excel_data)} 行数据")
-        else:
-            # 文件已存在，使用openpyxl直接操作
-            workbook = load_workbook(excel_path)
-            
-            # 如果sheet已存在，删除它（避免重复）
-            if current_date in workbook.sheetnames:
-                del workbook[current_date]
-            
-            # 创建新的worksheet
-            worksheet = workbook.create_sheet(title=current_date)
-            
-            # 将DataFrame转换为行并写入工作表
-            for row in dataframe_to_rows(excel_data, index=False, header=True):
-                worksheet.append(row)
-            
-            # 自动调整列宽和设置样式
-            from openpyxl.styles import Alignment
-            for idx, column in enumerate(worksheet.columns):
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except TypeError:
-                        pass
-                
-                # 第一列保持原有宽度调整方式，其他列最小宽度设为100
-                if idx == 0:  # 第一列
-                    adjusted_width = min(max(max_length + 2, 10), 80)
-                else:  # 其他列
-                    adjusted_width = max(max_length + 2, 20)  # 最小宽度为30
-                worksheet.column_dimensions[column_letter].width = adjusted_width
-                
-                # 为除第一列外的所有单元格设置居中对齐
-                if idx > 0:
-                    for cell in column:
-                        cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # 设置第一行（表头）的样式：黑色背景，白色字体，加粗
-            from openpyxl.styles import Font, PatternFill
-            header_fill = PatternFill(start_color='FF000000', end_color='FF000000', fill_type='solid')  # 黑色背景
-            header_font = Font(color='FFFFFFFF', bold=True)  # 白色字体，加粗
-            
-            for cell in worksheet[1]:  # 获取第一行的所有单元格
-                cell.fill = header_fill
-                cell.font = header_font
-                # 表头也设置居中对齐（包括第一列）
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # 冻结第一行和第一列
-            worksheet.freeze_panes = 'B2'
-            
-            # 保存工作簿
-            workbook.save(excel_path)
-            
-            print(f"已更新 {excel_path} 中的 {current_date} 工作表，写入了 {len(excel_data)} 行数据")
     finally:
         # 断开数据库连接
         db_manager.disconnect()
 
+    # 准备要写入Excel的数据
+    excel_data = prepare_data_for_excel(date_data)
+
+    write_daily_workbook(excel_data, current_date, result_folder)
+    print(f"已写入 {daily_path} 中的 {current_date} 工作表，写入了 {len(excel_data)} 行数据")
+
+    if assemble:
+        assemble_monthly_workbook(current_date[:7], result_folder)
+
+
+def parse_date(date_str):
+    """校验并规范日期字符串，返回yyyy-mm-dd格式"""
+    return datetime.strptime(date_str, '%Y-%m-%d').strftime('%Y-%m-%d')
+
+
+def fetch_date_range(db_manager, date_from, date_to):
+    """
+    用一次聚合查询获取日期范围内所有天的数据
+    :param db_manager: 已连接的数据库管理器
+    :param date_from: 开始日期（含），格式为yyyy-mm-dd
+    :param date_to: 结束日期（含），格式为yyyy-mm-dd
+    :return: 按日期排序的文档列表
+    """
+    collection = db_manager.db['online_rate_new']
+    pipeline = [
+        {"$match": {"sheet_date": {"$gte": date_from, "$lte": date_to}}},
+        {"$project": {"_id": 0, "sheet_date": 1, "data": 1}},
+        {"$sort": {"sheet_date": 1}},
+    ]
+    return list(collection.aggregate(pipeline, allowDiskUse=True))
+
+
+def backfill_daily_data(date_from, date_to, result_folder=None):
+    """
+    补写一段日期的数据：一次聚合查询取回整个范围，在内存中整理好每天的数据，
+    写入各天的单日工作簿后，每个涉及的月份只合并、保存一次月度文件
+    :param date_from: 开始日期（含），格式为yyyy-mm-dd
+    :param date_to: 结束日期（含），格式为yyyy-mm-dd
+    :param result_folder: result文件夹路径
+    :return: dict，包含 success、写入天数、没有数据的日期和月度文件路径
+    """
+    date_from, date_to = parse_date(date_from), parse_date(date_to)
+    if date_from > date_to:
+        print(f"开始日期 {date_from} 晚于结束日期 {date_to}")
+        return {"success": False, "error_msg": "开始日期晚于结束日期"}
+
+    result_folder = result_folder or ensure_result_folder()
+
+    db_manager = get_db_manager()
+    if not db_manager.connect():
+        print("无法连接到数据库")
+        return {"success": False, "error_msg": "无法连接到数据库"}
+
+    try:
+        documents = fetch_date_range(db_manager, date_from, date_to)
+    finally:
+        db_manager.disconnect()
+
+    # 门店排序只加载一次，所有天共用
+    shop_order_map = get_shop_order()
+    frames_by_month = {}
+    for document in documents:
+        date_str = document.get('sheet_date')
+        if not date_str:
+            continue
+        excel_data = prepare_data_for_excel(document, shop_order_map)
+        write_daily_workbook(excel_data, date_str, result_folder)
+        frames_by_month.setdefault(date_str[:7], {})[date_str] = excel_data
+        print(f"已写入 {date_str}，{len(excel_data)} 行数据")
+
+    written = {date_str for frames in frames_by_month.values() for date_str in frames}
+    all_dates = pd.date_range(date_from, date_to).strftime('%Y-%m-%d')
+    missing = [date_str for date_str in all_dates if date_str not in written]
+    if missing:
+        print(f"以下日期在数据库中没有数据，已跳过: {', '.join(missing)}")
+
+    monthly_paths = []
+    for year_month, frames in sorted(frames_by_month.items()):
+        excel_path = assemble_monthly_workbook(year_month, result_folder, frames)
+        if excel_path:
+            monthly_paths.append(excel_path)
+
+    print(f"补写完成: {len(written)} 天，涉及 {len(frames_by_month)} 个月")
+    return {"success": True, "days": len(written), "missing": missing, "monthly_paths": monthly_paths}
+
+
+def benchmark_daily_sync(store_count=300):
+    """
+    对比旧方式（加载整个月度文件、替换当天工作表、保存）和单日工作簿方式在月初和月末的耗时
+    :param store_count: 模拟的门店数
+    """
+    import time
+    import shutil
+    import tempfile
+
+    hours = [f'{hour}:00' for hour in range(12, 24)]
+    excel_data = pd.DataFrame({'门店名称': [f'门店{i:04d}' for i in range(store_count)]})
+    for hour in hours:
+        excel_data[hour] = [f'{i % 50} / 80' for i in range(store_count)]
+
+    temp_folder = tempfile.mkdtemp()
+    try:
+        monthly_path = os.path.join(temp_folder, 'monthly.xlsx')
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for day in range(1, 31):
+            write_sheet(workbook, f'2000-01-{day:02d}', excel_data)
+        save_workbook(workbook, monthly_path)
+
+        def legacy_sync(path):
+            # 旧方式：加载整个月度文件，替换当天的工作表后整体保存
+            if os.path.exists(path):
+                legacy_workbook = load_workbook(path)
+            else:
+                legacy_workbook = Workbook()
+                legacy_workbook.remove(legacy_workbook.active)
+            write_sheet(legacy_workbook, '2000-01-31', excel_data)
+            save_workbook(legacy_workbook, path)
+
+        results = []
+        for label, path in (('第1天', os.path.join(temp_folder, 'empty.xlsx')), ('第31天', monthly_path)):
+            start = time.perf_counter()
+            legacy_sync(path)
+            legacy_cost = time.perf_counter() - start
+
+            start = time.perf_counter()
+            write_daily_workbook(excel_data, '2000-01-31', temp_folder)
+            daily_cost = time.perf_counter() - start
+            results.append((label, legacy_cost, daily_cost))
+            print(f"{label}: 旧方式 {legacy_cost:.2f}s，单日工作簿 {daily_cost:.2f}s")
+        return results
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
 
 if __name__ == "__main__":
-    sync_daily_data()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="同步每日数据到Excel文件")
+    parser.add_argument('--assemble', nargs='?', const='', metavar='YYYY-MM',
+                        help="只合并月度文件，不指定月份则合并当月")
+    parser.add_argument('--from', dest='date_from', metavar='YYYY-MM-DD', help="补写的开始日期（含），需与--to一起使用")
+    parser.add_argument('--to', dest='date_to', metavar='YYYY-MM-DD', help="补写的结束日期（含）")
+    parser.add_argument('--with-assemble', action='store_true', help="同步后合并当月的月度文件")
+    parser.add_argument('--benchmark', action='store_true', help="对比月初和月末的同步耗时")
+    parser.add_argument('--benchmark-prepare', action='store_true', help="测试1千和1万门店下的数据整理耗时")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_daily_sync()
+    elif args.benchmark_prepare:
+        benchmark_prepare_data()
+    elif args.date_from or args.date_to:
+        if not (args.date_from and args.date_to):
+            parser.error("--from 和 --to 需要同时指定")
+        backfill_daily_data(args.date_from, args.date_to)
+    elif args.assemble is not None:
+        assemble_monthly_workbook(args.assemble or None)
+    else:
+        sync_daily_data(assemble=args.with_assemble)
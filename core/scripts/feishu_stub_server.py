@@ -0,0 +1,359 @@
+"""
+本地飞书电子表格模拟服务
+
+实现 FeishuSheetClient 用到的接口（tenant_access_token、values、values_append、values_batch_update、sheets），
+数据只保存在内存中，支持注入延迟、限流和服务端错误，用于离线测试上传吞吐、批量写入和重试逻辑。
+
+使用方法：
+    python -m core.scripts.feishu_stub_server --port 8765 --latency 50 --rate-limit 20 --error-rate 0.05
+    FEISHU_DOMAIN=http://127.0.0.1:8765 python run_all_collector.py
+
+GET /_stub/stats 查看各接口的请求统计，POST /_stub/reset 清空数据和统计
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlparse
+
+# 添加项目根目录到Python路径，以便正确导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+TOKEN_PATH = "/open-apis/auth/v3/tenant_access_token/internal/"
+SHEETS_PREFIX = "/open-apis/sheets/v2/spreadsheets/"
+
+# 与飞书一致的错误码
+CODE_TOKEN_INVALID = 99991663
+CODE_RATE_LIMITED = 99991400
+
+
+def _column_index(letters: str) -> int:
+    """列字母转换为从0开始的列序号，如 A -> 0, AA -> 26"""
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def parse_range(range_str: str):
+    """
+    解析 "sheetId" 或 "sheetId!A1:G10" 格式的范围
+
+    Returns:
+        tuple: (sheet_id, 起始行号, 起始列序号, 结束行号, 结束列序号)，未指定的部分为None
+    """
+    sheet_id, _, cells = range_str.partition("!")
+    match = re.match(r"^([A-Z]+)(\d+)?(?::([A-Z]+)(\d+)?)?$", cells)
+    if not match:
+        return sheet_id, None, None, None, None
+    start_col, start_row, end_col, end_row = match.groups()
+    return (sheet_id,
+            int(start_row) if start_row else None,
+            _column_index(start_col),
+            int(end_row) if end_row else None,
+            _column_index(end_col or start_col))
+
+
+class StubState:
+    """模拟服务的内存状态：工作表数据、已签发的token、限流计数和请求统计"""
+
+    def __init__(self, latency: float = 0, jitter: float = 0, rate_limit: float = 0,
+                 error_rate: float = 0, token_expire: int = 7200):
+        """
+        Args:
+            latency (float): 每个请求的固定延迟（毫秒）
+            jitter (float): 随机附加延迟的上限（毫秒）
+            rate_limit (float): 每秒允许的请求数（按token统计），超出时返回429，0表示不限流
+            error_rate (float): 随机返回500的概率
+            token_expire (int): 签发token的有效期（秒）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.token_expire = token_expire
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.sheets = defaultdict(list)  # (spreadsheet_token, sheet_id) -> 行列表
+            self.tokens = {}  # token -> 过期时间
+            self.windows = defaultdict(list)  # token -> 最近1秒内的请求时间
+            self.stats = defaultdict(int)
+            self.revision = 0
+
+    def count(self, name: str, value: int = 1):
+        """累加请求统计"""
+        with self.lock:
+            self.stats[name] += value
+
+    def delay(self):
+        """注入延迟"""
+        total = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if total:
+            time.sleep(total / 1000)
+
+    def issue_token(self) -> str:
+        with self.lock:
+            token = f"t-stub-{len(self.tokens) + 1}-{int(time.time())}"
+            self.tokens[token] = time.time() + self.token_expire
+            return token
+
+    def token_valid(self, token: str) -> bool:
+        with self.lock:
+            return self.tokens.get(token, 0) > time.time()
+
+    def rate_limited(self, token: str) -> bool:
+        """滑动窗口限流，超出时返回True"""
+        if not self.rate_limit:
+            return False
+        now = time.time()
+        with self.lock:
+            window = [t for t in self.windows[token] if now - t < 1]
+            if len(window) >= self.rate_limit:
+                self.windows[token] = window
+                return True
+            window.append(now)
+            self.windows[token] = window
+            return False
+
+    def read(self, spreadsheet_token: str, range_str: str):
+        sheet_id, start_row, start_col, end_row, end_col = parse_range(range_str)
+        with self.lock:
+            rows = self.sheets[(spreadsheet_token, sheet_id)]
+            width = max((len(row) for row in rows), default=0)
+            start_row = start_row or 1
+            end_row = min(end_row or len(rows), len(rows))
+            start_col = start_col or 0
+            end_col = width - 1 if end_col is None else end_col
+            values = [[(row[col] if col < len(row) else None) for col in range(start_col, end_col + 1)]
+                      for row in rows[start_row - 1:end_row]]
+            actual_range = f"{sheet_id}!{_column_letter(start_col)}{start_row}:{_column_letter(max(end_col, start_col))}{max(end_row, start_row)}"
+            return actual_range, values
+
+    def write(self, spreadsheet_token: str, range_str: str, values: list) -> int:
+        """写入范围，返回写入的单元格数"""
+        sheet_id, start_row, start_col, _, _ = parse_range(range_str)
+        start_row = start_row or 1
+        start_col = start_col or 0
+        cells = 0
+        with self.lock:
+            rows = self.sheets[(spreadsheet_token, sheet_id)]
+            for offset, row_values in enumerate(values):
+                row_index = start_row - 1 + offset
+                while len(rows) <= row_index:
+                    rows.append([])
+                row = rows[row_index]
+                for col_offset, value in enumerate(row_values):
+                    col = start_col + col_offset
+                    while len(row) <= col:
+                        row.append(None)
+                    row[col] = value
+                    cells += 1
+            self.revision += 1
+        return cells
+
+    def append(self, spreadsheet_token: str, range_str: str, values: list) -> str:
+        """追加到工作表末尾，返回实际写入的范围"""
+        sheet_id = range_str.partition("!")[0]
+        with self.lock:
+            rows = self.sheets[(spreadsheet_token, sheet_id)]
+            start_row = len(rows) + 1
+            rows.extend(list(row) for row in values)
+            self.revision += 1
+            width = max((len(row) for row in values), default=1)
+            return f"{sheet_id}!A{start_row}:{_column_letter(width - 1)}{len(rows)}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+    protocol_version = "HTTP/1.1"  # 支持长连接，与真实服务一致
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _handle(self, method: str):
+        state = self.state
+        path = urlparse(self.path).path
+        body = self._read_body() if method in ("POST", "PUT") else {}
+
+        # 管理接口不计入统计，也不注入故障
+        if path == "/_stub/stats":
+            with state.lock:
+                stats = dict(state.stats)
+            return self._send_json(200, {"code": 0, "data": stats})
+        if path == "/_stub/reset":
+            state.reset()
+            return self._send_json(200, {"code": 0})
+
+        state.delay()
+
+        if path == TOKEN_PATH and method == "POST":
+            state.count("tenant_access_token", 1)
+            return self._send_json(200, {
+                "code": 0,
+                "msg": "ok",
+                "tenant_access_token": state.issue_token(),
+                "expire": state.token_expire
+            })
+
+        if not path.startswith(SHEETS_PREFIX):
+            return self._send_json(404, {"code": 404, "msg": "not found"})
+
+        token = (self.headers.get("Authorization") or "").replace("Bearer ", "", 1)
+        if not state.token_valid(token):
+            state.count("token_invalid", 1)
+            return self._send_json(400, {"code": CODE_TOKEN_INVALID, "msg": "Invalid access token for authorization"})
+
+        if state.rate_limited(token):
+            state.count("rate_limited", 1)
+            return self._send_json(429, {"code": CODE_RATE_LIMITED, "msg": "request trigger frequency limit"},
+                                   {"Retry-After": "1", "x-ogw-ratelimit-reset": "1"})
+
+        if state.error_rate and random.random() < state.error_rate:
+            state.count("injected_error", 1)
+            return self._send_json(500, {"code": 500, "msg": "injected error"})
+
+        parts = path[len(SHEETS_PREFIX):].split("/", 2)
+        spreadsheet_token = parts[0]
+        action = parts[1] if len(parts) > 1 else ""
+
+        if action == "values" and method == "GET" and len(parts) == 3:
+            state.count("values_get", 1)
+            actual_range, values = state.read(spreadsheet_token, unquote(parts[2]))
+            return self._send_json(200, {"code": 0, "msg": "success", "data": {
+                "revision": state.revision,
+                "spreadsheetToken": spreadsheet_token,
+                "valueRange": {"majorDimension": "ROWS", "range": actual_range,
+                               "revision": state.revision, "values": values}
+            }})
+
+        if action == "values" and method == "PUT":
+            state.count("values_put", 1)
+            value_range = body.get("valueRange", {})
+            cells = state.write(spreadsheet_token, value_range.get("range", ""), value_range.get("values", []))
+            state.count("cells_written", cells)
+            return self._send_json(200, {"code": 0, "msg": "success", "data": {
+                "revision": state.revision, "updatedRange": value_range.get("range"), "updatedCells": cells
+            }})
+
+        if action == "values_append" and method == "POST":
+            state.count("values_append", 1)
+            value_range = body.get("valueRange", {})
+            values = value_range.get("values", [])
+            updated_range = state.append(spreadsheet_token, value_range.get("range", ""), values)
+            state.count("cells_written", sum(len(row) for row in values))
+            return self._send_json(200, {"code": 0, "msg": "success", "data": {
+                "revision": state.revision,
+                "spreadsheetToken": spreadsheet_token,
+                "tableRange": updated_range,
+                "updates": {"updatedRange": updated_range, "updatedRows": len(values),
+                            "updatedCells": sum(len(row) for row in values), "revision": state.revision}
+            }})
+
+        if action == "values_batch_update" and method == "POST":
+            state.count("values_batch_update", 1)
+            responses = []
+            for value_range in body.get("valueRanges", []):
+                cells = state.write(spreadsheet_token, value_range.get("range", ""), value_range.get("values", []))
+                state.count("cells_written", cells)
+                responses.append({"updatedRange": value_range.get("range"), "updatedCells": cells})
+            return self._send_json(200, {"code": 0, "msg": "success", "data": {
+                "revision": state.revision, "spreadsheetToken": spreadsheet_token, "responses": responses
+            }})
+
+        if action == "sheets" and method == "GET":
+            state.count("sheets", 1)
+            with state.lock:
+                sheet_ids = sorted({sheet_id for token_key, sheet_id in state.sheets if token_key == spreadsheet_token})
+            sheets = [{"sheetId": sheet_id, "title": sheet_id, "index": index} for index, sheet_id in enumerate(sheet_ids)]
+            return self._send_json(200, {"code": 0, "msg": "success", "data": {"sheets": sheets}})
+
+        return self._send_json(404, {"code": 404, "msg": "not found"})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8765, **options) -> ThreadingHTTPServer:
+    """
+    创建模拟服务（不启动）
+
+    Args:
+        host (str): 监听地址
+        port (int): 监听端口，0表示随机端口
+        **options: StubState 的故障注入参数
+
+    Returns:
+        ThreadingHTTPServer: 服务实例，server.state 为内存状态
+    """
+    state = StubState(**options)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地飞书电子表格模拟服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0, help="每个请求的固定延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="随机附加延迟上限（毫秒）")
+    parser.add_argument("--rate-limit", type=float, default=0, help="每个token每秒允许的请求数，0表示不限流")
+    parser.add_argument("--error-rate", type=float, default=0, help="随机返回500的概率")
+    parser.add_argument("--token-expire", type=int, default=7200, help="token有效期（秒）")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                           rate_limit=args.rate_limit, error_rate=args.error_rate, token_expire=args.token_expire)
+    print(f"飞书模拟服务已启动: http://{args.host}:{server.server_port}")
+    print(f"设置 FEISHU_DOMAIN=http://{args.host}:{server.server_port} 后运行采集程序即可连接模拟服务")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("飞书模拟服务已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
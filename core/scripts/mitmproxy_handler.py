@@ -160,10 +160,15 @@ class ChainCookieInterceptor:
         # 记录日志
         logger.info(f"捕获到目标请求 - 域名: {request.url}, cookie值: {cookie_header}")
 
+        # 客户端连接的代理端口，多设备采集时用于区分cookie来自哪台设备
+        sockname = flow.client_conn.sockname
+        proxy_port = sockname[1] if sockname else None
+
         # 保存到数据库
-        self.save_chain_data(request.host, request.url, cookie_header, request.timestamp_start)
+        self.save_chain_data(request.host, request.url, cookie_header, request.timestamp_start, proxy_port)
 
-    def save_chain_data(self, host: str, domain: str, cookie_header: str, timestamp: float):
+    def save_chain_data(self, host: str, domain: str, cookie_header: str, timestamp: float,
+                        proxy_port: Optional[int] = None):
         """
         保存 chain 数据到数据库
 
@@ -172,6 +177,7 @@ class ChainCookieInterceptor:
             domain (str): 请求域名
             cookie_header (str): 完整的 Cookie
             timestamp (float): 时间戳
+            proxy_port (int): 接收请求的代理端口
         """
         try:
             # 检查 cookie 中是否包含必需的字段
@@ -215,7 +221,8 @@ class ChainCookieInterceptor:
                 domain=domain,
                 chain_id=chain_id,
                 cookie_header=cookie_header,
-                timestamp=dt_timestamp
+                timestamp=dt_timestamp,
+                proxy_port=proxy_port
             )
 
             if success:
@@ -6,14 +6,29 @@ from core.utils.tools.proxy_utils import enable_global_proxy, disable_global_pro
 from core.utils.scheduler_manager import SchedulerManager
 from core.ui.controllers.data_collector import QNDataCollector
 from core.ui.controllers.dbz_data_collector import DBZDataCollector
+from core.utils.tools.feishu_sheet_writer import FeishuSheetBatchWriter
+from core.automation.waits import wait_until
+from config.settings import FEISHUConfig
 
 
 class AllCollector:
+    # 打开小程序后等待代理抓取到新cookie的最长时间（秒）
+    COOKIE_WAIT_TIMEOUT = 10
+    # 各品牌的自动化流程：(品牌名称, 流程类名, 采集数据时使用的名称)，按顺序分配给空闲的设备
+    BRAND_PROCESSES = [
+        ("吉姆电竞", "JiMuProcess", "吉姆电竞"),
+        ("查理熊", "ChaLiXiongProcess", "查理熊"),
+        ("星海电竞馆", "XingHaiProcess", "青海电竞馆"),
+        ("乐游", "LeYouProcess", "乐游"),
+        ("青鸟", "QingniaoUnitProcess", "青鸟"),
+    ]
 
     def __init__(self, scheduler_manager=None):
         self.process_obj = None
         self.log_callback = None  # 日志回调函数
         self.scheduler_manager = scheduler_manager or SchedulerManager()
+        self.sheet_writer = None  # 本次运行共享的飞书表格批量写入器
+        self._leftover_writer = None  # 上次运行结束时仍有未写入数据行的写入器，下次运行开始时先写入
 
     def _import_auto_processes(self):
         """延迟导入自动化处理模块，避免uiautomator2兼容性问题"""
@@ -21,11 +36,13 @@ class AllCollector:
             DianfengVSProcess, JiMuProcess
         return ChaLiXiongProcess, XingHaiProcess, LeYouProcess, QingniaoUnitProcess, DianfengVSProcess, JiMuProcess
 
-    def _collect_qn_data(self, wb_name, chain_id):
-        """执行青鸟数据收集任务"""
+    def _collect_qn_data(self, wb_name, chain_id, proxy_port=None):
+        """执行青鸟数据收集任务，proxy_port 不为空时使用该端口（设备）抓到的cookie"""
         self.log_callback(f"开始执行{wb_name}-{chain_id}数据收集任务...")
         qn_collector = QNDataCollector()
         qn_collector.log_callback = self.log_callback  # 设置日志回调
+        qn_collector.proxy_port = proxy_port
+        qn_collector.sheet_writer = self.sheet_writer  # 数据行加入本次运行的写入缓冲区
         qn_collector.get_all_data()
         self.log_callback("青鸟数据收集任务完成")
 
@@ -33,108 +50,101 @@ class AllCollector:
         """执行大巴掌平台数据收集任务"""
         self.log_callback("开始执行大巴掌平台数据收集任务...")
         dbz_collector = DBZDataCollector()
+        dbz_collector.sheet_writer = self.sheet_writer
         result = dbz_collector.run_full_process()
         self.log_callback(f"大巴掌平台数据收集任务完成，结果: {result.get('mongodb_save_result', 'Unknown')}")
         return result
 
-    def get_all_data(self):
-        try:
-            # # 发送日志到UI
-            self.log_callback("开始执行吉姆电竞数据收集任务...")
-
-            # 延迟导入自动化处理模块
-            _, _, _, _, _, JiMuProcess = self._import_auto_processes()
-
-            self.process_obj = JiMuProcess()
-            self.process_obj.main_process()
-            time.sleep(5)
-
-            # 检查数据时间戳
-            check_res = self._check_data_timestamp("吉姆电竞")
-
-            # 调用QNDataCollector获取青鸟数据
-            if check_res:
-                self._collect_qn_data('吉姆电竞', check_res)
-            #
-            if self.log_callback:
-                self.log_callback("吉姆电竞数据收集任务完成，开始执行查理熊数据收集任务...")
-
-            # 延迟导入自动化处理模块
-            ChaLiXiongProcess, _, _, _, _, _ = self._import_auto_processes()
-
-            self.process_obj = ChaLiXiongProcess()
-            self.process_obj.main_process()
-            time.sleep(5)
-
-            # 检查数据时间戳
-            check_res = self._check_data_timestamp("查理熊")
-
-            # 调用QNDataCollector获取青鸟数据
-            if check_res:
-                self._collect_qn_data('查理熊', check_res)
-
-            if self.log_callback:
-                self.log_callback("查理熊数据收集任务完成，开始执行星海电竞馆数据收集任务...")
-
-            # 延迟导入自动化处理模块
-            _, XingHaiProcess, _, _, _, _ = self._import_auto_processes()
-
-            self.process_obj = XingHaiProcess()
-            self.process_obj.main_process()
-            time.sleep(5)
-
-            # 检查数据时间戳
-            check_res = self._check_data_timestamp("星海电竞馆")
-
-            # 调用QNDataCollector获取青鸟数据
-            if check_res:
-                self._collect_qn_data('青海电竞馆', check_res)
-
+    def _take_sheet_writer(self):
+        """
+        获取本次运行的写入器：上次运行留下未写入的数据行时沿用上次的写入器，并先写入这些数据行
+
+        :return: FeishuSheetBatchWriter
+        """
+        writer, self._leftover_writer = self._leftover_writer, None
+        if writer is None or not writer.targets(FEISHUConfig.FEISHU_SPREADSHEET_TOKEN, FEISHUConfig.FEISHU_SHEET_ID):
+            if writer is not None and self.log_callback:
+                self.log_callback(f"飞书表格配置已变更，丢弃上次未写入的 {writer.pending_count} 条数据")
+            return FeishuSheetBatchWriter(FEISHUConfig.FEISHU_SPREADSHEET_TOKEN, FEISHUConfig.FEISHU_SHEET_ID)
+        if self.log_callback:
+            self.log_callback(f"先写入上次运行未写入的 {writer.pending_count} 条数据")
+        self._flush_writer(writer)
+        return writer
+
+    def _flush_sheet_writer(self):
+        """将本次运行缓冲的数据行统一写入飞书表格，仍未写入的数据行留到下次运行"""
+        if self.sheet_writer is None:
+            return
+        self._flush_writer(self.sheet_writer)
+        if self.sheet_writer.pending_count:
+            self._leftover_writer = self.sheet_writer
             if self.log_callback:
-                self.log_callback("星海电竞馆数据收集任务完成，开始执行乐游数据收集任务...")
-
-            # 延迟导入自动化处理模块
-            _, _, LeYouProcess, _, _, _ = self._import_auto_processes()
+                self.log_callback(f"{self.sheet_writer.pending_count} 条数据未写入飞书表格，下次运行时重新写入")
 
-            self.process_obj = LeYouProcess()
-            self.process_obj.main_process()
-            time.sleep(5)
+    def _flush_writer(self, writer):
+        """写入缓冲区中的数据行并记录结果"""
+        result = writer.flush()
+        if self.log_callback:
+            if result.get("success"):
+                self.log_callback(f"飞书表格批量写入完成: {result.get('appended')} 条数据，{result.get('requests')} 次请求")
+            else:
+                self.log_callback(f"飞书表格批量写入部分失败: {result.get('failed')} 条未写入，"
+                                  f"{result.get('uncertain')} 条结果不确定，{result.get('error_msg')}")
+
+    def _run_brand(self, pool, slot, brand):
+        """
+        在一台设备上执行一个品牌的自动化流程并采集数据
+
+        :param pool: 设备池
+        :param slot: 执行流程的设备
+        :param brand: BRAND_PROCESSES 中的一项
+        :return: dict，包含 success、error_msg 和 chain_id
+        """
+        process_name, class_name, wb_name = brand
+        cookie_port = pool.cookie_port(slot)
+        if self.log_callback:
+            self.log_callback(f"开始执行{process_name}数据收集任务（设备 {slot.serial}）...")
 
-            # 检查数据时间戳
-            check_res = self._check_data_timestamp("乐游")
+        # 延迟导入自动化处理模块
+        process_classes = {cls.__name__: cls for cls in self._import_auto_processes()}
+        self.process_obj = process_obj = process_classes[class_name](slot.serial)
+        started_at = datetime.now()
+        # 执行流程并记录步骤耗时，python -m core.automation.flow_recorder 查看最慢的步骤
+        process_obj.run()
+        # 等待代理抓取到本次打开小程序后的cookie，抓到即继续
+        self._wait_for_chain_cookie(process_name, started_at, proxy_port=cookie_port)
 
-            # 调用QNDataCollector获取青鸟数据
-            if check_res:
-                self._collect_qn_data('乐游', check_res)
-            if self.log_callback:
-                self.log_callback("乐优数据收集任务完成，开始执行青鸟数据收集任务...")
+        # 检查数据时间戳
+        check_res = self._check_data_timestamp(process_name, proxy_port=cookie_port)
 
-            # 延迟导入自动化处理模块
-            _, _, _, QingniaoUnitProcess, _, _ = self._import_auto_processes()
+        # 调用QNDataCollector获取青鸟数据
+        if check_res:
+            self._collect_qn_data(wb_name, check_res, proxy_port=cookie_port)
 
-            self.process_obj = QingniaoUnitProcess()
-            self.process_obj.main_process()
-            time.sleep(5)
-
-            # 检查数据时间戳
-            check_res = self._check_data_timestamp("青鸟")
+        if self.log_callback:
+            self.log_callback(f"{process_name}数据收集任务完成（设备 {slot.serial}）")
+        return {"success": bool(check_res), "error_msg": None if check_res else "未获取到cookie",
+                "chain_id": check_res}
 
-            # 调用QNDataCollector获取青鸟数据
-            if check_res:
-                self._collect_qn_data('青鸟', check_res)
+    def get_all_data(self):
+        # 各品牌和大巴掌的数据行先进入缓冲区，运行结束时合并写入飞书表格
+        self.sheet_writer = self._take_sheet_writer()
+        try:
+            # 延迟导入设备池，避免uiautomator2兼容性问题
+            from core.automation.device_pool import DevicePool
 
+            # 各品牌流程分配到设备池中的设备并行执行，每台设备的cookie从其专属代理端口抓取
+            pool = DevicePool()
             if self.log_callback:
-                self.log_callback("青鸟数据收集任务完成，开始执行电锋VS数据收集任务...")
+                self.log_callback(f"使用 {len(pool.slots)} 台设备执行品牌流程: "
+                                  f"{', '.join(slot.serial for slot in pool.slots) or '无'}")
 
-            # self.process_obj = DianfengVSProcess()
-            # self.process_obj.main_process()
-            # time.sleep(5)
-            #
-            # # 检查数据时间戳
-            # self._check_data_timestamp("电锋VS")
+            results = pool.run(self.BRAND_PROCESSES, lambda slot, brand: self._run_brand(pool, slot, brand))
+            for (process_name, _, _), result in zip(self.BRAND_PROCESSES, results):
+                if not result.get("success") and self.log_callback:
+                    self.log_callback(f"{process_name}数据收集任务失败: {result.get('error_msg')}")
 
-            # 调用QNDataCollector获取青鸟数据
-            # self._collect_qn_data()
+            # 电锋VS暂不采集（DianfengVSProcess）
 
             # 调用大巴掌平台数据收集功能
             self._collect_dbz_data()
@@ -147,34 +157,79 @@ class AllCollector:
             # 记录错误但不中断定时任务的后续执行
             import traceback
             print(f"定时任务执行错误: {traceback.format_exc()}")
+        finally:
+            # 即使中途出错，也写入已经采集到的数据
+            self._flush_sheet_writer()
+            self.sheet_writer = None
+
+    @staticmethod
+    def _parse_created_at(created_at):
+        """
+        将cookie的写入时间解析为datetime
+
+        :param created_at: datetime对象或ISO格式的时间字符串
+        :return: datetime，无法解析时返回None
+        """
+        if not isinstance(created_at, str):
+            return created_at
+        # 尝试解析ISO格式的时间字符串
+        try:
+            # 处理带时区信息的ISO格式
+            if '.' in created_at and '+' in created_at:
+                return datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            elif 'Z' in created_at:
+                return datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            elif '.' in created_at:
+                return datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S.%f')
+            else:
+                return datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            # 如果解析失败，尝试其他格式
+            try:
+                return datetime.fromisoformat(created_at)
+            except ValueError:
+                return None
+
+    def _wait_for_chain_cookie(self, process_name: str, started_at: datetime, timeout: float = None,
+                               proxy_port: int = None):
+        """
+        等待数据库中的cookie更新为本次流程开始之后抓取的数据，替代固定等待
+
+        :param process_name: 品牌名称
+        :param started_at: 本次自动化流程的开始时间
+        :param timeout: 最长等待时间（秒），默认为 COOKIE_WAIT_TIMEOUT
+        :param proxy_port: 只等待该代理端口（设备）抓到的cookie，None表示不区分
+        :return: 超时前是否等到新的cookie
+        """
+        timeout = self.COOKIE_WAIT_TIMEOUT if timeout is None else timeout
+
+        def cookie_updated():
+            data = db_manager.get_chain_cookie(proxy_port)
+            created_at = self._parse_created_at(data.get('created_at')) if data else None
+            return isinstance(created_at, datetime) and created_at.replace(tzinfo=None) >= started_at
+
+        start = time.monotonic()
+        if wait_until(cookie_updated, timeout=timeout, interval=0.2, max_interval=1.0):
+            print(f"{process_name} - {time.monotonic() - start:.1f}s 后获取到新的cookie")
+            return True
+        if self.log_callback:
+            self.log_callback(f"{process_name} - {timeout}秒内未获取到新的cookie")
+        return False
 
-    def _check_data_timestamp(self, process_name: str):
-        """检查数据库中的数据时间戳与当前时间的差距"""
+    def _check_data_timestamp(self, process_name: str, proxy_port: int = None):
+        """检查数据库中的数据时间戳与当前时间的差距，proxy_port 不为空时只检查该端口（设备）抓到的数据"""
 
-        data = db_manager.get_chain_cookie()
+        data = db_manager.get_chain_cookie(proxy_port)
         if data and 'created_at' in data:
             created_at = data['created_at']
             chain_id = data['chain_id']
             # 确保 created_at 是 datetime 对象
             if isinstance(created_at, str):
-                # 尝试解析ISO格式的时间字符串
-                try:
-                    # 处理带时区信息的ISO格式
-                    if '.' in created_at and '+' in created_at:
-                        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    elif 'Z' in created_at:
-                        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    elif '.' in created_at:
-                        created_at = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S.%f')
-                    else:
-                        created_at = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%S')
-                except ValueError:
-                    # 如果解析失败，尝试其他格式
-                    try:
-                        created_at = datetime.fromisoformat(created_at)
-                    except ValueError:
-                        self.log_callback(f"无法解析 {process_name} 的时间戳: {created_at}")
-                        return
+                parsed = self._parse_created_at(created_at)
+                if parsed is None:
+                    self.log_callback(f"无法解析 {process_name} 的时间戳: {created_at}")
+                    return
+                created_at = parsed
 
             current_time = datetime.now()
             time_diff = abs((current_time - created_at).total_seconds())
@@ -13,8 +13,9 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 load_dotenv()
 from core.utils.database import get_db_manager
+from core.utils.metadata_cache import get_metadata_cache
 from core.utils.tools.feishu_sheet_client import FeishuSheetClient
-from core.ui.controllers.dbz_data_collector import DBZDataCollector
+from config.settings import FEISHUConfig
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -30,10 +31,14 @@ class QNDataCollector:
         self.host = 'chain36226.tmwanba.com'
         self.db_manager = get_db_manager()
         self.cookie_header = None
+        self.proxy_port = None  # 设置后只加载该代理端口（设备）抓到的cookie
         self.session = requests.Session()
         self.log_callback = None  # 添加日志回调属性
+        self.metadata_cache = get_metadata_cache()  # 门店元数据缓存
         # 初始化飞书表格客户端
         self.feishu_client = FeishuSheetClient()
+        # 本次运行共享的飞书表格批量写入器，设置后数据行只加入缓冲区，由调用方统一写入
+        self.sheet_writer = None
 
     def log(self, message):
         """日志输出方法"""
@@ -53,7 +58,10 @@ class QNDataCollector:
         # 获取 target_domains 集合
         if self.db_manager.db is not None:
             cookie_collection = self.db_manager.db["chain_cookies"]
-            cookie_document = cookie_collection.find_one({"host": self.host})
+            query = {"host": self.host}
+            if self.proxy_port is not None:
+                query["proxy_port"] = self.proxy_port
+            cookie_document = cookie_collection.find_one(query, sort=[("created_at", -1)])
             if cookie_document:
                 self.cookie_header = parse_cookie_header(cookie_document["cookie_header"])
                 for key, value in self.cookie_header.items():
@@ -96,6 +104,27 @@ class QNDataCollector:
         logger.info(f"获取线下门店列表:{response.text}")
         return response.json()
 
+    def _load_store_metadata(self):
+        '''
+        从青鸟平台加载连锁门店元数据（品牌信息和线下门店列表），作为元数据缓存的加载函数
+        :return: 元数据字典，获取失败返回None
+        '''
+        store_info_resp = self.get_store_info()
+        if store_info_resp['code'] != 0:
+            self.log(f"获取品牌店铺信息失败:{store_info_resp.get('msg')}")
+            return None
+
+        offline_store_list = self.get_offline_store_list()
+        if offline_store_list['code'] != 0:
+            self.log(f'获取门店列表信息失败:{self.cookie_header.get("chain-id")}')
+            self.log(self.cookie_header)
+            return None
+
+        return {
+            'chain_name': store_info_resp.get('data').get('chain_name'),
+            'offline_stores': offline_store_list.get('data')
+        }
+
     def select_offline_store(self, offline_store_id: str):
         '''
         选择线下门店
@@ -143,9 +172,9 @@ class QNDataCollector:
             data_dict (dict): 从青鸟平台获取的数据
         """
         try:
-            # 表格配置信息（需要根据实际情况修改）
-            SPREADSHEET_TOKEN = "LkgdwebJHi5yOUkgOPAc2fnonFb"  # 电子表格token
-            SHEET_ID = "9a4941"  # 工作表ID
+            # 表格配置信息
+            SPREADSHEET_TOKEN = FEISHUConfig.FEISHU_SPREADSHEET_TOKEN  # 电子表格token
+            SHEET_ID = FEISHUConfig.FEISHU_SHEET_ID  # 工作表ID
 
             # 构造数据行
             rows = []
@@ -171,7 +200,12 @@ class QNDataCollector:
                 rows.append(row)
 
             # 如果有数据需要上传
-            if rows:
+            if rows and self.sheet_writer is not None and self.sheet_writer.targets(SPREADSHEET_TOKEN, SHEET_ID):
+                # 加入本次运行的批量写入缓冲区，由调用方在运行结束时统一写入
+                pending = self.sheet_writer.add_rows(rows)
+                self.log(f"已将 {len(rows)} 条数据加入飞书表格写入缓冲区，待写入 {pending} 条")
+                return True
+            elif rows:
                 # 调用飞书表格客户端追加数据
                 result = self.feishu_client.append_sheet_data(SPREADSHEET_TOKEN, SHEET_ID, rows)
                 if result.get("success"):
@@ -196,28 +230,21 @@ class QNDataCollector:
         '''
         # 获取一个连锁网吧的店铺信息
         self.load_cookie()
-        store_info_resp = self.get_store_info()
-        if store_info_resp['code'] == 0:
-            self.log(f"获取品牌店铺信息成功:{store_info_resp.get('data').get('chain_name')}")
-        else:
-            self.log(f"获取品牌店铺信息失败:{store_info_resp.get('msg')}")
+        # 门店信息和门店列表变化很慢，优先使用元数据缓存，过期时先用旧值，采集结束后再后台刷新
+        cache_key = self.metadata_cache.qn_chain_key(self.cookie_header.get('chain-id'))
+        store_metadata = self.metadata_cache.get_or_load(cache_key, self._load_store_metadata)
+        if store_metadata is None:
             return
+        self.log(f"获取品牌店铺信息成功:{store_metadata.get('chain_name')}")
 
         data_dict = {
             'store_id': self.cookie_header.get('chain-id'),
-            'store_name': store_info_resp.get('data').get('chain_name'),
+            'store_name': store_metadata.get('chain_name'),
             'offline_stores': []
         }
-        # 获取门店列表
-        offline_store_list = self.get_offline_store_list()
-        if offline_store_list['code'] != 0:
-            # print(f'获取门店列表信息失败:{self.cookie_header.get('chain-id')}')
-            self.log(f'获取门店列表信息失败:{self.cookie_header.get("chain-id")}')
-            self.log(self.cookie_header)
-            return
         # 循环门店列表
-        self.log(f'门店数:{len(offline_store_list.get("data"))}')
-        for store in offline_store_list['data']:
+        self.log(f'门店数:{len(store_metadata.get("offline_stores"))}')
+        for store in store_metadata['offline_stores']:
             offline_store_id = store.get('id')
             if offline_store_id == data_dict.get('store_id'):
                 self.log(f'门店id:{offline_store_id}与品牌店铺id相同，跳过')
@@ -301,11 +328,8 @@ class QNDataCollector:
         else:
             self.log("数据上传到飞书表格失败")
 
-        # 调用大巴掌平台数据收集功能
-        self.log("开始执行大巴掌平台数据收集任务...")
-        dbz_collector = DBZDataCollector()
-        dbz_result = dbz_collector.run_full_process()
-        self.log(f"大巴掌平台数据收集任务完成，结果: {dbz_result.get('mongodb_save_result', 'Unknown')}")
+        # 门店元数据已过期时在后台刷新，不阻塞本次采集
+        self.metadata_cache.refresh_async(cache_key, self._load_store_metadata)
 
 
 class DataCollectionWorker(QThread):
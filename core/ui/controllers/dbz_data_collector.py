@@ -1,14 +1,25 @@
+import os
+import sys
+import gzip
+import json
 import requests
 import logging
+import threading
 import time
 import uuid
-from typing import Dict, Any, Optional, List
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import zip_longest
+from typing import Dict, Any, Optional, List, Iterator
 from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
 
-from config.settings import FEISHUConfig
+from config.settings import FEISHUConfig, DBZConfig
 # 导入飞书表格客户端
 from core.utils.tools.feishu_sheet_client import FeishuSheetClient
 from core.utils.database import get_db_manager
+from core.utils.metadata_cache import get_metadata_cache
+from core.utils.request_planner import FallbackRequestPlanner, get_gid_history_store
+from core.utils.token_store import get_dbz_token_store
 
 
 @dataclass
@@ -30,6 +41,25 @@ class APIResponse:
     error_msg: Optional[str] = None
 
 
+class _RawCaptureWriter:
+    """调试抓包写入器：将原始响应逐行写入gzip压缩的JSON Lines文件，线程安全"""
+
+    def __init__(self, capture_dir: str):
+        os.makedirs(capture_dir, exist_ok=True)
+        self.file_path = os.path.join(capture_dir, f"dbz_raw_{time.strftime('%Y%m%d_%H%M%S')}.jsonl.gz")
+        self._file = gzip.open(self.file_path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
 class DBZDataCollector:
     """电瓶鸟数据收集器类，用于与青鸟网咖系统API交互"""
 
@@ -61,14 +91,45 @@ class DBZDataCollector:
         )
     ]
 
-    def __init__(self):
-        """初始化数据收集器"""
+    # 并发请求配置
+    MAX_WORKERS = 8
+    MAX_CONCURRENCY_PER_HOST = 4
+
+    def __init__(self, max_workers: Optional[int] = None, per_host_limit: Optional[int] = None,
+                 debug_capture: Optional[bool] = None):
+        """
+        初始化数据收集器
+
+        Args:
+            max_workers (int, optional): 并发请求线程数，默认为MAX_WORKERS，为1时退化为串行
+            per_host_limit (int, optional): 同一主机的并发请求上限，默认为MAX_CONCURRENCY_PER_HOST
+            debug_capture (bool, optional): 是否将原始响应写入压缩的旁路文件，默认为DBZConfig.DEBUG_CAPTURE
+        """
+        self.debug_capture = DBZConfig.DEBUG_CAPTURE if debug_capture is None else debug_capture
+        self._raw_capture: Optional[_RawCaptureWriter] = None
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.per_host_limit = per_host_limit or self.MAX_CONCURRENCY_PER_HOST
         self.session = requests.Session()
+        # 连接池大小与并发数一致，避免并发请求时连接被丢弃重建
+        adapter = HTTPAdapter(pool_connections=len(self.DEFAULT_AUTH_CONFIGS), pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_semaphores_lock = threading.Lock()
+        self.last_collect_stats: Dict[str, Any] = {}
         self.token = None
         # 初始化飞书表格客户端
         self.feishu_client = FeishuSheetClient()
+        # 本次运行共享的飞书表格批量写入器，设置后数据行只加入缓冲区，由调用方统一写入
+        self.sheet_writer = None
         # 初始化数据库管理器
         self.db_manager = get_db_manager()
+        # 网吧列表等元数据缓存
+        self.metadata_cache = get_metadata_cache()
+        # 剩余限制接口只在getMachines失败时才需要，由规划器按门店历史决定按需还是投机请求
+        self.gid_history = get_gid_history_store()
+        self.fallback_planner = FallbackRequestPlanner(self.gid_history)
+        # 登录token存储，所有实例和进程共享，避免每次运行都重新登录
+        self.token_store = get_dbz_token_store()
 
     def _get_headers(self, host: str, token: Optional[str] = None) -> Dict[str, str]:
         """
@@ -130,7 +191,8 @@ class DBZDataCollector:
                 success=False,
                 error_type="RequestException",
                 error_msg=str(e),
-                status_code=getattr(e.response, 'status_code', None) if e.response else None
+                # Response在4xx/5xx时布尔值为False，需与None比较，否则认证错误的状态码会丢失
+                status_code=getattr(e.response, 'status_code', None) if e.response is not None else None
             )
         except ValueError as e:  # JSON解析错误
             logging.error(f"响应JSON解析失败: {e}")
@@ -175,10 +237,11 @@ class DBZDataCollector:
 
         if response.success and response.data:
             logging.info(f"移动端登录(带Headers)响应: {response.data}")
-            # 更新实例token
+            # 写入共享token存储（按主机+商户ID+openId区分，并发登录多个品牌时互不覆盖）
             try:
                 if 'data' in response.data and 'token' in response.data['data']:
-                    self.token = response.data['data']['token']
+                    self.token_store.set(self.token_store.token_key(host, uniacid, openid),
+                                         response.data['data']['token'])
             except (KeyError, TypeError):
                 pass  # 忽略token提取失败的情况
         else:
@@ -250,91 +313,428 @@ class DBZDataCollector:
 
         return response
 
-    def collect_netbar_data(self, auth_configs: Optional[List[AuthConfig]] = None) -> List[Dict[str, Any]]:
+    def _login(self, auth_config: AuthConfig) -> Optional[tuple]:
         """
-        收集所有网吧数据
-        
+        登录品牌账号，获取token和网吧列表（同时刷新token存储和元数据缓存）
+
         Args:
-            auth_configs (List[AuthConfig], optional): 认证配置列表，如果未提供则使用默认配置
-            
+            auth_config (AuthConfig): 认证配置
+
         Returns:
-            list: 所有收集到的数据
+            tuple: (token, roster)，登录失败返回None
         """
-        # 使用默认认证配置或传入的配置
-        configs = auth_configs if auth_configs is not None else self.DEFAULT_AUTH_CONFIGS
-        collected_data = []
+        # 登录获取token
+        login_result = self.mobile_login_with_headers(
+            auth_config.host,
+            auth_config.uniacid,
+            auth_config.open_id
+        )
 
-        for auth_config in configs:
-            # 登录获取token
-            login_result = self.mobile_login_with_headers(
-                auth_config.host,
-                auth_config.uniacid,
-                auth_config.open_id
-            )
+        # 检查登录是否成功
+        if not login_result.success or not login_result.data:
+            logging.warning(f"登录失败: {auth_config.host}")
+            return None
 
-            # 检查登录是否成功
-            if not login_result.success or not login_result.data:
-                logging.warning(f"登录失败: {auth_config.host}")
-                continue
+        # 获取token
+        try:
+            token = login_result.data["data"]["token"]
+        except (KeyError, TypeError) as e:
+            logging.error(f"登录响应数据结构异常: {e}")
+            return None
+
+        # 获取网吧列表和用户信息，登录响应中缺失时回退到元数据缓存
+        roster = self._get_netbar_roster(auth_config, login_result)
+        if roster is None:
+            return None
+        return token, roster
+
+    def _login_brand(self, auth_config: AuthConfig) -> Optional[Dict[str, Any]]:
+        """
+        获取品牌的token、网吧列表和会员信息，token和网吧列表都有缓存时跳过登录
 
-            # 获取token和用户信息
-            try:
-                token = login_result.data["data"]["token"]
-                netbar_list = login_result.data["data"]["auth"]["netbarList"]
-                member_info = login_result.data["data"]["auth"]["member"]
-                brand_info = login_result.data["data"]["auth"]["company"]
-            except (KeyError, TypeError) as e:
-                logging.error(f"登录响应数据结构异常: {e}")
-                continue
+        Args:
+            auth_config (AuthConfig): 认证配置
 
+        Returns:
+            dict: 包含token、netbar_list、member和brand_data的字典，登录失败返回None
+        """
+        token_key = self.token_store.token_key(auth_config.host, auth_config.uniacid, auth_config.open_id)
+        cache_key = self.metadata_cache.dbz_netbar_key(auth_config.host, auth_config.uniacid)
+        token = self.token_store.get(token_key)
+        roster = self.metadata_cache.get(cache_key, allow_stale=True)
+
+        if token and roster:
+            logging.info(f"复用缓存的token和网吧列表，跳过登录: {auth_config.host}")
+            # 网吧列表过期时在后台重新登录刷新
+            self.metadata_cache.refresh_async(cache_key, lambda: (self._login(auth_config) or (None, None))[1])
+        else:
+            login_data = self._login(auth_config)
+            if login_data is None:
+                return None
+            token, roster = login_data
+        brand_info = roster["company"]
+
+        return {
+            "token": token,
+            "netbar_list": roster["netbar_list"],
+            "member": roster["member"],
             # 为每个品牌创建数据容器
-            brand_data = {
+            "brand_data": {
                 "brand_name": brand_info.get("name", ""),
                 "brand_id": brand_info.get("id", ""),
-                "member": member_info,
+                "member": roster["member"],
                 "netbars": []
             }
+        }
+
+    @staticmethod
+    def _is_auth_error(response: APIResponse) -> bool:
+        """判断响应是否为token失效等认证错误"""
+        if response.status_code in (401, 403):
+            return True
+        if not isinstance(response.data, dict) or response.data.get("code") in (0, 200):
+            return False
+        if response.data.get("code") in (401, 403):
+            return True
+        msg = str(response.data.get("msg", ""))
+        return "token" in msg.lower() or "登录" in msg
+
+    def _authed_request(self, request_func, auth_config: AuthConfig, gid: int, account: str) -> APIResponse:
+        """
+        使用共享token存储中该品牌账号的token发送请求，没有token时先登录，遇到认证错误时重新登录并重试一次
+
+        Args:
+            request_func (callable): get_machines或get_remaining_limit
+            auth_config (AuthConfig): 认证配置
+            gid (int): 网吧ID
+            account (str): 账户ID/身份证号
+
+        Returns:
+            APIResponse: 请求结果
+        """
+        token_key = self.token_store.token_key(auth_config.host, auth_config.uniacid, auth_config.open_id)
+        token = self.token_store.get(token_key)
+        if not token:
+            # 只使用该品牌账号自己的token，不借用其他品牌登录得到的token
+            token = self.token_store.refresh(token_key, lambda: (self._login(auth_config) or (None, None))[0])
+            if not token:
+                return APIResponse(success=False, error_type="AuthError",
+                                   error_msg=f"没有可用的token: {auth_config.host}")
+        response = self._host_limited(request_func, auth_config.host, gid, account, token)
+        if not self._is_auth_error(response):
+            return response
+
+        logging.warning(f"token已失效，重新登录: {auth_config.host}")
+        self.token_store.invalidate(token_key, token)
+        new_token = self.token_store.refresh(
+            token_key,
+            lambda: (self._login(auth_config) or (None, None))[0],
+            stale_token=token
+        )
+        if not new_token:
+            return response
+        return self._host_limited(request_func, auth_config.host, gid, account, new_token)
+
+    def _get_host_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        """获取指定主机的并发信号量，限制同一主机上同时进行的请求数"""
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+
+    def _host_limited(self, request_func, host: str, *args) -> APIResponse:
+        """在主机并发上限内执行一次请求"""
+        with self._get_host_semaphore(host):
+            return request_func(host, *args)
+
+    @staticmethod
+    def _has_machine_data(machines_result: Optional[APIResponse]) -> bool:
+        """判断getMachines响应中是否有可用于统计座位的数据，与process_netbar_data的判断一致"""
+        return bool(machines_result and
+                    machines_result.success and
+                    machines_result.data and
+                    isinstance(machines_result.data, dict) and
+                    "data" in machines_result.data)
+
+    def _fetch_netbar(self, auth_config: AuthConfig, netbar: Dict[str, Any], account: str,
+                      speculative_future: Optional[Future] = None) -> Dict[str, int]:
+        """
+        获取单个门店的座位数据并立即归约为座位统计，原始响应不再保留
+
+        先请求getMachines，失败或无数据时再按需请求getRemainingLimit；
+        若已投机发出getRemainingLimit，则在需要时等待其结果
+
+        Args:
+            auth_config (AuthConfig): 认证配置
+            netbar (dict): 网吧门店信息
+            account (str): 账户ID/身份证号
+            speculative_future (Future, optional): 投机请求getRemainingLimit的Future
+
+        Returns:
+            dict: 座位统计 {"total", "online", "offline"}
+        """
+        gid = netbar.get("id")
+        machines_result = self._authed_request(self.get_machines, auth_config, gid, account)
+        self.fallback_planner.count("primary")
+        has_data = self._has_machine_data(machines_result)
+        self.gid_history.record(self.gid_history.gid_key(auth_config.host, gid), has_data)
+
+        remaining_limit_result = None
+        if not has_data:
+            if speculative_future is not None:
+                # 投机请求先于本任务提交，线程池按提交顺序执行，等待它不会死锁
+                remaining_limit_result = speculative_future.result()
+            else:
+                logging.info(f"门店 {gid} 的机器信息不可用，按需请求剩余限制信息")
+                remaining_limit_result = self._authed_request(self.get_remaining_limit, auth_config, gid, account)
+                self.fallback_planner.count("on_demand")
+
+        if self._raw_capture is not None:
+            self._raw_capture.write({
+                "host": auth_config.host,
+                "netbar": netbar,
+                "machines": machines_result.__dict__,
+                "remaining_limit": remaining_limit_result.__dict__ if remaining_limit_result else None
+            })
+
+        return self._calculate_seat_stats(machines_result.__dict__,
+                                          remaining_limit_result.__dict__ if remaining_limit_result else {})
+
+    def iter_netbar_stats(self, auth_configs: Optional[List[AuthConfig]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        逐个产出门店的座位统计
+
+        各品牌的登录、各门店的请求并发执行，同一主机的并发数受per_host_limit限制；
+        每个门店在工作线程中收到响应后立即归约为座位统计，按品牌和门店的原始顺序产出。
+        getRemainingLimit只在getMachines不可用时按需请求；历史上getMachines经常失败的门店则与其同时投机请求
+
+        Args:
+            auth_configs (List[AuthConfig], optional): 认证配置列表，如果未提供则使用默认配置
+
+        Yields:
+            dict: {"brand": 品牌数据容器, "info": 门店信息, "seats_stats": 座位统计}
+        """
+        # 使用默认认证配置或传入的配置
+        configs = auth_configs if auth_configs is not None else self.DEFAULT_AUTH_CONFIGS
+        self.fallback_planner.reset_stats()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # 并发登录所有品牌，map保证结果与配置顺序一致
+            brand_contexts = list(executor.map(self._login_brand, configs))
+
+            # 按品牌轮流提交各门店的请求，避免某一主机的请求占满线程池而在信号量上空等
+            brand_queues = []
+            for brand_index, (auth_config, context) in enumerate(zip(configs, brand_contexts)):
+                if context is None:
+                    continue
+                account = context["member"].get("idcard")
+                brand_queues.append([((brand_index, netbar_index), auth_config, netbar, account)
+                                     for netbar_index, netbar in enumerate(context["netbar_list"])])
+
+            futures = {}
+            for round_items in zip_longest(*brand_queues):
+                for item in round_items:
+                    if item is None:
+                        continue
+                    position, auth_config, netbar, account = item
+                    gid = netbar.get("id")
+                    logging.info(f"正在处理门店: {netbar.get('name', '未知门店')}")
+                    # 获取机器座位信息；近期getMachines经常失败的门店同时投机请求剩余限制信息
+                    speculative_future = None
+                    if self.fallback_planner.should_speculate(self.gid_history.gid_key(auth_config.host, gid)):
+                        speculative_future = executor.submit(self._authed_request, self.get_remaining_limit,
+                                                             auth_config, gid, account)
+                        self.fallback_planner.count("speculative")
+                    futures[position] = executor.submit(self._fetch_netbar, auth_config, netbar, account,
+                                                        speculative_future)
+
+            # 按品牌和门店的原始顺序产出，取出后即释放对应的Future
+            for brand_index, context in enumerate(brand_contexts):
+                if context is None:
+                    continue
+                for netbar_index, netbar in enumerate(context["netbar_list"]):
+                    yield {
+                        "brand": context["brand_data"],
+                        "info": netbar,
+                        "seats_stats": futures.pop((brand_index, netbar_index)).result()
+                    }
 
-            # 遍历所有网吧门店
-            for netbar in netbar_list:
-                gid = netbar.get("id")
-                netbar_name = netbar.get("name", "未知门店")
-
-                logging.info(f"正在处理门店: {netbar_name}")
-
-                # 获取机器座位信息
-                machines_result = self.get_machines(
-                    auth_config.host,
-                    gid,
-                    member_info.get("idcard"),
-                    token
-                )
-
-                # 获取剩余限制信息（在线机器数和空闲机器数）
-                remaining_limit_result = self.get_remaining_limit(
-                    auth_config.host,
-                    gid,
-                    member_info.get("idcard"),
-                    token
-                )
+        self.gid_history.flush()
+
+    def collect_netbar_data(self, auth_configs: Optional[List[AuthConfig]] = None) -> List[Dict[str, Any]]:
+        """
+        收集所有网吧数据，每个门店只保留门店信息和座位统计
+
+        开启调试抓包（debug_capture）时，原始响应写入压缩的旁路文件
+        
+        Args:
+            auth_configs (List[AuthConfig], optional): 认证配置列表，如果未提供则使用默认配置
+            
+        Returns:
+            list: 所有收集到的数据
+        """
+        collected_data = []
+        start_time = time.perf_counter()
+
+        if self.debug_capture:
+            self._raw_capture = _RawCaptureWriter(DBZConfig.DEBUG_CAPTURE_DIR)
+        try:
+            for netbar_stats in self.iter_netbar_stats(auth_configs):
+                brand_data = netbar_stats["brand"]
+                if not collected_data or collected_data[-1] is not brand_data:
+                    collected_data.append(brand_data)
 
                 # 保存数据
                 brand_data["netbars"].append({
-                    "info": netbar,
-                    "machines": machines_result.__dict__ if machines_result else {},
-                    "remaining_limit": remaining_limit_result.__dict__ if remaining_limit_result else {}
+                    "info": netbar_stats["info"],
+                    "seats_stats": netbar_stats["seats_stats"]
                 })
-
-            collected_data.append(brand_data)
+        finally:
+            if self._raw_capture is not None:
+                self._raw_capture.close()
+                logging.info(f"原始响应已写入: {self._raw_capture.file_path}")
+                self._raw_capture = None
+
+        elapsed = time.perf_counter() - start_time
+        request_stats = self.fallback_planner.summary()
+        request_count = sum(request_stats.values())
+        self.last_collect_stats = {
+            "elapsed": elapsed,
+            "brands": len(collected_data),
+            "netbars": sum(len(brand["netbars"]) for brand in collected_data),
+            "requests": request_count,
+            "request_breakdown": request_stats,
+            "max_workers": self.max_workers,
+            "per_host_limit": self.per_host_limit
+        }
+        logging.info(f"网吧数据收集完成，耗时 {elapsed:.2f}s，请求数 {request_count}"
+                     f"（getMachines {request_stats['primary']}，按需回退 {request_stats['on_demand']}，"
+                     f"投机回退 {request_stats['speculative']}），"
+                     f"并发数 {self.max_workers}，单主机并发上限 {self.per_host_limit}")
 
         return collected_data
 
+    def benchmark_collect(self, auth_configs: Optional[List[AuthConfig]] = None) -> Dict[str, Any]:
+        """
+        对比串行与并发方式收集网吧数据的耗时
+
+        Args:
+            auth_configs (List[AuthConfig], optional): 认证配置列表
+
+        Returns:
+            dict: 串行和并发两次收集的统计信息及加速比
+        """
+        max_workers, per_host_limit = self.max_workers, self.per_host_limit
+        try:
+            self.max_workers, self.per_host_limit = 1, 1
+            self._host_semaphores.clear()
+            self.collect_netbar_data(auth_configs)
+            serial_stats = self.last_collect_stats
+        finally:
+            # 主机信号量按创建时的并发上限初始化，恢复配置后需要重建
+            self.max_workers, self.per_host_limit = max_workers, per_host_limit
+            self._host_semaphores.clear()
+
+        self.collect_netbar_data(auth_configs)
+        concurrent_stats = self.last_collect_stats
+
+        speedup = serial_stats["elapsed"] / concurrent_stats["elapsed"] if concurrent_stats["elapsed"] else 0
+        logging.info(f"串行耗时 {serial_stats['elapsed']:.2f}s，并发耗时 {concurrent_stats['elapsed']:.2f}s，"
+                     f"加速比 {speedup:.1f}x")
+        return {
+            "serial": serial_stats,
+            "concurrent": concurrent_stats,
+            "speedup": speedup
+        }
+
+    def _get_netbar_roster(self, auth_config: AuthConfig,
+                           login_result: APIResponse) -> Optional[Dict[str, Any]]:
+        """
+        从登录响应中提取网吧列表、会员和品牌信息，并写入元数据缓存
+
+        Args:
+            auth_config (AuthConfig): 认证配置
+            login_result (APIResponse): 登录响应结果
+
+        Returns:
+            dict: 包含netbar_list、member、company的字典，无法获取时返回None
+        """
+        cache_key = self.metadata_cache.dbz_netbar_key(auth_config.host, auth_config.uniacid)
+        try:
+            auth_info = login_result.data["data"]["auth"]
+            roster = {
+                "netbar_list": auth_info["netbarList"],
+                "member": auth_info["member"],
+                "company": auth_info["company"]
+            }
+        except (KeyError, TypeError) as e:
+            logging.warning(f"登录响应中缺少网吧列表，使用元数据缓存: {e}")
+            roster = self.metadata_cache.get(cache_key, allow_stale=True)
+            if roster is None:
+                logging.error(f"元数据缓存中也没有网吧列表: {cache_key}")
+            return roster
+
+        self.metadata_cache.set(cache_key, roster)
+        return roster
+
+    def _calculate_seat_stats(self, machines_result: Dict[str, Any],
+                              remaining_limit_result: Dict[str, Any]) -> Dict[str, int]:
+        """
+        根据机器信息（优先）或剩余限制信息统计门店座位
+
+        Args:
+            machines_result (dict): getMachines响应（APIResponse字段字典）
+            remaining_limit_result (dict): getRemainingLimit响应（APIResponse字段字典），未请求时为空字典
+
+        Returns:
+            dict: 座位统计 {"total", "online", "offline"}
+        """
+        # 统计座位信息
+        total_seats = 0
+        online_seats = 0
+        offline_seats = 0
+
+        # 优先使用机器信息中的数据
+        if (machines_result.get("success") and
+                machines_result.get("data") and
+                isinstance(machines_result["data"], dict) and
+                "data" in machines_result["data"]):
+
+            online_seats, offline_seats, total_seats = self._calculate_seats_from_machines(machines_result)
+        else:
+            # 如果没有机器信息，回退到剩余限制数据分析
+            if (remaining_limit_result.get("success") and
+                    remaining_limit_result.get("data") and
+                    isinstance(remaining_limit_result["data"], dict) and
+                    "data" in remaining_limit_result["data"]):
+
+                remaining_data = remaining_limit_result["data"]["data"]
+                if isinstance(remaining_data, dict):
+                    # 使用剩余限制接口提供的数据
+
+                    offline_seats = remaining_data.get("remainingCount", 0)
+                    total_seats = remaining_data.get("machineCount", 0)
+                    online_seats = total_seats - offline_seats
+                else:
+                    # 如果都没有数据，返回默认值
+                    online_seats = 0
+                    offline_seats = 0
+
+        return {
+            "total": total_seats,
+            "online": online_seats,
+            "offline": offline_seats
+        }
+
     def process_netbar_data(self, collected_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         处理收集到的网吧数据，统计座位信息
+
+        collect_netbar_data已在收到响应时归约出座位统计，直接沿用；
+        兼容旧格式中带有machines/remaining_limit原始响应的门店数据
         
         Args:
-            collected_data (list): 收集到的原始数据
+            collected_data (list): 收集到的数据
             
         Returns:
             list: 处理后的数据
@@ -349,52 +749,14 @@ class DBZDataCollector:
             }
 
             for netbar_data in brand_data["netbars"]:
-                netbar_info = netbar_data["info"]
-                machines_result = netbar_data["machines"]
-                remaining_limit_result = netbar_data["remaining_limit"]
-
-                # 统计座位信息
-                total_seats = 0
-                online_seats = 0
-                offline_seats = 0
-
-                # 优先使用机器信息中的数据
-                if (machines_result.get("success") and
-                        machines_result.get("data") and
-                        isinstance(machines_result["data"], dict) and
-                        "data" in machines_result["data"]):
-
-                    online_seats, offline_seats, total_seats = self._calculate_seats_from_machines(machines_result)
-                else:
-                    # 如果没有机器信息，回退到剩余限制数据分析
-                    if (remaining_limit_result.get("success") and
-                            remaining_limit_result.get("data") and
-                            isinstance(remaining_limit_result["data"], dict) and
-                            "data" in remaining_limit_result["data"]):
-
-                        remaining_data = remaining_limit_result["data"]["data"]
-                        if isinstance(remaining_data, dict):
-                            # 使用剩余限制接口提供的数据
-
-                            offline_seats = remaining_data.get("remainingCount", 0)
-                            total_seats = remaining_data.get("machineCount", 0)
-                            online_seats = total_seats - offline_seats
-                        else:
-                            # 如果都没有数据，返回默认值
-                            online_seats = 0
-                            offline_seats = 0
+                seats_stats = netbar_data.get("seats_stats")
+                if seats_stats is None:
+                    seats_stats = self._calculate_seat_stats(netbar_data.get("machines") or {},
+                                                             netbar_data.get("remaining_limit") or {})
 
                 processed_brand["netbars"].append({
-                    "netbar_info": netbar_info,
-                    "seats_stats": {
-                        "total": total_seats,
-                        "online": online_seats,
-                        "offline": offline_seats
-                    },
-                    "raw_data": {
-                        "machines": machines_result,
-                        "remaining_limit": remaining_limit_result
-                    }
+                    "netbar_info": netbar_data["info"],
+                    "seats_stats": seats_stats
                 })
 
             processed_data.append(processed_brand)
@@ -545,6 +907,16 @@ class DBZDataCollector:
                     "message": "没有数据需要上传"
                 }
 
+            if self.sheet_writer is not None and self.sheet_writer.targets(spreadsheet_token, sheet_id):
+                # 加入本次运行的批量写入缓冲区，由调用方在运行结束时统一写入
+                pending = self.sheet_writer.add_rows(rows)
+                logging.info(f"已将 {len(rows)} 条数据加入飞书表格写入缓冲区，待写入 {pending} 条")
+                return {
+                    "success": True,
+                    "message": f"已缓冲 {len(rows)} 条数据",
+                    "buffered": True
+                }
+
             # 调用飞书表格客户端追加数据
             result = self.feishu_client.append_sheet_data(spreadsheet_token, sheet_id, rows)
 
@@ -583,8 +955,8 @@ class DBZDataCollector:
             bool: 保存是否成功
         """
         try:
-            # 连接数据库
-            if not self.db_manager.connect():
+            # 连接数据库（已连接时复用全局连接）
+            if not self.db_manager.connected and not self.db_manager.connect():
                 logging.error("无法连接到数据库")
                 return False
 
@@ -608,9 +980,7 @@ class DBZDataCollector:
         except Exception as e:
             logging.error(f"保存数据到MongoDB时发生异常: {e}")
             return False
-        finally:
-            # 断开数据库连接
-            self.db_manager.disconnect()
+        # 全局连接由其他采集线程共用，这里不断开
 
     def run_full_process(self, auth_configs: Optional[List[AuthConfig]] = None,
                          spreadsheet_token: Optional[str] = None,
@@ -676,6 +1046,11 @@ def main():
     # 创建数据收集器实例
     collector = DBZDataCollector()
 
+    # python -m core.ui.controllers.dbz_data_collector --benchmark 对比串行/并发收集耗时
+    if '--benchmark' in sys.argv:
+        print("=== 串行/并发收集耗时对比 ===")
+        return collector.benchmark_collect()
+
     print("=== 开始完整数据收集流程 ===")
 
     # 运行完整流程（不上传到飞书）
@@ -687,9 +1062,9 @@ def main():
 
     print(f"收集到 {total_brands} 个品牌，共 {total_netbars} 个门店的数据")
 
-    # 表格配置信息（需要根据实际情况修改）
-    SPREADSHEET_TOKEN = "LkgdwebJHi5yOUkgOPAc2fnonFb"  # 电子表格token
-    SHEET_ID = "9a4941"  # 工作表ID
+    # 表格配置信息
+    SPREADSHEET_TOKEN = FEISHUConfig.FEISHU_SPREADSHEET_TOKEN  # 电子表格token
+    SHEET_ID = FEISHUConfig.FEISHU_SHEET_ID  # 工作表ID
     result = collector.run_full_process(
         spreadsheet_token=SPREADSHEET_TOKEN,
         sheet_id=SHEET_ID
@@ -12,6 +12,7 @@ from mitmproxy.tools.dump import DumpMaster
 from mitmproxy.options import Options
 
 from core.utils.tools.proxy_utils import enable_windows_proxy, disable_windows_proxy
+from config.settings import AutomationConfig
 
 # 添加项目根目录到Python路径，以便可以导入自定义模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -111,9 +112,11 @@ class ProxyController:
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
 
-            # 配置选项
+            # 配置选项：每台采集设备一个监听端口，拦截器按端口区分cookie来自哪台设备
+            ports = range(AutomationConfig.PROXY_BASE_PORT,
+                          AutomationConfig.PROXY_BASE_PORT + AutomationConfig.PROXY_PORT_COUNT)
             opts = Options(
-                listen_port=8081,
+                mode=[f"regular@{port}" for port in ports],
                 ssl_insecure=True  # 忽略SSL证书验证
             )
 
@@ -21,6 +21,7 @@ class MongoDBManager:
         self.db: Optional[pymongo.database.Database] = None
         self.collection: Optional[pymongo.collection.Collection] = None
         self.connected = False
+        self._online_rate_indexed = False  # 是否已尝试为 online_rate_new 建立索引
 
         # 加载环境变量
         load_dotenv()
@@ -80,7 +81,7 @@ class MongoDBManager:
             logging.info("Disconnected from MongoDB")
 
     def insert_chain_data(self, host: str, domain: str, chain_id: str, cookie_header: str,
-                          timestamp: datetime = None) -> bool:
+                          timestamp: datetime = None, proxy_port: Optional[int] = None) -> bool:
         """
         插入 chain 数据到数据库
 
@@ -89,6 +90,7 @@ class MongoDBManager:
             chain_value (str): 从 cookie 中提取的 chain 值
             cookie (str): 完整的 cookie 字符串
             timestamp (datetime): 时间戳，默认为当前时间
+            proxy_port (int): 抓到请求的代理端口，多设备采集时每台设备使用不同端口
 
         Returns:
             bool: 插入是否成功
@@ -106,14 +108,15 @@ class MongoDBManager:
                 'chain_id': chain_id,
                 "cookie_header": cookie_header,
                 "timestamp": timestamp or datetime.now(),
-                "created_at": datetime.now()
+                "created_at": datetime.now(),
+                "proxy_port": proxy_port
             }
 
             # 插入数据
             logging.info(f"Preparing to insert data")
-            # 使用 upsert 操作：如果存在相同 domain 的数据则更新，否则插入
+            # 使用 upsert 操作：如果存在相同 host 和代理端口的数据则更新，否则插入
             result = self.collection.update_one(
-                {"host": host},  # 查询条件
+                {"host": host, "proxy_port": proxy_port},  # 查询条件
                 {"$set": document},  # 更新数据
                 upsert=True  # 如果不存在则插入
             )
@@ -162,6 +165,7 @@ class MongoDBManager:
     def insert_online_rate_v2(self, data: Dict[str, Any]):
         """
        插入在线率数据到数据库
+       每个门店单独写入当天文档的 data.小时.门店 字段，多个线程同时写入同一小时时互不覆盖
 
        Args:
            data (Dict[str, Any]): 在线率数据字典
@@ -172,46 +176,55 @@ class MongoDBManager:
         if not self.connected:
             logging.error("Database not connected, unable to insert data")
             return False
+        if not data:
+            return True
 
-        self.collection = self.db['online_rate_new']
+        # 使用局部变量，避免与其他线程共用 self.collection
+        collection = self.db['online_rate_new']
+        self._ensure_online_rate_index(collection)
 
         # 获取当天日期 yyyy-mm-dd格式
         today = datetime.now().strftime("%Y-%m-%d")
 
-        # 查询集合中是否有sheet_date等于当天日期的数据
-        existing_data = self.collection.find_one({"sheet_date": today})
-
         # 获取当前小时
         current_hour = datetime.now().strftime("%H")  # 保持为字符串，例如 "00", "14"
-        # current_hour = int(current_hour)  # 转换为整数 - 注释掉，保持为字符串
-
-        if existing_data:
-            # 如果已存在当天的数据，获取当前小时的数据并合并
-            existing_hour_data = existing_data.get('data', {}).get(current_hour, {})
-            # 将新数据合并到现有数据中
-            merged_data = {**existing_hour_data, **data}
-            
-            result = self.collection.update_one(
-                {"sheet_date": today},
-                {"$set": {f"data.{current_hour}": merged_data}}
-            )
-            if result.modified_count > 0:
-                logging.info(f"Successfully updated online rate data for date: {today}, hour: {current_hour}")
-            else:
-                logging.info(f"Updated online rate data but no changes made, date: {today}, hour: {current_hour}")
+
+        fields = {}
+        for store_key, value in data.items():
+            # 字段路径中的 "." 会被解析为嵌套字段，"$" 开头的字段名不允许写入
+            safe_key = str(store_key).replace(".", "．").lstrip("$")
+            if safe_key != store_key:
+                logging.warning(f"Store key {store_key!r} contains reserved characters, saved as {safe_key!r}")
+            fields[f"data.{current_hour}.{safe_key}"] = value
+
+        # 不存在当天的数据时创建新的文档，已存在时只更新本次的门店
+        result = collection.update_one({"sheet_date": today}, {"$set": fields}, upsert=True)
+        if result.upserted_id is not None:
+            logging.info(f"Successfully created new online rate data document, date: {today}, hour: {current_hour}, ID: {result.upserted_id}")
+        elif result.modified_count > 0:
+            logging.info(f"Successfully updated online rate data for date: {today}, hour: {current_hour}")
         else:
-            # 如果不存在当天的数据，创建新的文档
-            new_document = {
-                "sheet_date": today,
-                "data": {
-                    current_hour: data
-                }
-            }
-            result = self.collection.insert_one(new_document)
-            logging.info(f"Successfully created new online rate data document, date: {today}, hour: {current_hour}, ID: {result.inserted_id}")
+            logging.info(f"Updated online rate data but no changes made, date: {today}, hour: {current_hour}")
 
         return True
 
+    def _ensure_online_rate_index(self, collection):
+        """
+        为 online_rate_new 的 sheet_date 建立唯一索引（只尝试一次），
+        多个线程同时创建当天的文档时由数据库保证只有一个
+
+        Args:
+            collection: online_rate_new 集合
+        """
+        if self._online_rate_indexed:
+            return
+        self._online_rate_indexed = True
+        try:
+            collection.create_index("sheet_date", unique=True)
+        except Exception as e:
+            # 已有重复日期的历史数据时无法建立唯一索引，不影响写入
+            logging.warning(f"Failed to create unique index on online_rate_new.sheet_date: {str(e)}")
+
     def insert_online_rate(self, data: Dict[str, Any]) -> bool:
         """
         插入在线率数据到数据库
@@ -243,10 +256,13 @@ class MongoDBManager:
             logging.error(f"Failed to insert online rate data: {str(e)}")
             return False
 
-    def get_chain_cookie(self) -> Optional[Dict[str, Any]]:
+    def get_chain_cookie(self, proxy_port: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
-        从 chain_cookies 集合中获取一条数据
-        
+        从 chain_cookies 集合中获取最新的一条数据
+
+        Args:
+            proxy_port (int): 只查询该代理端口（设备）抓到的数据，None表示不区分
+
         Returns:
             Optional[Dict[str, Any]]: 返回查询到的数据字典，如果未找到则返回None
         """
@@ -262,8 +278,9 @@ class MongoDBManager:
             # 使用 'chain_cookies' 集合作为数据源
             collection = self.db['chain_cookies']
 
-            # 由于表中永远只有一条数据，使用 find_one 查询第一条
-            result = collection.find_one()
+            # 每个代理端口一条数据，取最新写入的一条
+            query = {"proxy_port": proxy_port} if proxy_port is not None else {}
+            result = collection.find_one(query, sort=[("created_at", -1)])
 
             if result:
                 logging.info("Successfully retrieved chain_cookies data")
@@ -0,0 +1,238 @@
+# utils/metadata_cache.py
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import CacheConfig
+from core.utils.tools.tools import load_json_file, save_json_file
+
+
+class MetadataCache:
+    """
+    门店元数据缓存
+    缓存青鸟连锁的门店信息/线下门店列表、大巴掌的网吧列表等变化很慢的数据，
+    持久化到本地 JSON 文件，过期后先返回旧值，再由后台线程刷新；
+    文件被其他进程（如界面和定时任务、--invalidate 命令）更新后，读写前按条目的更新时间合并，互不覆盖
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, ttl: Optional[int] = None):
+        """
+        初始化元数据缓存
+
+        Args:
+            cache_path (str, optional): 缓存文件路径，默认在 CacheConfig.CACHE_DIR 下
+            ttl (int, optional): 默认有效期（秒），默认为 CacheConfig.METADATA_CACHE_TTL
+        """
+        self.cache_path = cache_path or os.path.join(CacheConfig.CACHE_DIR, 'metadata_cache.json')
+        self.ttl = ttl if ttl is not None else CacheConfig.METADATA_CACHE_TTL
+        self._lock = threading.RLock()
+        self._refreshing = set()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._loaded_mtime = None
+        self._reload_if_changed()
+
+    @staticmethod
+    def qn_chain_key(chain_id: Optional[str]) -> Optional[str]:
+        """青鸟连锁门店元数据的缓存键，没有连锁ID时返回None（不缓存）"""
+        return f"qn:{chain_id}" if chain_id else None
+
+    @staticmethod
+    def dbz_netbar_key(host: str, uniacid: int) -> str:
+        """大巴掌网吧列表的缓存键"""
+        return f"dbz:{host}:{uniacid}"
+
+    def _reload_if_changed(self):
+        """
+        其他进程更新了缓存文件时重新加载并与内存中的条目合并：
+        两边都有的条目保留更新时间较新的；只在内存中的条目，比文件旧时视为已被其他进程失效
+        """
+        try:
+            mtime = os.path.getmtime(self.cache_path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            merged = load_json_file(self.cache_path, {}) or {}
+            for key, entry in self._entries.items():
+                stored = merged.get(key)
+                if stored is None:
+                    if entry.get("updated_at", 0) > mtime:
+                        merged[key] = entry
+                elif entry.get("updated_at", 0) > stored.get("updated_at", 0):
+                    merged[key] = entry
+            self._entries = merged
+            self._loaded_mtime = mtime
+
+    def _save(self):
+        """将缓存写入本地文件（调用方已持有锁并已合并其他进程的更新）"""
+        try:
+            save_json_file(self.cache_path, self._entries)
+            self._loaded_mtime = os.path.getmtime(self.cache_path)
+        except OSError as e:
+            logging.error(f"保存元数据缓存失败: {e}")
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() < entry.get("updated_at", 0) + entry.get("ttl", self.ttl)
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """
+        读取缓存值
+
+        Args:
+            key (str): 缓存键
+            allow_stale (bool): 是否允许返回已过期的值
+
+        Returns:
+            缓存值，不存在（或已过期且不允许过期值）时返回None
+        """
+        if key is None:
+            return None
+        self._reload_if_changed()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if allow_stale or self._is_fresh(entry):
+                return entry.get("value")
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """
+        写入缓存值并持久化
+
+        Args:
+            key (str): 缓存键
+            value: 可JSON序列化的缓存值
+            ttl (int, optional): 该条目的有效期（秒）
+        """
+        if key is None:
+            return
+        with self._lock:
+            # 先合并其他进程写入的条目，避免写回时覆盖
+            self._reload_if_changed()
+            self._entries[key] = {
+                "value": value,
+                "updated_at": time.time(),
+                "ttl": ttl if ttl is not None else self.ttl
+            }
+            self._save()
+
+    def is_fresh(self, key: str) -> bool:
+        """判断缓存条目是否存在且未过期"""
+        if key is None:
+            return False
+        self._reload_if_changed()
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and self._is_fresh(entry)
+
+    def invalidate(self, key: Optional[str] = None):
+        """
+        手动失效缓存
+
+        Args:
+            key (str, optional): 要失效的缓存键，为None时清空全部缓存
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+            self._save()
+        logging.info(f"元数据缓存已失效: {key or '全部'}")
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[Any]],
+                    ttl: Optional[int] = None, allow_stale: bool = True) -> Optional[Any]:
+        """
+        读取缓存，未命中时同步调用loader加载；key为None时不使用缓存，直接加载
+
+        过期的条目在allow_stale为True时直接返回旧值，调用方可随后调用refresh_async在后台刷新
+
+        Args:
+            key (str): 缓存键
+            loader (callable): 加载函数，返回None表示加载失败（不写入缓存）
+            ttl (int, optional): 该条目的有效期（秒）
+            allow_stale (bool): 是否允许返回已过期的值
+
+        Returns:
+            缓存值或加载结果，加载失败返回None
+        """
+        value = self.get(key, allow_stale=allow_stale)
+        if value is not None:
+            return value
+
+        value = loader()
+        if value is not None:
+            self.set(key, value, ttl)
+        return value
+
+    def refresh_async(self, key: str, loader: Callable[[], Optional[Any]],
+                      ttl: Optional[int] = None, force: bool = False) -> bool:
+        """
+        在后台线程中刷新已过期（或不存在）的缓存条目，同一个键同时只会有一个刷新线程
+
+        Args:
+            key (str): 缓存键
+            loader (callable): 加载函数，返回None表示加载失败（保留旧值）
+            ttl (int, optional): 该条目的有效期（秒）
+            force (bool): 是否忽略有效期强制刷新
+
+        Returns:
+            bool: 是否启动了刷新线程
+        """
+        if key is None:
+            return False
+        with self._lock:
+            if key in self._refreshing or (not force and self.is_fresh(key)):
+                return False
+            self._refreshing.add(key)
+
+        def _refresh():
+            try:
+                value = loader()
+                if value is not None:
+                    self.set(key, value, ttl)
+                    logging.info(f"后台刷新元数据缓存成功: {key}")
+                else:
+                    logging.warning(f"后台刷新元数据缓存失败，保留旧值: {key}")
+            except Exception as e:
+                logging.error(f"后台刷新元数据缓存时发生异常: {key}, {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_refresh, name=f"metadata-refresh-{key}", daemon=True).start()
+        return True
+
+
+# 全局元数据缓存实例
+metadata_cache = MetadataCache()
+
+
+def get_metadata_cache() -> MetadataCache:
+    """
+    获取全局元数据缓存实例
+
+    Returns:
+        MetadataCache: 元数据缓存实例
+    """
+    return metadata_cache
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="门店元数据缓存管理")
+    parser.add_argument('--invalidate', nargs='?', const='*', help="失效指定缓存键，不指定键则清空全部")
+    args = parser.parse_args()
+
+    if args.invalidate:
+        metadata_cache.invalidate(None if args.invalidate == '*' else args.invalidate)
+    else:
+        for cache_key, cache_entry in metadata_cache._entries.items():
+            state = "有效" if metadata_cache.is_fresh(cache_key) else "已过期"
+            print(f"{cache_key}: {state}, 更新时间 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(cache_entry.get('updated_at', 0)))}")
@@ -0,0 +1,147 @@
+# utils/request_planner.py
+import os
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from config.settings import CacheConfig
+from core.utils.tools.tools import load_json_file, save_json_file
+
+
+class GidHistoryStore:
+    """
+    门店请求结果历史
+    按门店（主机+gid）记录最近若干次主请求（getMachines）是否拿到可用数据，持久化到本地 JSON 文件
+    """
+
+    def __init__(self, history_path: Optional[str] = None, max_records: int = 10):
+        """
+        初始化历史记录
+
+        Args:
+            history_path (str, optional): 历史文件路径，默认在 CacheConfig.CACHE_DIR 下
+            max_records (int): 每个门店最多保留的记录数
+        """
+        self.history_path = history_path or os.path.join(CacheConfig.CACHE_DIR, 'dbz_gid_history.json')
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._records: Dict[str, List[int]] = load_json_file(self.history_path, {}) or {}
+
+    @staticmethod
+    def gid_key(host: str, gid) -> str:
+        """门店历史记录的键"""
+        return f"{host}:{gid}"
+
+    def record(self, key: str, success: bool):
+        """
+        记录一次主请求结果（仅更新内存，调用flush后落盘）
+
+        Args:
+            key (str): 门店键
+            success (bool): 主请求是否拿到可用数据
+        """
+        with self._lock:
+            records = self._records.setdefault(key, [])
+            records.append(1 if success else 0)
+            del records[:-self.max_records]
+            self._dirty = True
+
+    def recent(self, key: str, window: Optional[int] = None) -> List[int]:
+        """获取门店最近的请求结果，1表示成功，0表示失败"""
+        with self._lock:
+            records = list(self._records.get(key, []))
+        return records[-window:] if window else records
+
+    def failure_rate(self, key: str, window: Optional[int] = None) -> Optional[float]:
+        """
+        计算门店最近的主请求失败率
+
+        Returns:
+            float: 失败率，没有历史记录时返回None
+        """
+        records = self.recent(key, window)
+        if not records:
+            return None
+        return 1 - sum(records) / len(records)
+
+    def flush(self):
+        """将有变更的历史记录写入本地文件"""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {key: list(records) for key, records in self._records.items()}
+            self._dirty = False
+        try:
+            save_json_file(self.history_path, snapshot)
+        except OSError as e:
+            logging.error(f"保存门店请求历史失败: {e}")
+
+
+class FallbackRequestPlanner:
+    """
+    回退请求规划器
+    决定主请求之外的回退请求（getRemainingLimit）是按需在主请求失败后再发，
+    还是根据历史失败率与主请求同时投机发出
+    """
+
+    def __init__(self, history: GidHistoryStore, window: int = 5,
+                 speculate_threshold: float = 0.5, min_samples: int = 2):
+        """
+        初始化规划器
+
+        Args:
+            history (GidHistoryStore): 门店请求结果历史
+            window (int): 计算失败率时参考的最近记录数
+            speculate_threshold (float): 失败率达到该值时投机发出回退请求
+            min_samples (int): 至少有多少条记录才参考历史
+        """
+        self.history = history
+        self.window = window
+        self.speculate_threshold = speculate_threshold
+        self.min_samples = min_samples
+        self._stats_lock = threading.Lock()
+        self.stats = {"primary": 0, "speculative": 0, "on_demand": 0}
+
+    def should_speculate(self, key: str) -> bool:
+        """
+        是否应与主请求同时发出回退请求
+
+        Args:
+            key (str): 门店键
+
+        Returns:
+            bool: 最近主请求经常失败时返回True
+        """
+        if len(self.history.recent(key, self.window)) < self.min_samples:
+            return False
+        return self.history.failure_rate(key, self.window) >= self.speculate_threshold
+
+    def count(self, kind: str):
+        """统计各类请求数量，kind为primary/speculative/on_demand"""
+        with self._stats_lock:
+            self.stats[kind] += 1
+
+    def reset_stats(self):
+        """重置请求统计"""
+        with self._stats_lock:
+            self.stats = {key: 0 for key in self.stats}
+
+    def summary(self) -> Dict[str, int]:
+        """获取请求统计"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+
+# 全局门店请求历史实例
+gid_history_store = GidHistoryStore()
+
+
+def get_gid_history_store() -> GidHistoryStore:
+    """
+    获取全局门店请求历史实例
+
+    Returns:
+        GidHistoryStore: 门店请求历史实例
+    """
+    return gid_history_store
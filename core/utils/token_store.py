@@ -0,0 +1,172 @@
+# utils/token_store.py
+import os
+import json
+import time
+import base64
+import logging
+import threading
+from typing import Callable, Dict, Optional, Any
+
+from config.settings import CacheConfig
+from core.utils.tools.tools import load_json_file, save_json_file
+
+
+class DBZTokenStore:
+    """
+    大巴掌登录token存储
+    按主机+商户ID+openId缓存登录token，持久化到本地 JSON 文件，供所有DBZDataCollector实例和进程共享。
+    token过期通过JWT的exp字段或接口返回的认证错误判断
+    """
+
+    # JWT过期时间的提前量（秒），避免请求途中过期
+    EXPIRE_SKEW = 60
+
+    def __init__(self, store_path: Optional[str] = None):
+        """
+        初始化token存储
+
+        Args:
+            store_path (str, optional): 存储文件路径，默认在 CacheConfig.CACHE_DIR 下
+        """
+        self.store_path = store_path or os.path.join(CacheConfig.CACHE_DIR, 'dbz_tokens.json')
+        self._lock = threading.RLock()
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._tokens: Dict[str, Dict[str, Any]] = {}
+        self._loaded_mtime = None
+        self._reload_if_changed()
+
+    @staticmethod
+    def token_key(host: str, uniacid: int, open_id: str) -> str:
+        """token的存储键"""
+        return f"{host}:{uniacid}:{open_id}"
+
+    @staticmethod
+    def decode_jwt_exp(token: str) -> Optional[float]:
+        """
+        解析JWT中的exp字段
+
+        Args:
+            token (str): 登录token
+
+        Returns:
+            float: 过期时间戳，非JWT或没有exp字段时返回None
+        """
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+            return float(exp) if exp is not None else None
+        except (IndexError, ValueError, TypeError, AttributeError):
+            return None
+
+    def _reload_if_changed(self):
+        """其他进程更新了存储文件时重新加载"""
+        try:
+            mtime = os.path.getmtime(self.store_path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime != self._loaded_mtime:
+                self._tokens = load_json_file(self.store_path, {}) or {}
+                self._loaded_mtime = mtime
+
+    def _save(self):
+        try:
+            save_json_file(self.store_path, self._tokens)
+            self._loaded_mtime = os.path.getmtime(self.store_path)
+        except OSError as e:
+            logging.error(f"保存大巴掌token失败: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        获取未过期的token
+
+        Args:
+            key (str): token存储键
+
+        Returns:
+            str: token，不存在或已过期时返回None
+        """
+        self._reload_if_changed()
+        with self._lock:
+            entry = self._tokens.get(key)
+            if not entry:
+                return None
+            expires_at = entry.get("expires_at")
+            if expires_at is not None and time.time() >= expires_at - self.EXPIRE_SKEW:
+                logging.info(f"缓存的token已过期: {key}")
+                return None
+            return entry.get("token")
+
+    def set(self, key: str, token: str):
+        """
+        保存token，过期时间取自JWT的exp字段
+
+        Args:
+            key (str): token存储键
+            token (str): 登录token
+        """
+        with self._lock:
+            # 先合并其他进程保存的token，避免写回时覆盖
+            self._reload_if_changed()
+            self._tokens[key] = {
+                "token": token,
+                "expires_at": self.decode_jwt_exp(token),
+                "updated_at": time.time()
+            }
+            self._save()
+
+    def invalidate(self, key: str, token: Optional[str] = None):
+        """
+        使token失效（如接口返回认证错误）
+
+        Args:
+            key (str): token存储键
+            token (str, optional): 只有当前存储的token与之相同时才失效，避免误删其他线程刚刷新的token
+        """
+        with self._lock:
+            self._reload_if_changed()
+            entry = self._tokens.get(key)
+            if entry and (token is None or entry.get("token") == token):
+                self._tokens.pop(key, None)
+                self._save()
+                logging.info(f"token已失效: {key}")
+
+    def refresh(self, key: str, login_func: Callable[[], Optional[str]],
+                stale_token: Optional[str] = None) -> Optional[str]:
+        """
+        重新登录获取token，同一个键同时只会有一个线程登录，其余线程等待并复用结果
+
+        Args:
+            key (str): token存储键
+            login_func (callable): 登录函数，返回新token，失败返回None
+            stale_token (str, optional): 调用方手中已失效的token
+
+        Returns:
+            str: 新token，登录失败返回None
+        """
+        with self._lock:
+            refresh_lock = self._refresh_locks.setdefault(key, threading.Lock())
+        with refresh_lock:
+            current = self.get(key)
+            if current and current != stale_token:
+                # 等待期间其他线程已经刷新过
+                return current
+            token = login_func()
+            if token:
+                self.set(key, token)
+            return token
+
+
+# 全局token存储实例，所有DBZDataCollector共享
+dbz_token_store = DBZTokenStore()
+
+
+def get_dbz_token_store() -> DBZTokenStore:
+    """
+    获取全局大巴掌token存储实例
+
+    Returns:
+        DBZTokenStore: token存储实例
+    """
+    return dbz_token_store
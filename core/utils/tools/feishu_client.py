@@ -1,11 +1,9 @@
-import time
-
 import lark_oapi as lark
-import requests
 from lark_oapi.api.contact.v3 import *
 from lark_oapi.api.bitable.v1 import *
 
 from config.settings import FEISHUConfig
+from core.utils.tools.feishu_token_provider import get_feishu_token_provider
 
 
 class FeishuClient:
@@ -19,37 +17,24 @@ class FeishuClient:
                        .enable_set_token(True)
                        .log_level(lark.LogLevel.DEBUG)
                        .build())
-        token, expire = self._get_tenant_access_token()
-        self.tenant_access_token = tenant_access_token or token
-        self.token_expire_time = time.time() + expire
+        # tenant_access_token由进程内共享的token提供者懒加载和刷新，避免每个客户端各自请求
+        self._static_token = tenant_access_token
+        self.token_provider = get_feishu_token_provider()
 
-    @staticmethod
-    def _get_tenant_access_token():
-        """获取租户访问令牌"""
-        try:
-            url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal/"
-            post_data = {
-                "app_id": FEISHUConfig.FEISHU_APP_ID,
-                "app_secret": FEISHUConfig.FEISHU_APP_SECRET
-            }
-            response = requests.post(url, json=post_data)
-            response.raise_for_status()
-            result = response.json()
-            return result["tenant_access_token"], result.get("expire", 7200)
-        except Exception as e:
-            print(f"获取 tenant_access_token 失败: {e}")
-            return None, 0
+    @property
+    def tenant_access_token(self):
+        """当前的租户访问令牌"""
+        return self._static_token or self.token_provider.get_token()
+
+    @property
+    def token_expire_time(self):
+        """当前租户访问令牌的过期时间戳"""
+        return self.token_provider.expire_time
 
     def _refresh_token_if_needed(self):
-        """检查并刷新token"""
-        if time.time() >= self.token_expire_time - 60:  # 提前1分钟刷新
-            token, expire = self._get_tenant_access_token()
-            if token:
-                self.tenant_access_token = token
-                self.token_expire_time = time.time() + expire
-                print("Tenant access token 已刷新")
-            else:
-                print("刷新 tenant_access_token 失败")
+        """检查并刷新token（由token提供者在即将过期时刷新）"""
+        if self.tenant_access_token is None:
+            print("刷新 tenant_access_token 失败")
 
     def test_connection(self):
         """测试飞书连接"""
@@ -1,49 +1,49 @@
-import time
 import requests
 import json
 from config.settings import FEISHUConfig
+from core.utils.tools.feishu_token_provider import FeishuTokenProvider, get_feishu_token_provider
+from core.utils.tools.feishu_transport import FeishuTransport, FeishuRequestUncertain, get_feishu_transport
+from core.utils.tools.feishu_sheet_index import SheetRowIndex, column_letter, parse_range_start_row
 
 
 class FeishuSheetClient:
-    def __init__(self, tenant_access_token=None):
-        self.tenant_access_token = tenant_access_token
-        self.token_expire_time = 0
-        if tenant_access_token is None:
-            self._refresh_tenant_access_token()
-        self.base_url = "https://open.feishu.cn/open-apis/sheets/v2/spreadsheets"
-
-    def _is_token_expired(self):
-        """检查token是否即将过期（提前10分钟刷新）"""
-        return time.time() > self.token_expire_time - 600  # 提前10分钟刷新
-
-    def _refresh_tenant_access_token(self):
-        """获取或刷新租户访问令牌"""
-        try:
-            url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal/"
-            post_data = {
-                "app_id": FEISHUConfig.FEISHU_APP_ID,
-                "app_secret": FEISHUConfig.FEISHU_APP_SECRET
-            }
-            response = requests.post(url, json=post_data)
-            response.raise_for_status()
-            result = response.json()
-            print(f"获取 token 的响应: {result}")  # 调试信息
-            if "tenant_access_token" in result and "expire" in result:
-                self.tenant_access_token = result["tenant_access_token"]
-                # 设置过期时间（当前时间 + 有效期 - 1分钟安全缓冲）
-                self.token_expire_time = time.time() + result["expire"] - 60
-                return self.tenant_access_token
-            else:
-                print(f"响应中缺少 tenant_access_token 或 expire 字段: {result}")
-                return None
-        except Exception as e:
-            print(f"获取 tenant_access_token 失败: {e}")
-            return None
+    # token无效或过期的错误码，收到后刷新token重发一次（服务端已拒绝，重发不会重复写入）
+    TOKEN_INVALID_CODES = {99991661, 99991663, 99991668}
+    # 增量同步时每次批量写入的最大范围数、每次追加的最大行数
+    MAX_RANGES_PER_BATCH = 100
+    MAX_APPEND_ROWS = 5000
+
+    def __init__(self, tenant_access_token=None, token_provider: FeishuTokenProvider = None,
+                 transport: FeishuTransport = None):
+        """
+        初始化飞书表格客户端，token在首次请求时才通过进程内共享的token提供者获取
+
+        Args:
+            tenant_access_token (str, optional): 固定使用的租户访问令牌，不提供则使用token提供者
+            token_provider (FeishuTokenProvider, optional): token提供者，默认为进程内共享实例
+            transport (FeishuTransport, optional): HTTP传输层，默认为进程内共享实例（连接复用和限流）
+        """
+        self._static_token = tenant_access_token
+        self.token_provider = token_provider or (get_feishu_token_provider() if tenant_access_token is None else None)
+        self.transport = transport or get_feishu_transport()
+        self._row_indexes = {}  # 增量同步用的工作表行索引
+        # 域名取自 FEISHUConfig.FEISHU_DOMAIN，可指向本地模拟服务（core/scripts/feishu_stub_server.py）
+        self.base_url = f"{FEISHUConfig.FEISHU_DOMAIN.rstrip('/')}/open-apis/sheets/v2/spreadsheets"
+
+    @property
+    def tenant_access_token(self):
+        """当前的租户访问令牌"""
+        if self.token_provider is not None:
+            return self.token_provider.get_token()
+        return self._static_token
+
+    @property
+    def token_expire_time(self):
+        """当前租户访问令牌的过期时间戳"""
+        return self.token_provider.expire_time if self.token_provider is not None else 0
 
     def _ensure_valid_token(self):
-        """确保token有效，如果即将过期则刷新"""
-        if self.tenant_access_token is None or self._is_token_expired():
-            return self._refresh_tenant_access_token()
+        """确保token有效，如果即将过期则由token提供者刷新"""
         return self.tenant_access_token
 
     @staticmethod
@@ -92,6 +92,32 @@ class FeishuSheetClient:
             "Authorization": f"Bearer {self.tenant_access_token}"
         }
 
+    def _send(self, method: str, url: str, idempotent: bool = True, **kwargs):
+        """
+        通过共享传输层发送请求，token失效时刷新后重发一次
+
+        Args:
+            method (str): 请求方法
+            url (str): 请求URL
+            idempotent (bool): 请求是否幂等
+            **kwargs: 传给 requests 的其他参数
+
+        Returns:
+            requests.Response: 响应
+        """
+        response = self.transport.request(method, url, headers=self._get_headers, idempotent=idempotent, **kwargs)
+        if self.token_provider is not None and response.content:
+            try:
+                code = response.json().get("code")
+            except ValueError:
+                code = None
+            if code in self.TOKEN_INVALID_CODES:
+                print("tenant_access_token 已失效，刷新后重试")
+                self.token_provider.invalidate()
+                response = self.transport.request(method, url, headers=self._get_headers, idempotent=idempotent,
+                                                  **kwargs)
+        return response
+
     def read_sheet_data(self, spreadsheet_token: str, sheet_id: str, range_str: str = None) -> dict:
         """
         读取飞书文档中电子表格的数据
@@ -120,10 +146,8 @@ class FeishuSheetClient:
 
             print(f"请求URL: {url}")  # 调试信息
 
-            headers = self._get_headers()
-
             # 发送GET请求
-            response = requests.get(url, headers=headers)
+            response = self._send("GET", url)
             response.raise_for_status()
             
             # 检查响应内容
@@ -199,8 +223,6 @@ class FeishuSheetClient:
             # 构造请求URL
             url = f"{self.base_url}/{spreadsheet_token}/values"
 
-            headers = self._get_headers()
-
             # 构造请求体
             post_data = {
                 "valueRange": {
@@ -213,7 +235,7 @@ class FeishuSheetClient:
             print(f"写入请求数据: {post_data}")  # 调试信息
 
             # 发送PUT请求
-            response = requests.put(url, headers=headers, data=json.dumps(post_data))
+            response = self._send("PUT", url, data=json.dumps(post_data))
             response.raise_for_status()
             
             # 检查响应内容
@@ -288,8 +310,6 @@ class FeishuSheetClient:
             # 构造请求URL (根据您提供的正确格式进行修正)
             url = f"{self.base_url}/{spreadsheet_token}/values_append"
 
-            headers = self._get_headers()
-
             # 构造请求体 (根据您提供的正确格式进行修正)
             post_data = {
                 "valueRange": {
@@ -301,8 +321,8 @@ class FeishuSheetClient:
             print(f"追加请求URL: {url}")  # 调试信息
             print(f"追加请求数据: {post_data}")  # 调试信息
 
-            # 发送POST请求
-            response = requests.post(url, headers=headers, data=json.dumps(post_data))
+            # 发送POST请求，追加不是幂等操作，只在服务端明确拒绝时才重试
+            response = self._send("POST", url, idempotent=False, data=json.dumps(post_data))
             response.raise_for_status()
             
             # 检查响应内容
@@ -341,6 +361,13 @@ class FeishuSheetClient:
                 "success": False,
                 "error_msg": f"HTTP错误: {str(e)}"
             }
+        except FeishuRequestUncertain as e:
+            print(f"追加表格数据结果不确定，可能已写入: {e}")
+            return {
+                "success": False,
+                "maybe_applied": True,
+                "error_msg": f"结果不确定: {str(e)}"
+            }
         except requests.exceptions.RequestException as e:
             print(f"追加表格数据时请求异常: {e}")
             return {
@@ -354,6 +381,251 @@ class FeishuSheetClient:
                 "error_msg": str(e)
             }
 
+    def batch_update_sheet_data(self, spreadsheet_token: str, value_ranges: list) -> dict:
+        """
+        向飞书文档中的电子表格的多个范围写入数据（一次请求）
+
+        Args:
+            spreadsheet_token (str): 表格token，从文档URL中获取
+            value_ranges (list): 要写入的范围列表，格式 [{"range": "sheetId!D5:E5", "values": [[...]]}]
+
+        Returns:
+            dict: 写入结果，包含 success 状态和数据或错误信息
+        """
+        try:
+            # 确保 token 有效
+            if not self._ensure_valid_token():
+                return {
+                    "success": False,
+                    "error_msg": "无法获取有效的 tenant_access_token"
+                }
+
+            # 构造请求URL
+            url = f"{self.base_url}/{spreadsheet_token}/values_batch_update"
+
+            # 构造请求体
+            post_data = {
+                "valueRanges": value_ranges
+            }
+
+            print(f"批量写入请求URL: {url}，范围数: {len(value_ranges)}")  # 调试信息
+
+            # 写入指定范围是幂等操作，失败时可以安全重试
+            response = self._send("POST", url, data=json.dumps(post_data))
+            response.raise_for_status()
+
+            # 检查响应内容
+            if not response.content:
+                print(f"响应内容为空")
+                return {
+                    "success": False,
+                    "error_msg": "响应内容为空"
+                }
+
+            result = response.json()
+
+            if result.get("code") == 0:
+                print(f"成功批量写入表格数据")
+                return {
+                    "success": True,
+                    "data": result.get("data", {}),
+                    "msg": "写入成功"
+                }
+            else:
+                print(f"批量写入表格数据失败，错误码: {result.get('code')}, 错误信息: {result.get('msg')}")
+                return {
+                    "success": False,
+                    "error_code": result.get("code"),
+                    "error_msg": result.get("msg")
+                }
+
+        except requests.exceptions.HTTPError as e:
+            print(f"批量写入表格数据时HTTP错误: {e}")
+            if e.response is not None:
+                print(f"响应状态码: {e.response.status_code}")
+                print(f"响应内容: {e.response.text}")
+            else:
+                print("无响应内容")
+            return {
+                "success": False,
+                "error_msg": f"HTTP错误: {str(e)}"
+            }
+        except requests.exceptions.RequestException as e:
+            print(f"批量写入表格数据时请求异常: {e}")
+            return {
+                "success": False,
+                "error_msg": f"请求异常: {str(e)}"
+            }
+        except Exception as e:
+            print(f"批量写入表格数据时发生异常: {e}")
+            return {
+                "success": False,
+                "error_msg": str(e)
+            }
+
+    def get_row_index(self, spreadsheet_token: str, sheet_id: str) -> SheetRowIndex:
+        """获取（并缓存）工作表的行索引"""
+        key = (spreadsheet_token, sheet_id)
+        if key not in self._row_indexes:
+            self._row_indexes[key] = SheetRowIndex(spreadsheet_token, sheet_id)
+        return self._row_indexes[key]
+
+    def _rebuild_row_index(self, index: SheetRowIndex, spreadsheet_token: str, sheet_id: str) -> bool:
+        """从表格读取一次数据重建行索引"""
+        print(f"从飞书表格重建行索引: {sheet_id}")
+        read_result = self.read_sheet_data(spreadsheet_token, sheet_id)
+        if not read_result.get("success"):
+            return False
+        value_range = read_result.get("data", {}).get("valueRange", {})
+        index.rebuild(value_range.get("values") or [], parse_range_start_row(value_range.get("range")) or 1)
+        print(f"行索引重建完成，共 {len(index)} 行")
+        return True
+
+    @staticmethod
+    def _changed_ranges(sheet_id: str, row_number: int, old_values: list, new_values: list) -> list:
+        """
+        比较新旧行的值，返回变化单元格组成的连续范围（ID列不更新）
+
+        Returns:
+            list: [(范围字符串, 值列表)]
+        """
+        def normalize(value):
+            return "" if value is None else str(value)
+
+        changed = [col for col in range(1, len(new_values))
+                   if normalize(new_values[col]) != normalize(old_values[col] if col < len(old_values) else None)]
+        ranges = []
+        start = prev = None
+        for col in changed + [None]:
+            if start is not None and (col is None or col != prev + 1):
+                range_str = f"{sheet_id}!{column_letter(start)}{row_number}:{column_letter(prev)}{row_number}"
+                ranges.append((range_str, new_values[start:prev + 1]))
+                start = None
+            if col is not None and start is None:
+                start = col
+            prev = col
+        return ranges
+
+    def sync_sheet_rows(self, spreadsheet_token: str, sheet_id: str, rows: list,
+                        rebuild_index: bool = False) -> dict:
+        """
+        增量同步数据行：按（门店, 小时）查找已有的表格行，只更新变化的单元格，新的（门店, 小时）才追加
+
+        Args:
+            spreadsheet_token (str): 表格token
+            sheet_id (str): 工作表ID
+            rows (list): 数据行，格式与 append_sheet_data 相同
+            rebuild_index (bool): 是否忽略本地索引，从表格重建
+
+        Returns:
+            dict: 同步结果，包含 success、追加行数、更新行数/单元格数、未变化行数、
+                  未写入的行（failed_rows）和结果不确定的行数
+        """
+        index = self.get_row_index(spreadsheet_token, sheet_id)
+        with index.lock:
+            if rebuild_index or not (index.loaded and not index.stale) and not index.load():
+                if not self._rebuild_row_index(index, spreadsheet_token, sheet_id):
+                    return {
+                        "success": False,
+                        "failed_rows": list(rows),
+                        "error_msg": "重建行索引失败"
+                    }
+
+            # 同一批次中同一个（门店, 小时）只保留最后一行
+            keyed_rows = {}
+            new_rows = []
+            for row in rows:
+                key = index.key_func(row)
+                if key is None:
+                    new_rows.append(list(row))
+                else:
+                    keyed_rows[key] = list(row)
+
+            updates = []  # [(key, 行号, 合并后的值, 变化范围)]
+            unchanged = 0
+            for key, row in keyed_rows.items():
+                entry = index.lookup(key)
+                if entry is None:
+                    new_rows.append(row)
+                    continue
+                old_values = entry["values"]
+                # 保留表格中已有的ID
+                merged = [old_values[0] if old_values else row[0]] + row[1:]
+                ranges = self._changed_ranges(sheet_id, entry["row"], old_values, merged)
+                if ranges:
+                    updates.append((key, entry["row"], merged, ranges))
+                else:
+                    unchanged += 1
+
+            result = {
+                "success": True,
+                "appended": 0,
+                "updated_rows": 0,
+                "updated_cells": 0,
+                "unchanged": unchanged,
+                "uncertain": 0,
+                "requests": 0,
+                "failed_rows": []
+            }
+            errors = []
+
+            # 变化的单元格展开为范围后分批写入，每批不超过 MAX_RANGES_PER_BATCH 个范围（一行可能有多个范围）
+            flat_ranges = [(update_index, range_str, values)
+                           for update_index, (_, _, _, ranges) in enumerate(updates)
+                           for range_str, values in ranges]
+            failed_updates = set()
+            for start in range(0, len(flat_ranges), self.MAX_RANGES_PER_BATCH):
+                batch = flat_ranges[start:start + self.MAX_RANGES_PER_BATCH]
+                value_ranges = [{"range": range_str, "values": [values]} for _, range_str, values in batch]
+                result["requests"] += 1
+                batch_result = self.batch_update_sheet_data(spreadsheet_token, value_ranges)
+                if not batch_result.get("success"):
+                    failed_updates.update(update_index for update_index, _, _ in batch)
+                    errors.append(batch_result.get("error_msg", "未知错误"))
+
+            # 一行的所有范围都写入成功才更新索引，否则整行放入未写入的行（重试时重新比较）
+            for update_index, (key, row_number, merged, ranges) in enumerate(updates):
+                if update_index in failed_updates:
+                    result["failed_rows"].append(merged)
+                    continue
+                index.record(key, row_number, merged)
+                result["updated_rows"] += 1
+                result["updated_cells"] += sum(len(values) for _, values in ranges)
+
+            # 新的（门店, 小时）追加到表格末尾，根据返回的范围记录行号
+            for start in range(0, len(new_rows), self.MAX_APPEND_ROWS):
+                chunk = new_rows[start:start + self.MAX_APPEND_ROWS]
+                result["requests"] += 1
+                append_result = self.append_sheet_data(spreadsheet_token, sheet_id, chunk)
+                if append_result.get("success"):
+                    result["appended"] += len(chunk)
+                    updated_range = append_result.get("data", {}).get("updates", {}).get("updatedRange")
+                    start_row = parse_range_start_row(updated_range)
+                    if start_row is None:
+                        index.stale = True
+                        continue
+                    for offset, row in enumerate(chunk):
+                        key = index.key_func(row)
+                        if key:
+                            index.record(key, start_row + offset, row)
+                elif append_result.get("maybe_applied"):
+                    # 不确定是否已写入，不重试，下次同步前从表格重建索引
+                    result["uncertain"] += len(chunk)
+                    index.stale = True
+                    errors.append(append_result.get("error_msg", "未知错误"))
+                else:
+                    result["failed_rows"].extend(chunk)
+                    errors.append(append_result.get("error_msg", "未知错误"))
+
+            index.save()
+
+        if errors:
+            result["success"] = False
+            result["error_msg"] = "; ".join(errors)
+        print(f"增量同步飞书表格: 追加 {result['appended']} 行，更新 {result['updated_rows']} 行"
+              f"（{result['updated_cells']} 个单元格），未变化 {result['unchanged']} 行，共 {result['requests']} 次请求")
+        return result
+
     def get_sheet_metadata(self, spreadsheet_token: str) -> dict:
         """
         获取飞书文档中电子表格的元数据信息，包括所有工作表信息
@@ -375,12 +647,10 @@ class FeishuSheetClient:
             # 构造请求URL
             url = f"{self.base_url}/{spreadsheet_token}/sheets"
 
-            headers = self._get_headers()
-
             print(f"获取元数据请求URL: {url}")  # 调试信息
 
             # 发送GET请求
-            response = requests.get(url, headers=headers)
+            response = self._send("GET", url)
             response.raise_for_status()
             
             # 检查响应内容
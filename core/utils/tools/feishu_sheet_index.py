@@ -0,0 +1,156 @@
+import os
+import re
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+from config.settings import CacheConfig
+from core.utils.tools.tools import load_json_file, save_json_file
+
+
+def default_row_key(row: list) -> Optional[str]:
+    """
+    在线率数据行的索引键：品牌 + 门店 + 记录时间所在小时
+
+    数据行格式为 [ID, 品牌/店铺, 门店, 在线坐席数 / 总座位数, 记录时间, 其他数据, 备注]
+
+    Args:
+        row (list): 数据行
+
+    Returns:
+        str: 索引键，不是数据行（如表头、空行）时返回None
+    """
+    if len(row) < 5 or not row[2] or not isinstance(row[4], str) or len(row[4]) < 13:
+        return None
+    if not re.match(r"\d{4}-\d{2}-\d{2} \d{2}", row[4]):
+        return None
+    return f"{row[1]}|{row[2]}|{row[4][:13]}"
+
+
+def parse_range_start_row(range_str: str) -> Optional[int]:
+    """
+    从 "sheetId!A10:G12" 格式的范围中解析起始行号
+
+    Args:
+        range_str (str): 范围字符串
+
+    Returns:
+        int: 起始行号，解析失败返回None
+    """
+    match = re.search(r"!\$?[A-Z]+\$?(\d+)", range_str or "")
+    return int(match.group(1)) if match else None
+
+
+def column_letter(index: int) -> str:
+    """将从0开始的列序号转换为列字母，如 0 -> A, 26 -> AA"""
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class SheetRowIndex:
+    """
+    飞书表格行索引
+    记录（门店, 小时）对应的表格行号和该行当前的值，持久化到本地 JSON 文件，
+    用于增量同步时只更新变化的单元格；本地没有索引或索引失效时从表格读取一次重建
+    """
+
+    def __init__(self, spreadsheet_token: str, sheet_id: str, index_path: Optional[str] = None,
+                 key_func: Callable[[list], Optional[str]] = default_row_key, max_age_hours: int = 48):
+        """
+        初始化行索引
+
+        Args:
+            spreadsheet_token (str): 表格token
+            sheet_id (str): 工作表ID
+            index_path (str, optional): 索引文件路径，默认在 CacheConfig.CACHE_DIR 下
+            key_func (callable): 从数据行计算索引键的函数
+            max_age_hours (int): 只保留最近多少小时内的行，更早的行不会再被更新
+        """
+        self.spreadsheet_token = spreadsheet_token
+        self.sheet_id = sheet_id
+        self.index_path = index_path or os.path.join(
+            CacheConfig.CACHE_DIR, f'feishu_sheet_index_{spreadsheet_token}_{sheet_id}.json')
+        self.key_func = key_func
+        self.max_age_hours = max_age_hours
+        self.lock = threading.RLock()
+        self._rows: Dict[str, Dict] = {}
+        self.loaded = False
+        self.stale = False
+
+    def load(self) -> bool:
+        """
+        从本地文件加载索引
+
+        Returns:
+            bool: 是否加载到可用的索引
+        """
+        with self.lock:
+            data = load_json_file(self.index_path)
+            if not data or data.get("stale"):
+                return False
+            self._rows = data.get("rows", {})
+            self.loaded = True
+            self.stale = False
+            return True
+
+    def save(self):
+        """将索引写入本地文件"""
+        with self.lock:
+            self.prune()
+            try:
+                save_json_file(self.index_path, {
+                    "rows": self._rows,
+                    "stale": self.stale,
+                    "updated_at": time.time()
+                })
+            except OSError as e:
+                print(f"保存飞书表格行索引失败: {e}")
+
+    def mark_stale(self):
+        """标记索引失效（如追加结果不确定），下次同步前从表格重建"""
+        with self.lock:
+            self.stale = True
+            self.save()
+
+    def rebuild(self, values: List[list], start_row: int = 1):
+        """
+        根据从表格读取的数据重建索引
+
+        Args:
+            values (list): 表格数据，二维数组
+            start_row (int): values第一行对应的表格行号
+        """
+        with self.lock:
+            self._rows = {}
+            for offset, row in enumerate(values or []):
+                row = list(row or [])
+                key = self.key_func(row)
+                if key:
+                    self._rows[key] = {"row": start_row + offset, "values": row}
+            self.loaded = True
+            self.stale = False
+            self.save()
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """获取索引键对应的行号和当前值"""
+        with self.lock:
+            return self._rows.get(key)
+
+    def record(self, key: str, row_number: int, values: list):
+        """记录索引键对应的行号和当前值"""
+        with self.lock:
+            self._rows[key] = {"row": row_number, "values": list(values)}
+
+    def prune(self):
+        """清理超过保留时间的行（只比较键中的小时部分）"""
+        cutoff = time.strftime("%Y-%m-%d %H", time.localtime(time.time() - self.max_age_hours * 3600))
+        with self.lock:
+            self._rows = {key: entry for key, entry in self._rows.items() if key.rsplit("|", 1)[-1] >= cutoff}
+
+    def __len__(self):
+        with self.lock:
+            return len(self._rows)
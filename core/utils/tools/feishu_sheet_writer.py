@@ -0,0 +1,192 @@
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import FEISHUConfig
+from core.utils.tools.feishu_sheet_client import FeishuSheetClient
+
+
+class FeishuSheetBatchWriter:
+    """
+    飞书表格批量写入器
+    在一次采集运行内缓冲所有采集器要追加的数据行，结束时按接口限制分块、用尽量少的 values_append 请求写入，
+    失败的分块会重试，重试后仍失败的行保留在缓冲区中，下次 flush 时继续写入（AllCollector 在下次运行开始时沿用该写入器先写入，
+    进程退出时缓冲区中的行丢失）；
+    结果不确定（服务端可能已写入）的分块不重试也不放回缓冲区，避免重复追加。
+    sync 模式下改为调用 FeishuSheetClient.sync_sheet_rows 增量同步，只写入变化的单元格
+    """
+
+    # 飞书 values_append 单次请求的限制：不超过5000行、100列
+    MAX_ROWS_PER_REQUEST = 5000
+    MAX_COLUMNS_PER_REQUEST = 100
+    # 单次请求的单元格数上限，避免请求体过大
+    MAX_CELLS_PER_REQUEST = 50000
+
+    def __init__(self, spreadsheet_token: str, sheet_id: str, client: Optional[FeishuSheetClient] = None,
+                 max_rows: Optional[int] = None, max_cells: Optional[int] = None,
+                 max_retries: int = 3, retry_interval: float = 2, mode: Optional[str] = None):
+        """
+        初始化批量写入器
+
+        Args:
+            spreadsheet_token (str): 表格token
+            sheet_id (str): 工作表ID
+            client (FeishuSheetClient, optional): 飞书表格客户端，默认新建（共享进程内的token）
+            max_rows (int, optional): 每个分块的最大行数，默认为 MAX_ROWS_PER_REQUEST
+            max_cells (int, optional): 每个分块的最大单元格数，默认为 MAX_CELLS_PER_REQUEST
+            max_retries (int): 每个分块失败后的最大重试次数
+            retry_interval (float): 首次重试的等待时间（秒），之后每次翻倍
+            mode (str, optional): 写入模式，append 或 sync，默认为 FEISHUConfig.FEISHU_SHEET_MODE
+        """
+        self.spreadsheet_token = spreadsheet_token
+        self.sheet_id = sheet_id
+        self.client = client or FeishuSheetClient()
+        self.max_rows = min(max_rows or self.MAX_ROWS_PER_REQUEST, self.MAX_ROWS_PER_REQUEST)
+        self.max_cells = max_cells or self.MAX_CELLS_PER_REQUEST
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.mode = mode or FEISHUConfig.FEISHU_SHEET_MODE
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._rows: List[list] = []
+        self.request_count = 0
+
+    def targets(self, spreadsheet_token: str, sheet_id: str) -> bool:
+        """判断写入器是否写入指定的表格"""
+        return self.spreadsheet_token == spreadsheet_token and self.sheet_id == sheet_id
+
+    @property
+    def pending_count(self) -> int:
+        """缓冲区中待写入的行数"""
+        with self._lock:
+            return len(self._rows)
+
+    def add_rows(self, rows: List[list]) -> int:
+        """
+        将数据行加入缓冲区（不发请求）
+
+        Args:
+            rows (list): 二维数组格式的数据行
+
+        Returns:
+            int: 缓冲区中待写入的行数
+        """
+        with self._lock:
+            self._rows.extend(list(row)[:self.MAX_COLUMNS_PER_REQUEST] for row in rows)
+            return len(self._rows)
+
+    def _split_chunks(self, rows: List[list]) -> List[List[list]]:
+        """按行数和单元格数限制切分数据行"""
+        chunks = []
+        current: List[list] = []
+        current_cells = 0
+        for row in rows:
+            row_cells = max(len(row), 1)
+            if current and (len(current) >= self.max_rows or current_cells + row_cells > self.max_cells):
+                chunks.append(current)
+                current, current_cells = [], 0
+            current.append(row)
+            current_cells += row_cells
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _append_chunk(self, chunk: List[list]) -> Tuple[Optional[bool], Optional[str]]:
+        """
+        追加一个分块，失败时按指数退避重试
+
+        Returns:
+            tuple: (是否成功，结果不确定时为None, 错误信息)
+        """
+        error_msg = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                wait = self.retry_interval * (2 ** (attempt - 1))
+                print(f"追加分块失败，{wait}s 后第{attempt}次重试: {error_msg}")
+                time.sleep(wait)
+            self.request_count += 1
+            result = self.client.append_sheet_data(self.spreadsheet_token, self.sheet_id, chunk)
+            if result.get("success"):
+                return True, None
+            error_msg = result.get("error_msg", "未知错误")
+            if result.get("maybe_applied"):
+                return None, error_msg
+        return False, error_msg
+
+    def _sync(self, rows: List[list]) -> Dict:
+        """增量同步模式：未写入的行放回缓冲区"""
+        result = self.client.sync_sheet_rows(self.spreadsheet_token, self.sheet_id, rows)
+        self.request_count += result.get("requests", 0)
+        failed_rows = result.pop("failed_rows", [])
+        if failed_rows:
+            with self._lock:
+                self._rows[:0] = failed_rows
+        result["failed"] = len(failed_rows)
+        return result
+
+    def flush(self) -> Dict:
+        """
+        将缓冲区中的数据行写入飞书表格
+
+        Returns:
+            dict: 写入结果，包含 success、写入行数、失败行数、请求数和错误信息
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+
+            if not rows:
+                return {
+                    "success": True,
+                    "appended": 0,
+                    "failed": 0,
+                    "uncertain": 0,
+                    "requests": 0,
+                    "msg": "没有数据需要写入"
+                }
+
+            if self.mode == "sync":
+                return self._sync(rows)
+
+            requests_before = self.request_count
+            appended = 0
+            uncertain = 0
+            failed_rows: List[list] = []
+            errors = []
+            for chunk in self._split_chunks(rows):
+                success, error_msg = self._append_chunk(chunk)
+                if success:
+                    appended += len(chunk)
+                elif success is None:
+                    uncertain += len(chunk)
+                    errors.append(error_msg)
+                else:
+                    failed_rows.extend(chunk)
+                    errors.append(error_msg)
+
+            if failed_rows:
+                # 写入失败的行放回缓冲区头部，保持原有顺序，下次 flush 时继续写入
+                with self._lock:
+                    self._rows[:0] = failed_rows
+
+            result = {
+                "success": not failed_rows and not uncertain,
+                "appended": appended,
+                "failed": len(failed_rows),
+                "uncertain": uncertain,
+                "requests": self.request_count - requests_before
+            }
+            if not result["success"]:
+                result["error_msg"] = "; ".join(errors)
+                print(f"批量写入飞书表格部分失败: 成功 {appended} 行，失败 {len(failed_rows)} 行，"
+                      f"结果不确定 {uncertain} 行，{result['error_msg']}")
+            else:
+                print(f"批量写入飞书表格成功: {appended} 行，共 {result['requests']} 次请求")
+            return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+        return False
@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+import requests
+
+from config.settings import FEISHUConfig, CacheConfig
+from core.utils.tools.tools import load_json_file, save_json_file
+
+
+class FeishuTokenProvider:
+    """
+    飞书 tenant_access_token 提供者
+    进程内共享，首次使用时才获取token；并发刷新时只有一个线程请求接口（single-flight），
+    可选持久化到本地文件以便重启后继续使用，并在过期前由后台定时器主动刷新
+    """
+
+    # 提前刷新时间（秒），与原先 FeishuSheetClient 的提前10分钟刷新保持一致
+    REFRESH_AHEAD = 600
+
+    def __init__(self, app_id: str, app_secret: str, domain: Optional[str] = None,
+                 persist_path: Optional[str] = None, proactive_refresh: bool = True):
+        """
+        初始化token提供者
+
+        Args:
+            app_id (str): 飞书应用ID
+            app_secret (str): 飞书应用密钥
+            domain (str, optional): 飞书开放平台域名，默认为 FEISHUConfig.FEISHU_DOMAIN
+            persist_path (str, optional): token持久化文件路径，为None时不持久化
+            proactive_refresh (bool): 是否在过期前由后台定时器主动刷新
+        """
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.domain = (domain or FEISHUConfig.FEISHU_DOMAIN).rstrip('/')
+        self.persist_path = persist_path
+        self.proactive_refresh = proactive_refresh
+        self._token: Optional[str] = None
+        self._expire_time = 0.0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._persist_loaded = False
+
+    @property
+    def token_url(self) -> str:
+        return f"{self.domain}/open-apis/auth/v3/tenant_access_token/internal/"
+
+    @property
+    def expire_time(self) -> float:
+        """当前token的过期时间戳"""
+        return self._expire_time
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.time() < self._expire_time - self.REFRESH_AHEAD
+
+    def _load_persisted(self):
+        """从本地文件加载未过期的token（只在首次获取时加载一次）"""
+        self._persist_loaded = True
+        if not self.persist_path:
+            return
+        entry = (load_json_file(self.persist_path, {}) or {}).get(self.app_id)
+        if entry and time.time() < entry.get("expire_time", 0) - self.REFRESH_AHEAD:
+            self._token = entry.get("tenant_access_token")
+            self._expire_time = entry["expire_time"]
+            logging.info("使用本地缓存的飞书 tenant_access_token")
+
+    def _persist(self):
+        if not self.persist_path:
+            return
+        try:
+            data = load_json_file(self.persist_path, {}) or {}
+            data[self.app_id] = {
+                "tenant_access_token": self._token,
+                "expire_time": self._expire_time
+            }
+            save_json_file(self.persist_path, data)
+        except OSError as e:
+            logging.error(f"保存飞书 tenant_access_token 失败: {e}")
+
+    def _fetch(self) -> bool:
+        """请求飞书接口获取新的token"""
+        try:
+            post_data = {
+                "app_id": self.app_id,
+                "app_secret": self.app_secret
+            }
+            response = requests.post(self.token_url, json=post_data, timeout=10)
+            response.raise_for_status()
+            result = response.json()
+            if "tenant_access_token" in result and "expire" in result:
+                self._token = result["tenant_access_token"]
+                # 设置过期时间（当前时间 + 有效期 - 1分钟安全缓冲）
+                self._expire_time = time.time() + result["expire"] - 60
+                logging.info(f"获取飞书 tenant_access_token 成功，有效期 {result['expire']} 秒")
+                return True
+            logging.error(f"响应中缺少 tenant_access_token 或 expire 字段: {result}")
+            return False
+        except Exception as e:
+            logging.error(f"获取 tenant_access_token 失败: {e}")
+            return False
+
+    def _schedule_refresh(self):
+        """在token进入提前刷新窗口时由后台定时器主动刷新"""
+        if not self.proactive_refresh:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(self._expire_time - self.REFRESH_AHEAD - time.time(), 1)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        if self.get_token(force_refresh=True) is None:
+            # 刷新失败时稍后重试，不影响按需获取
+            self._timer = threading.Timer(60, self._background_refresh)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def get_token(self, force_refresh: bool = False) -> Optional[str]:
+        """
+        获取有效的 tenant_access_token
+
+        Args:
+            force_refresh (bool): 是否忽略当前token强制刷新
+
+        Returns:
+            str: tenant_access_token，获取失败返回None
+        """
+        if not force_refresh and self._is_valid():
+            return self._token
+
+        with self._lock:
+            if not self._persist_loaded:
+                self._load_persisted()
+            # 等待锁期间其他线程可能已经刷新
+            if not force_refresh and self._is_valid():
+                if self._timer is None:
+                    # 从本地文件加载的token还没有刷新定时器
+                    self._schedule_refresh()
+                return self._token
+            if not self._fetch():
+                return self._token if time.time() < self._expire_time else None
+            self._persist()
+            self._schedule_refresh()
+            return self._token
+
+    def invalidate(self, token: Optional[str] = None):
+        """
+        使当前token失效（如接口返回token无效），下次获取时重新请求
+
+        Args:
+            token (str, optional): 只有当前token与之相同时才失效
+        """
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expire_time = 0.0
+
+
+_providers: Dict[str, FeishuTokenProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_feishu_token_provider(app_id: Optional[str] = None,
+                              app_secret: Optional[str] = None) -> FeishuTokenProvider:
+    """
+    获取进程内共享的飞书token提供者（按应用ID区分）
+
+    Args:
+        app_id (str, optional): 飞书应用ID，默认为 FEISHUConfig.FEISHU_APP_ID
+        app_secret (str, optional): 飞书应用密钥，默认为 FEISHUConfig.FEISHU_APP_SECRET
+
+    Returns:
+        FeishuTokenProvider: token提供者
+    """
+    app_id = app_id or FEISHUConfig.FEISHU_APP_ID
+    app_secret = app_secret or FEISHUConfig.FEISHU_APP_SECRET
+    with _providers_lock:
+        if app_id not in _providers:
+            persist_path = None
+            if FEISHUConfig.FEISHU_TOKEN_PERSIST:
+                persist_path = os.path.join(CacheConfig.CACHE_DIR, 'feishu_token.json')
+            _providers[app_id] = FeishuTokenProvider(app_id, app_secret, persist_path=persist_path)
+        return _providers[app_id]
@@ -0,0 +1,195 @@
+import time
+import threading
+from typing import Callable, Dict, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import FEISHUConfig
+
+
+class FeishuRequestUncertain(requests.exceptions.RequestException):
+    """非幂等请求（如 values_append）失败，但服务端可能已经处理，不能自动重试"""
+
+
+class _TokenBucket:
+    """
+    客户端令牌桶限流
+    同一个飞书应用的所有请求共享一个令牌桶，收到限流响应时整体暂停到服务端要求的时间
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，令牌不足或处于暂停期时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def remaining_pause(self) -> float:
+        """距离暂停结束的剩余时间（秒）"""
+        with self._lock:
+            return max(self._paused_until - time.monotonic(), 0)
+
+    def pause(self, seconds: float):
+        """暂停发放令牌（服务端返回限流时调用）"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+
+class FeishuTransport:
+    """
+    飞书开放平台 HTTP 传输层
+    复用长连接会话，按应用做客户端限流，识别 429 和飞书频率限制错误码并按 Retry-After 等待后重试；
+    非幂等请求只在服务端明确拒绝（限流）或连接未建立时重试，避免重复追加数据
+    """
+
+    # 飞书频率限制相关的错误码：应用调用频率超限、电子表格请求过于频繁
+    RATE_LIMIT_CODES = {99991400, 90217}
+    # 未返回 Retry-After 时的默认等待时间（秒）
+    DEFAULT_RETRY_AFTER = 1.0
+
+    def __init__(self, rate_limit: Optional[float] = None, timeout: Optional[float] = None,
+                 max_retries: int = 3, pool_maxsize: int = 10):
+        """
+        初始化传输层
+
+        Args:
+            rate_limit (float, optional): 每秒最多请求数，默认为 FEISHUConfig.FEISHU_RATE_LIMIT
+            timeout (float, optional): 读取超时（秒），默认为 FEISHUConfig.FEISHU_REQUEST_TIMEOUT
+            max_retries (int): 最大重试次数
+            pool_maxsize (int): 连接池大小
+        """
+        self.timeout = timeout or FEISHUConfig.FEISHU_REQUEST_TIMEOUT
+        self.max_retries = max_retries
+        self.bucket = _TokenBucket(rate_limit or FEISHUConfig.FEISHU_RATE_LIMIT)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0}
+        # 多个采集线程共用同一个传输层，统计计数需要加锁
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str):
+        """统计计数加一"""
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        """从响应头中读取服务端要求的等待时间"""
+        for header in ("Retry-After", "x-ogw-ratelimit-reset"):
+            value = response.headers.get(header)
+            if value:
+                try:
+                    return max(float(value), 0)
+                except ValueError:
+                    continue
+        return None
+
+    def _is_rate_limited(self, response: requests.Response) -> bool:
+        if response.status_code == 429:
+            return True
+        try:
+            return response.json().get("code") in self.RATE_LIMIT_CODES
+        except ValueError:
+            return False
+
+    def request(self, method: str, url: str,
+                headers: Union[Dict[str, str], Callable[[], Dict[str, str]], None] = None,
+                idempotent: bool = True, **kwargs) -> requests.Response:
+        """
+        发送请求
+
+        Args:
+            method (str): 请求方法
+            url (str): 请求URL
+            headers (dict or callable, optional): 请求头，传入函数时每次发送前重新获取（token可能已刷新）
+            idempotent (bool): 请求是否幂等，非幂等请求在结果不确定时不会重试
+            **kwargs: 传给 requests 的其他参数
+
+        Returns:
+            requests.Response: 响应（限流重试用尽时返回最后一次的限流响应）
+
+        Raises:
+            FeishuRequestUncertain: 非幂等请求失败但服务端可能已处理
+            requests.exceptions.RequestException: 其他请求异常
+        """
+        kwargs.setdefault("timeout", (5, self.timeout))
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self._count("requests")
+            request_headers = headers() if callable(headers) else headers
+            try:
+                response = self.session.request(method, url, headers=request_headers, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                # 连接未建立，服务端一定没有收到请求，幂等与否都可以重试
+                if attempt >= self.max_retries:
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not idempotent:
+                    raise FeishuRequestUncertain(f"请求结果不确定，不自动重试: {e}") from e
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if self._is_rate_limited(response):
+                    # 限流响应表示服务端拒绝了请求，非幂等请求也可以安全重试
+                    self._count("rate_limited")
+                    wait = self._retry_after(response)
+                    self.bucket.pause(self.DEFAULT_RETRY_AFTER * (2 ** attempt) if wait is None else wait)
+                    if attempt >= self.max_retries:
+                        return response
+                    print(f"飞书接口触发限流，等待后重试: {url}")
+                elif response.status_code >= 500:
+                    if not idempotent:
+                        raise FeishuRequestUncertain(f"服务端错误 {response.status_code}，请求结果不确定，不自动重试")
+                    if attempt >= self.max_retries:
+                        return response
+                else:
+                    return response
+
+            attempt += 1
+            self._count("retries")
+            if not self.bucket.remaining_pause():
+                # 限流时由令牌桶统一等待，其他错误按指数退避
+                time.sleep(min(0.5 * (2 ** (attempt - 1)), 8))
+
+
+_transports: Dict[str, FeishuTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_feishu_transport(app_id: Optional[str] = None) -> FeishuTransport:
+    """
+    获取进程内共享的飞书传输层（按应用ID区分，同一应用共享连接池和限流）
+
+    Args:
+        app_id (str, optional): 飞书应用ID，默认为 FEISHUConfig.FEISHU_APP_ID
+
+    Returns:
+        FeishuTransport: 传输层实例
+    """
+    app_id = app_id or FEISHUConfig.FEISHU_APP_ID
+    with _transports_lock:
+        if app_id not in _transports:
+            _transports[app_id] = FeishuTransport()
+        return _transports[app_id]
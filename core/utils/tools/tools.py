@@ -1,4 +1,7 @@
+import json
+import os
 import re
+import threading
 
 
 def dict_to_cookie_string(cookie_dict):
@@ -32,4 +35,34 @@ def parse_cookie_header(cookie_header):
     for key, value in matches:
         cookies[key.strip()] = value.strip()
 
-    return cookies
\ No newline at end of file
+    return cookies
+
+def load_json_file(file_path, default=None):
+    """
+    读取本地JSON文件，文件不存在或内容损坏时返回默认值
+
+    :param file_path: JSON文件路径
+    :param default: 读取失败时返回的默认值
+    :return: 解析后的数据
+    """
+    if not os.path.exists(file_path):
+        return default
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json_file(file_path, data):
+    """
+    原子地写入本地JSON文件（先写临时文件再替换），避免多进程同时写入时读到半截文件
+
+    :param file_path: JSON文件路径
+    :param data: 要写入的数据
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, file_path)